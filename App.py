@@ -1,7 +1,11 @@
 import streamlit as st
 import os
+import time
 from datetime import datetime
-from Financial_Agent import Financial_Agent
+from Financial_Agent import (
+    SHARD_ROOT, build_agent, get_fast_path_router, get_shard_router, get_tracer, stream_answer, warm_up,
+)
+from agent_runner import AgentRunner
 
 # # Streamlit UI
 st.set_page_config(
@@ -11,6 +15,18 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def start_warm_up():
+    # Один раз на процесс: инструменты, каталог схемы и курсы строятся в фоне, пока рисуется страница
+    if os.environ.get("METRICS_PORT"):
+        from tracing import serve_metrics
+        serve_metrics(get_tracer(), int(os.environ["METRICS_PORT"]))
+    return warm_up()
+
+
+start_warm_up()
+
 # Стили CSS для красивого оформления
 st.markdown("""
 <style>
@@ -69,6 +85,21 @@ with st.sidebar:
         if st.button(example, key=example):
             st.session_state.example_query = example
 
+    # Статистика есть, только если маршрутизатор уже построен; при раздельных
+    # базах она общая для маршрутизаторов всех пользователей
+    if SHARD_ROOT:
+        fast_path_report = get_shard_router().fast_path_stats.report() if get_shard_router.is_built() else {"total": 0}
+    else:
+        fast_path_report = get_fast_path_router().stats.report() if get_fast_path_router.is_built() else {"total": 0}
+    if fast_path_report["total"]:
+        st.markdown("---")
+        st.markdown("### ⚡ Быстрый путь")
+        st.markdown(f"Обслужено без LLM: **{fast_path_report['fast_path_share']:.0%}** запросов")
+        if fast_path_report["fast_path_avg_seconds"] is not None:
+            st.markdown(f"Среднее время быстрого пути: {fast_path_report['fast_path_avg_seconds']:.3f} сек")
+        if fast_path_report["agent_avg_seconds"] is not None:
+            st.markdown(f"Среднее время агента: {fast_path_report['agent_avg_seconds']:.2f} сек")
+
 
 # Основная область ввода
 col1, col2 = st.columns([3, 1])
@@ -85,54 +116,154 @@ with col2:
     if st.button("🚀 Выполнить запрос"):
         st.session_state.run_query = True
 
-# Обработка запроса
+
+@st.cache_resource
+def get_runner():
+    # Один пул на процесс: запросы разных пользователей выполняются параллельно
+    return AgentRunner()
+
+
+def render_events(run):
+    """Шаги агента: вызовы инструментов, SQL, наблюдения и текущий текст модели"""
+    thinking = ""
+    for event in run.events:
+        kind = event["type"]
+        if kind == "queued":
+            st.caption("⏳ Запрос принят")
+        elif kind == "delta":
+            thinking += event["text"]
+        elif kind == "tool_call":
+            thinking = ""
+            arguments = event["arguments"]
+            st.markdown(f"🔧 **{event['name']}**")
+            if isinstance(arguments, dict) and "query" in arguments:
+                st.code(arguments["query"], language="sql")
+            elif arguments:
+                st.json(arguments)
+        elif kind == "observation":
+            with st.expander(f"👁 Результат {event['name']}"):
+                st.text(event["observation"])
+        elif kind == "step" and event["error"]:
+            st.warning(f"Шаг {event['step']}: {event['error']}")
+    if thinking and not run.done:
+        st.caption(thinking[-500:])
+
+
+# Заголовок, в котором аутентифицирующий прокси передаёт пользователя (например, X-Forwarded-Email)
+USER_HEADER = os.environ.get("USER_HEADER")
+
+
+def current_user_id():
+    """Пользователь из аутентифицированной сессии, а не из параметров страницы.
+
+    Если задан USER_HEADER, берётся заголовок от прокси перед приложением
+    (страница не должна быть доступна в обход него); иначе — email
+    пользователя, вошедшего через st.login() (раздел [auth] в secrets.toml).
+    """
+    if USER_HEADER:
+        return st.context.headers.get(USER_HEADER)
+    if st.user.is_logged_in:
+        return st.user.get("email")
+    return None
+
+
+# При раздельных базах (SHARD_ROOT) каждый пользователь видит только свою базу
+user_id = current_user_id() if SHARD_ROOT else None
+if SHARD_ROOT and not user_id and not USER_HEADER:
+    with st.sidebar:
+        if st.button("🔑 Войти"):
+            st.login()
+
+# Обработка запроса: агент выполняется в фоновом пуле, страница обновляется по мере поступления шагов
 if st.session_state.get('run_query', False):
+    st.session_state.run_query = False
+    current = st.session_state.get('active_run')
     if not query.strip():
         st.warning("⚠️ Пожалуйста, введите запрос.")
+    elif current is not None and not current.done:
+        st.warning("⚠️ Дождитесь завершения текущего запроса или остановите его.")
+    elif SHARD_ROOT and not user_id:
+        st.warning("⚠️ Войдите, чтобы выполнять запросы к своей базе транзакций.")
     else:
-        with st.spinner("🔄 Обрабатываю запрос..."):
-            try:
-                start_time = datetime.now()
-                
-                # Выполнение запроса
-                response = Financial_Agent.run(query)
-                
-                processing_time = (datetime.now() - start_time).total_seconds()
-                
-                # Отображение результата
-                st.markdown("---")
-                st.markdown(f"### 📅 Результат запроса ({processing_time:.2f} сек)")
-                
-                if isinstance(response, dict) and 'arguments' in response:
-                    answer = response['arguments'].get('answer', '')
-                    st.markdown(f"""
-                    <div class="highlight">
-                        <h4 style='margin-top:0;'>{answer}</h4>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="response-box">
-                        {response}
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Дополнительная информация
-                with st.expander("🔍 Подробности выполнения"):
-                    st.json(response)
-                
-                # Сохранение в историю
-                if 'history' not in st.session_state:
-                    st.session_state.history = []
-                
-                st.session_state.history.insert(0, {
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'query': query,
-                    'response': answer if isinstance(response, dict) else str(response)
-                })
-                
-            except Exception as e:
-                st.error(f"❌ Ошибка при выполнении запроса: {str(e)}")
+        # Агент сессии создаётся при первом запросе, а не при открытии страницы; при раздельных
+        # базах — на инструментах базы пользователя (пересоздаётся, если база была закрыта по LRU)
+        try:
+            tools = get_shard_router().tenant(user_id).tools if user_id else None
+        except (LookupError, ValueError) as e:
+            st.error(f"❌ {e}")
+        else:
+            if 'agent' not in st.session_state or st.session_state.get('agent_tools') is not tools:
+                st.session_state.agent = build_agent(stream_outputs=True, tools=tools)
+                st.session_state.agent_tools = tools
+            agent = st.session_state.agent
+            st.session_state.active_run = get_runner().submit(
+                query, lambda: stream_answer(query, agent, user_id), agent=agent
+            )
+            st.session_state.run_recorded = False
+
+run = st.session_state.get('active_run')
+if run is not None:
+    # Статус читается до опроса очереди, чтобы после завершения не потерять последние события
+    finished = run.done
+    run.poll()
+    st.markdown("---")
+    if not finished:
+        st.markdown(f"### 🔄 Обрабатываю запрос... ({run.elapsed:.1f} сек)")
+        if st.button("⏹ Остановить"):
+            run.cancel()
+        with st.status("Шаги агента", expanded=True):
+            render_events(run)
+        time.sleep(0.3)
+        st.rerun()
+    elif run.cancelled:
+        st.info(f"⏹ Запрос остановлен ({run.elapsed:.2f} сек)")
+        with st.expander("🔍 Выполненные шаги"):
+            render_events(run)
+    elif run.error is not None:
+        st.error(f"❌ Ошибка при выполнении запроса: {run.error}")
+    else:
+        response = run.answer
+        st.markdown(f"### 📅 Результат запроса ({run.elapsed:.2f} сек)")
+        trace = next((event for event in run.events if event["type"] == "trace"), None)
+        if trace is not None and trace["steps"]:
+            st.caption(
+                f"LLM: {trace['llm_seconds']:.2f} сек за {trace['steps']} шаг(ов), "
+                f"токены {trace['input_tokens']} → {trace['output_tokens']}; "
+                f"инструменты: {trace['tool_calls']} вызов(ов), {trace['tool_seconds']:.2f} сек"
+                + (f"; системный промпт ~{trace['system_prompt_tokens']} токенов"
+                   if "system_prompt_tokens" in trace else "")
+            )
+
+        if isinstance(response, dict) and 'arguments' in response:
+            answer = response['arguments'].get('answer', '')
+            st.markdown(f"""
+            <div class="highlight">
+                <h4 style='margin-top:0;'>{answer}</h4>
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            answer = str(response)
+            st.markdown(f"""
+            <div class="response-box">
+                {response}
+            </div>
+            """, unsafe_allow_html=True)
+
+        # Дополнительная информация
+        with st.expander("🔍 Подробности выполнения"):
+            render_events(run)
+            st.json(response)
+
+        # Сохранение в историю (один раз на выполнение)
+        if not st.session_state.get('run_recorded', False):
+            st.session_state.run_recorded = True
+            if 'history' not in st.session_state:
+                st.session_state.history = []
+            st.session_state.history.insert(0, {
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'query': run.query,
+                'response': answer
+            })
 
 # История запросов
 if 'history' in st.session_state and st.session_state.history:
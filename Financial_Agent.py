@@ -1,27 +1,391 @@
-from smolagents import ToolCallingAgent
-from Tools import ListTablesTool, ExecuteQueryTool, CurrencyConversionTool, CalculatorTool
-from prompts import Financial_Agent_Prompt
-from sqlalchemy import create_engine, inspect
+"""Сборка финансового агента.
+
+Импорт модуля ничего не создаёт: движок базы, инструменты, клиент модели
+и кэши строятся при первом обращении и дальше переиспользуются всеми
+сессиями. ``warm_up()`` строит их заранее в фоновом потоке вместе с
+каталогом схемы и таблицей курсов, чтобы первый запрос не ждал.
+
+База задаётся переменной окружения TRANSACTIONS_DB. Если задан SHARD_ROOT,
+у каждого пользователя своя база (shards.py), а answer/stream_answer
+получают user_id. Журнал SQL-запросов для советника по индексам ведётся,
+только если задан QUERY_LOG (путь к файлу).
+"""
+import functools
 import os
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
 from dotenv import load_dotenv
-from smolagents import ToolCallingAgent
-from sqlalchemy import create_engine, inspect
-from Model import model
+
 load_dotenv()
 
+DB_PATH = os.environ.get("TRANSACTIONS_DB", "user_transactions.db")
+# Каталог баз пользователей; без него все запросы идут в DB_PATH
+SHARD_ROOT = os.environ.get("SHARD_ROOT")
+# Журнал запросов для советника по индексам (index_advisor.py); по умолчанию не ведётся
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG")
+TRACE_PATH = "traces.db"
+
+T = TypeVar("T")
+
+
+def _singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """Ленивый потокобезопасный синглтон: фабрика вызывается ровно один раз"""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get() -> T:
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.is_built = lambda: bool(instance)
+    return get
+
+
+@_singleton
+def get_tracer():
+    from tracing import Tracer, open_sink
+
+    return Tracer(open_sink(TRACE_PATH))
+
+
+def create_tools(
+    db_path: str = DB_PATH,
+    currency_api_key: Optional[str] = None,
+    fx_api_base: Optional[str] = None,
+    query_log_path: Optional[str] = QUERY_LOG_PATH,
+    result_cache: bool = True,
+    tracer=None,
+    currency_tool=None,
+    fx_store=None,
+) -> Dict[str, object]:
+    """Набор инструментов поверх одной базы данных.
+
+    Args:
+        db_path: Путь к файлу SQLite.
+        currency_api_key: Ключ exchangerate-api; по умолчанию из переменной окружения currency_api_key.
+        fx_api_base: Другой адрес API курсов (например, локальная заглушка).
+        query_log_path: Журнал запросов для советника по индексам; None — не вести.
+        result_cache: Кэшировать результаты execute_query.
+        tracer: Трассировщик, которым оборачиваются инструменты.
+        currency_tool: Готовый конвертер валют (общий кэш курсов для нескольких баз).
+        fx_store: Общее хранилище исторических курсов для fx_convert;
+            по умолчанию курсы читаются из fx_rates самой базы.
+    """
+    from analytics import CurrencyColumn, TransactionAnalytics, TransactionFrame
+    from db import get_engine
+    from fx_history import register_fx_functions, store_for_engine
+    from index_advisor import QueryLog
+    from query_cache import QueryResultCache
+    from Tools import (
+        AnalyticsTool, BatchCurrencyConversionTool, CalculatorTool, CurrencyConversionTool, ExecuteQueryTool,
+        ListTablesTool,
+    )
+
+    engine = get_engine(db_path)
+    if currency_tool is None:
+        currency_kwargs = {"api_base": fx_api_base} if fx_api_base else {}
+        currency_tool = CurrencyConversionTool(
+            currency_api_key or os.environ["currency_api_key"], **currency_kwargs
+        )
+    # fx_convert без исторического курса на дату берёт текущий
+    if fx_store is None:
+        fx_store = store_for_engine(engine, currency_tool.rate_cache.get_rate)
+    else:
+        register_fx_functions(engine, fx_store, currency_tool.rate_cache.get_rate)
+    tools = {
+        "list_tables": ListTablesTool(engine=engine),
+        "execute_query": ExecuteQueryTool(
+            engine,
+            query_log=QueryLog(query_log_path) if query_log_path else None,
+            result_cache=QueryResultCache(db_path) if result_cache else None,
+        ),
+        "analytics": AnalyticsTool(TransactionAnalytics(
+            TransactionFrame(db_path),
+            CurrencyColumn(
+                fx_store.rate if fx_store is not None else None,
+                currency_tool.rate_cache.get_rate,
+                fx_store.version if fx_store is not None else None,
+            ),
+        )),
+        "calculator": CalculatorTool(),
+        "currency_converter": currency_tool,
+        "batch_currency_converter": BatchCurrencyConversionTool(currency_tool.rate_cache),
+    }
+    if tracer is not None:
+        tracer.instrument_tools(tools.values())
+    tools["engine"] = engine
+    tools["fx_store"] = fx_store
+    return tools
+
+
+@_singleton
+def get_currency_tool():
+    """Конвертер валют с кэшем курсов, общий для всех баз"""
+    from Tools import CurrencyConversionTool
+
+    return CurrencyConversionTool(os.environ["currency_api_key"])
+
+
+@_singleton
+def get_tools() -> Dict[str, object]:
+    """Общие для всех агентов инструменты, пул соединений и кэши"""
+    return create_tools(tracer=get_tracer(), currency_tool=get_currency_tool())
+
+
+@_singleton
+def get_shard_router():
+    """Маршрутизатор баз пользователей (SHARD_ROOT)"""
+    from shards import ShardRouter
+
+    if not SHARD_ROOT:
+        raise RuntimeError("Базы пользователей не настроены: задайте SHARD_ROOT")
+    # Общий журнал запросов смешал бы SQL разных пользователей в одном файле
+    return ShardRouter(
+        SHARD_ROOT,
+        functools.partial(create_tools, query_log_path=None, tracer=get_tracer(), currency_tool=get_currency_tool()),
+    )
+
+
+@_singleton
+def get_fast_path_router():
+    from fast_path import FastPathRouter
+
+    tools = get_tools()
+    return FastPathRouter(
+        tools["engine"], tools["calculator"], tools["currency_converter"], tools["batch_currency_converter"],
+        fx_store=tools["fx_store"],
+    )
+
+
+@_singleton
+def get_answer_cache():
+    from answer_cache import AnswerCache
+
+    return AnswerCache(DB_PATH)
+
+
+def build_agent(stream_outputs: bool = False, tools: Optional[Dict[str, object]] = None, model=None, tracer=None):
+    """Новый агент с общими инструментами.
+
+    Память агента не рассчитана на одновременные запросы, поэтому каждой
+    сессии интерфейса нужен свой экземпляр; инструменты, пул соединений
+    и кэши общие. Результаты инструментов передаются модели в компактном
+    виде (observations.ObservationFormatter).
+
+    Args:
+        stream_outputs: Потоковая выдача ответа модели.
+        tools: Инструменты (create_tools); по умолчанию общие get_tools().
+        model: Модель smolagents; по умолчанию Model.model.
+        tracer: Трассировщик; по умолчанию общий get_tracer().
+    """
+    from smolagents import ToolCallingAgent
+
+    from observations import ObservationFormatter
+
+    if model is None:
+        from Model import model
+
+    tools = tools or get_tools()
+    fx_store = tools.get("fx_store")
+    tools = [tool for name, tool in tools.items() if name not in ("engine", "fx_store")]
+    # Независимые вызовы инструментов из одного шага выполняются в пуле потоков
+    agent = ToolCallingAgent(
+        tools = tools,
+        model = model,
+        max_tool_threads = len(tools),
+        stream_outputs = stream_outputs,
+    )
+    # По нему prepare_agent решает, описывать ли в промпте fx_convert
+    agent.fx_store = fx_store
+    prepare_agent(agent)
+    ObservationFormatter().instrument_agent(agent)
+    return (tracer or get_tracer()).instrument_agent(agent)
+
+
+def prepare_agent(agent, question: Optional[str] = None):
+    """Системный промпт под вопрос: компактная схема из каталога и подходящие примеры.
+
+    Схема в промпте избавляет агента от отдельного шага list_tables. Если
+    каталог недоступен, агент получает указание вызвать list_tables сам.
+    fx_convert упоминается, только если в fx_rates есть курсы.
+    """
+    from prompts import build_system_prompt, compact_schema, estimate_tokens
+    from tracing import current_run
+
+    try:
+        schema = compact_schema(agent.tools["list_tables"].catalog.get())
+    except Exception:
+        schema = None
+    fx_store = getattr(agent, "fx_store", None)
+    fx_convert = fx_store is not None and fx_store.has_rates()
+    agent.prompt_templates['system_prompt'] = build_system_prompt(question, schema, fx_convert=fx_convert)
+    run = current_run()
+    if run is not None:
+        run.attributes["system_prompt_tokens"] = estimate_tokens(agent.system_prompt)
+
+
+@_singleton
+def get_agent():
+    """Общий агент для однопоточного использования (скрипты, ноутбук)"""
+    return build_agent()
+
+
+def warm_up(background: bool = True):
+    """Заранее строит инструменты, каталог схемы, курсы валют и клиента модели.
+
+    Ошибки прогрева не фатальны: то, что не удалось построить, будет
+    построено при первом запросе.
+
+    Returns:
+        threading.Thread | None: Поток прогрева, если background=True.
+    """
+    def run():
+        if SHARD_ROOT:
+            # Базы пользователей открываются по первому запросу каждого из них
+            steps = (
+                get_shard_router,
+                lambda: get_currency_tool().rate_cache.get_table("USD"),
+                lambda: __import__("Model"),
+            )
+        else:
+            steps = (
+                get_tools,
+                lambda: get_tools()["list_tables"].catalog.get(),
+                lambda: get_tools()["currency_converter"].rate_cache.get_table("USD"),
+                lambda: get_tools()["analytics"].analytics.frame.get(),
+                get_fast_path_router,
+                get_answer_cache,
+                lambda: __import__("Model"),
+            )
+        for step in steps:
+            try:
+                step()
+            except Exception:
+                continue
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="financial-agent-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _routing(user_id: Optional[str] = None):
+    """Кэш ответов и быстрый путь: общие для DB_PATH или свои у базы пользователя.
+
+    Returns:
+        (кэш ответов, быстрый путь, база пользователя или None)
+    """
+    if user_id is None:
+        return get_answer_cache(), get_fast_path_router(), None
+    tenant = get_shard_router().tenant(user_id)
+    return tenant.answer_cache, tenant.fast_path_router, tenant
+
+
+def answer(query: str, user_id: Optional[str] = None):
+    """Отвечает на запрос: кэш готовых ответов → быстрый путь → агент.
+
+    Args:
+        query: Вопрос пользователя.
+        user_id: Пользователь, по базе которого отвечать (нужен SHARD_ROOT); None — DB_PATH.
+    """
+    answer_cache, fast_path_router, tenant = _routing(user_id)
+    with get_tracer().run(query) as trace:
+        cached = answer_cache.get(query)
+        if cached is not None:
+            trace.route = "cache"
+            return cached
+        start = time.perf_counter()
+        routed = fast_path_router.route(query)
+        if routed is not None:
+            route, response = routed
+        else:
+            # Агент строится на каждый вопрос, только если быстрый путь не справился:
+            # prepare_agent и run меняют промпт и память агента, поэтому общий агент
+            # нельзя использовать из нескольких потоков. Инструменты, пул соединений,
+            # кэши и клиент модели при этом общие.
+            agent = build_agent(tools=tenant.tools if tenant is not None else None)
+            prepare_agent(agent, query)
+            route, response = "agent", agent.run(query)
+        trace.route = route
+        fast_path_router.stats.record(route, time.perf_counter() - start)
+        answer_cache.put(query, response)
+        return response
+
+
+def stream_answer(query: str, agent, user_id: Optional[str] = None):
+    """То же, что answer, но события агента выдаются по мере выполнения (см. agent_runner).
+
+    Агент должен быть построен на инструментах той же базы (для пользователя —
+    ``build_agent(tools=get_shard_router().tenant(user_id).tools)``).
+    Последним событием идёт ``trace`` — итоги трассировки запроса.
+    """
+    answer_cache, fast_path_router, _ = _routing(user_id)
+    with get_tracer().run(query) as trace:
+        for event in _stream_routes(query, agent, answer_cache, fast_path_router):
+            if event["type"] == "final":
+                trace.route = event["route"]
+            yield event
+    yield {"type": "trace", **trace.summary()}
+
+
+def _stream_routes(query: str, agent, answer_cache, fast_path_router):
+    from agent_runner import agent_events
+
+    cached = answer_cache.get(query)
+    if cached is not None:
+        yield {"type": "final", "answer": cached, "route": "cache"}
+        return
+    start = time.perf_counter()
+    routed = fast_path_router.route(query)
+    # Ответ кладётся в кэш после yield: если потребитель отменил запрос и
+    # закрыл генератор на событии final, ответ в кэш не попадает
+    if routed is not None:
+        route, response = routed
+        fast_path_router.stats.record(route, time.perf_counter() - start)
+        yield {"type": "final", "answer": response, "route": route}
+        answer_cache.put(query, response)
+        return
+    prepare_agent(agent, query)
+    for event in agent_events(agent, query):
+        if event["type"] != "final":
+            yield event
+            continue
+        fast_path_router.stats.record("agent", time.perf_counter() - start)
+        event["route"] = "agent"
+        yield event
+        answer_cache.put(query, event["answer"])
+
 
-engine = create_engine("sqlite:///user_transactions.db") 
-inspector = inspect(engine)
-currency_api_key = os.environ["currency_api_key"]
+# Старые имена модуля → ключи get_tools()
+_LEGACY_TOOLS = {
+    "engine": "engine",
+    "list_tables_tool": "list_tables",
+    "execute_query_tool": "execute_query",
+    "calculator_tool": "calculator",
+    "currency_tool": "currency_converter",
+    "batch_currency_tool": "batch_currency_converter",
+}
 
-list_tables_tool = ListTablesTool()
-execute_query_tool = ExecuteQueryTool(engine)
-calculator_tool = CalculatorTool()
-currency_tool = CurrencyConversionTool(currency_api_key)
 
-Financial_Agent = ToolCallingAgent(
-    tools = [ list_tables_tool, execute_query_tool, calculator_tool, currency_tool],
-    model = model,
-)
-Financial_Agent.prompt_templates['system_prompt'] = Financial_Agent_Prompt
-print(Financial_Agent.prompt_templates['system_prompt'])
\ No newline at end of file
+def __getattr__(name: str):
+    # Совместимость со старыми импортами: from Financial_Agent import Financial_Agent, model, ...
+    if name == "Financial_Agent":
+        return get_agent()
+    if name == "model":
+        from Model import model
+        return model
+    if name == "fast_path_router":
+        return get_fast_path_router()
+    if name == "answer_cache":
+        return get_answer_cache()
+    if name in _LEGACY_TOOLS:
+        return get_tools()[_LEGACY_TOOLS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
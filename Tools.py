@@ -1,4 +1,6 @@
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Optional
+import threading
+import time
 from sqlalchemy import Engine, text
 from sqlalchemy.exc import SQLAlchemyError as exc
 import decimal
@@ -6,6 +8,7 @@ import datetime
 import re
 from smolagents import Tool
 import requests
+import numpy as np
 from sqlalchemy import (
     create_engine,
     inspect,
@@ -14,6 +17,18 @@ from sqlalchemy import (
     Engine 
 )
 from sqlalchemy.exc import SQLAlchemyError as exc
+from sqlalchemy.exc import SQLAlchemyError
+from schema_catalog import SchemaCatalog
+from profiler import profile_table
+from fx_cache import RateCache
+from index_advisor import QueryLog
+from sql_validator import normalize_sql, read_only_authorizer, validate_query
+from query_cache import QueryResultCache
+from rollups import ROLLUP_DESCRIPTIONS
+from tracing import annotate, increment
+from expressions import compile_expression, round_half_up, to_number
+from analytics import PERIODS, TransactionAnalytics
+from observations import expand_rows
 
 
 class CurrencyConversionTool(Tool):
@@ -27,16 +42,27 @@ class CurrencyConversionTool(Tool):
     }
     output_type = "object"
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        api_base: str = "https://v6.exchangerate-api.com/v6",
+        rate_cache: Optional[RateCache] = None,
+    ):
         """Инициализирует инструмент с ключом API.
 
         Args:
             api_key: Ключ API для exchangerate-api.com.
+            api_base: Базовый URL API; позволяет подключить локальный тестовый сервер.
+            rate_cache: Общий кэш курсов. По умолчанию создаётся собственный.
         """
         super().__init__()
         if not api_key:
             raise ValueError("Необходимо предоставить ключ API для CurrencyConversionTool")
         self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        # requests.Session не гарантирует потокобезопасность: своя сессия на поток
+        self._local = threading.local()
+        self.rate_cache = rate_cache or RateCache(self._fetch_rates)
 
     def forward(self, base_currency: str, target_currency: str, amount: float = 1.0) -> Dict[str, float]: 
         """Выполняет конвертацию валюты.
@@ -51,28 +77,124 @@ class CurrencyConversionTool(Tool):
             conversion_rate - обменный курс между валютами.
             conversion_result - сконвертированная сумма в целевой валюте.
         """
-        endpoint = f"https://v6.exchangerate-api.com/v6/{self.api_key}/latest/{base_currency.upper()}"
+        if amount is None:
+            amount = 1.0
+        rate = self.rate_cache.get_rate(base_currency, target_currency)
+        return {
+            "conversion_rate": rate,
+            "conversion_result": amount * rate
+        }
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _fetch_rates(self, base_currency: str) -> Dict[str, float]:
+        """Загружает таблицу всех курсов для базовой валюты"""
+        endpoint = f"{self.api_base}/{self.api_key}/latest/{base_currency.upper()}"
 
+        start = time.perf_counter()
         try:
-            response = requests.get(endpoint, timeout=10)
+            response = self.session.get(endpoint, timeout=10)
             response.raise_for_status()
             data = response.json()
-            
-            if data.get("result") != "success":
-                raise ValueError(f"API Error: {data.get('error-type', 'Unknown')}")
-            
-            rates = data["conversion_rates"]
-            if target_currency.upper() not in rates:
-                raise ValueError(f"Валюта {target_currency} не найдена")
-            
-            rate = rates[target_currency.upper()]
-            return {
-                "conversion_rate": rate,
-                "conversion_result": amount * rate
-            }
-            
         except requests.RequestException as e:
             raise ConnectionError(f"Ошибка запроса: {str(e)}")
+        finally:
+            increment(http_requests=1, http_seconds=time.perf_counter() - start)
+
+        if data.get("result") != "success":
+            raise ValueError(f"API Error: {data.get('error-type', 'Unknown')}")
+        return data["conversion_rates"]
+
+
+class BatchCurrencyConversionTool(Tool):
+    """Пакетная конвертация набора сумм в одну валюту за один вызов."""
+    name = "batch_currency_converter"
+    description = (
+        "Конвертирует сразу много сумм в разных валютах в одну целевую валюту и возвращает итог. "
+        "Принимает список пар [сумма, валюта], объектов {'amount': ..., 'currency': ...} "
+        "или таблицу результата execute_query целиком."
+    )
+    inputs = {
+        "items": {
+            "type": ["array", "object"],
+            "description": "Суммы для конвертации. Примеры: [[100, 'USD'], [250.5, 'RUB']] "
+                           "или [{'amount': 100, 'currency': 'USD'}]."
+        },
+        "target_currency": {"type": "string", "description": "Целевая валюта (например, 'RUB')."},
+        "amount_field": {"type": "string", "description": "Поле с суммой в объектах. По умолчанию 'amount'.", "nullable": True},
+        "currency_field": {"type": "string", "description": "Поле с валютой в объектах. По умолчанию 'currency'.", "nullable": True}
+    }
+    output_type = "object"
+
+    # Поэлементный результат возвращается только для небольших наборов, чтобы не раздувать контекст
+    max_itemized = 100
+
+    def __init__(self, rate_cache: RateCache):
+        super().__init__()
+        self.rate_cache = rate_cache
+
+    def forward(
+        self,
+        items: List,
+        target_currency: str,
+        amount_field: Optional[str] = None,
+        currency_field: Optional[str] = None,
+    ) -> Dict:
+        amount_field = amount_field or "amount"
+        currency_field = currency_field or "currency"
+        target = target_currency.upper()
+
+        try:
+            amounts, currencies = self._split_items(expand_rows(items), amount_field, currency_field)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            return {"error": f"Некорректный формат items: {str(e)}"}
+        if not amounts:
+            return {"target_currency": target, "total": 0.0, "totals_by_currency": {}}
+
+        # Один курс на каждую уникальную валюту, далее векторное умножение
+        codes, inverse = np.unique(np.array(currencies), return_inverse=True)
+        rates = np.array([self.rate_cache.get_rate(code, target) for code in codes])
+        values = np.asarray(amounts, dtype=float)
+        converted = values * rates[inverse]
+        source_sums = np.bincount(inverse, weights=values, minlength=len(codes))
+        converted_sums = np.bincount(inverse, weights=converted, minlength=len(codes))
+
+        result = {
+            "target_currency": target,
+            "total": round(float(converted.sum()), 2),
+            "count": len(amounts),
+            "totals_by_currency": {
+                str(code): {
+                    "amount": round(float(source_sums[i]), 2),
+                    "rate": float(rates[i]),
+                    "converted": round(float(converted_sums[i]), 2),
+                }
+                for i, code in enumerate(codes)
+            },
+        }
+        if len(amounts) <= self.max_itemized:
+            result["converted_amounts"] = [round(float(v), 2) for v in converted]
+        return result
+
+    @staticmethod
+    def _split_items(items: List, amount_field: str, currency_field: str):
+        """Разбирает элементы в параллельные списки сумм и валют"""
+        amounts, currencies = [], []
+        for item in items:
+            if isinstance(item, dict):
+                amount, currency = item[amount_field], item[currency_field]
+            else:
+                amount, currency = item[0], item[1]
+            if amount is None:
+                continue
+            amounts.append(float(amount))
+            currencies.append(str(currency).upper())
+        return amounts, currencies
 
 
 class ListTablesTool(Tool):
@@ -81,89 +203,56 @@ class ListTablesTool(Tool):
     inputs: dict = {}
     output_type: str = "array"
 
-    def __init__(self, db_url: str = "sqlite:///user_transactions.db"):
+    def __init__(self, db_url: Optional[str] = None, engine: Optional[Engine] = None):
+        """
+        Args:
+            db_url: URL базы данных, если общий движок не передан.
+            engine: Общий движок SQLAlchemy (например, пул из db.get_engine или базы пользователя).
+        """
         super().__init__()
-        self.engine = create_engine(db_url)
+        if engine is None and db_url is None:
+            raise ValueError("Передайте engine или db_url базы данных")
+        self.engine = engine if engine is not None else create_engine(db_url)
         self.inspector = inspect(self.engine)
+        self.catalog = SchemaCatalog(self.engine, self._describe_table)
 
-    def _get_column_samples(self, table: str, column: str, col_type: str) -> Dict:
-        """Возвращает метаданные для столбца"""
+    def forward(self) -> List[Dict]:
+        """Возвращает расширенную структуру таблиц из кэшируемого каталога"""
+        return self.catalog.get()
+
+    def _describe_table(self, table: str) -> Dict:
+        """Собирает DDL и метаданные столбцов одной таблицы"""
+        # Получаем оригинальный DDL
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("SELECT sql FROM sqlite_schema WHERE type='table' AND name=:name"),
+                {"name": table},
+            )
+            create_statement = result.scalar()
+
+        # Собираем метаданные всех столбцов за один проход по таблице
+        columns = [(col['name'], str(col['type'])) for col in inspect(self.engine).get_columns(table)]
         try:
-            with self.engine.connect() as conn:
-                query = text(
-                    f"SELECT DISTINCT {column} FROM {table} "
-                    f"WHERE {column} IS NOT NULL LIMIT 1000"
-                )
-                result = conn.execute(query)
-                values = [row[0] for row in result.fetchall()]
-
-                # Форматирование значений
-                samples = []
-                for v in values[:5]:
-                    if isinstance(v, (int, float)):
-                        samples.append(f"{v:.2f}" if isinstance(v, float) else str(v))
-                    else:
-                        samples.append(str(v)[:50])
-
-                # Анализ уникальных значений
-                unique_count = len(values)
-                metadata = {
-                    "name": column,
-                    "type": col_type,
-                    "unique_values": unique_count,
-                    "examples": samples if unique_count > 0 else ["NULL"]
-                }
-
-                #Специальная обработка для валют
-                if column.lower() == "currency":
-                    metadata["allowed_values"] = ["USD", "RUB", "EUR"]
-                
-                return metadata
-
+            columns_meta = profile_table(self.engine, table, columns)
         except SQLAlchemyError as e:
-            return {
-                "name": column,
-                "type": col_type,
-                "error": str(e)
-            }
-
-    def forward(self) -> List[Dict]:
-        """Возвращает расширенную структуру таблиц"""
-
-        tables_meta = []
-        table_names = self.inspector.get_table_names()
-        
-        for table in table_names:
-            # Получаем оригинальный DDL
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    text(f"SELECT sql FROM sqlite_schema WHERE type='table' AND name='{table}';")
-                )
-                create_statement = result.scalar()
-
-            # Собираем метаданные столбцов
-            columns_meta = []
-            for col in self.inspector.get_columns(table):
-                col_meta = self._get_column_samples(table, col['name'], str(col['type']))
-                columns_meta.append(col_meta)
-
-            # Формируем комментарии для DDL
-            comments = []
-            for col in columns_meta:
-                comment = f"/* {col['name']}: "
-                if "allowed_values" in col:
-                    comment += f"Allowed values: {', '.join(col['allowed_values'])}. "
-                comment += f"Примеры: {', '.join(col['examples'])} */"
-                comments.append(comment)
-                
-            tables_meta.append({
-                "table_name": table,
-                "ddl": create_statement,
-                "columns": columns_meta,
-                "ddl_with_comments": f"{create_statement}\n" + "\n".join(comments)
-            })
-
-        return tables_meta
+            columns_meta = [{"name": name, "type": col_type, "error": str(e)} for name, col_type in columns]
+
+        #Специальная обработка для валют
+        for col_meta in columns_meta:
+            if col_meta["name"].lower() == "currency":
+                col_meta["allowed_values"] = ["USD", "RUB", "EUR"]
+
+        # Примеры и допустимые значения уже есть в профиле столбцов, поэтому DDL не дублируется
+        # версией с комментариями; пробелы форматирования DDL модели не нужны
+        table_meta = {
+            "table_name": table,
+            "ddl": " ".join(create_statement.split()) if create_statement else create_statement,
+            "columns": columns_meta,
+        }
+        # Свёртки помечаются описанием, чтобы агент предпочитал их полному сканированию
+        if table in ROLLUP_DESCRIPTIONS:
+            table_meta["description"] = ROLLUP_DESCRIPTIONS[table]
+        return table_meta
 
 
 class ExecuteQueryTool(Tool):
@@ -181,32 +270,136 @@ class ExecuteQueryTool(Tool):
     }
     output_type = "array"
 
-    def __init__(self, engine: Engine):
+    allowed_tables = frozenset({"transactions", "currencies", "fx_rates"} | set(ROLLUP_DESCRIPTIONS))
+
+    def __init__(
+        self,
+        engine: Engine,
+        query_log: Optional[QueryLog] = None,
+        result_cache: Optional[QueryResultCache] = None,
+        max_rows: int = 200,
+        max_bytes: int = 20_000,
+        chunk_size: int = 1000,
+    ):
+        """
+        Args:
+            engine: Движок SQLAlchemy.
+            query_log: Журнал выполненных запросов для советника по индексам.
+            result_cache: Общий кэш результатов запросов.
+            max_rows: Максимум строк, возвращаемых агенту.
+            max_bytes: Максимальный размер возвращаемых строк (по длине их текстового представления).
+            chunk_size: Размер порции при потоковом чтении результата.
+        """
         super().__init__()
         self.engine = engine
+        self.query_log = query_log
+        self.result_cache = result_cache
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._authorizer = read_only_authorizer(self.allowed_tables)
 
     def forward(self, query: str) -> List[Dict]:
-        """Выполняет SQL-запрос с валидацией и обработкой ошибок"""
+        """Выполняет SQL-запрос с валидацией и обработкой ошибок.
+
+        Результат читается порциями; если он не укладывается в бюджет строк или
+        байт, возвращается один объект с превью, общим числом строк и сводной
+        статистикой по числовым столбцам.
+        """
         try:
             self._validate_query(query)
+            if self.query_log is not None:
+                self.query_log.record(query)
+
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = (normalize_sql(query), self.max_rows, self.max_bytes)
+                cached = self.result_cache.get(cache_key)
+                annotate(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
             
+            start = time.perf_counter()
             with self.engine.connect() as conn:
-                result = conn.execute(text(query).execution_options(autocommit=True))
-                
-                if not result.returns_rows:
-                    return [{"message": "Запрос успешно выполнен (нет результатов)"}]
-
-                columns = result.keys()
-                return [
-                    {col: self._convert_value(row[col]) for col in columns}
-                    for row in result.mappings()
-                ]
+                # Второй уровень защиты: SQLite сам запрещает всё, кроме чтения разрешённых таблиц
+                dbapi_connection = conn.connection.dbapi_connection
+                authorize = hasattr(dbapi_connection, "set_authorizer")
+                if authorize:
+                    dbapi_connection.set_authorizer(self._authorizer)
+                try:
+                    result = conn.execute(text(query).execution_options(autocommit=True))
+
+                    if not result.returns_rows:
+                        return [{"message": "Запрос успешно выполнен (нет результатов)"}]
+
+                    columns = list(result.keys())
+                    rows = self._collect(result, columns)
+                    annotate(
+                        sql_seconds=time.perf_counter() - start,
+                        rows=rows[0]["total_rows"] if rows and rows[0].get("truncated") else len(rows),
+                    )
+                    if cache_key is not None:
+                        self.result_cache.put(cache_key, rows)
+                    return rows
+                finally:
+                    if authorize:
+                        dbapi_connection.set_authorizer(None)
                 
         except exc as e:
             return [{"error": "Ошибка базы данных", "details": str(e)}]
         except Exception as e:
             return [{"error": "Внутренняя ошибка", "details": str(e)}]
 
+    def _collect(self, result, columns: List[str]) -> List[Dict]:
+        """Читает результат порциями, соблюдая бюджет строк и байт"""
+        preview: List[Dict] = []
+        used_bytes = 0
+        total_rows = 0
+        truncated = False
+        summary: Dict[str, Dict[str, float]] = {}
+
+        while True:
+            rows = result.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                total_rows += 1
+                record = {col: self._convert_value(value) for col, value in zip(columns, row)}
+                for col, value in record.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        stats = summary.get(col)
+                        if stats is None:
+                            summary[col] = {"count": 1, "sum": value, "min": value, "max": value}
+                        else:
+                            stats["count"] += 1
+                            stats["sum"] += value
+                            stats["min"] = min(stats["min"], value)
+                            stats["max"] = max(stats["max"], value)
+                if truncated:
+                    continue
+                size = len(repr(record))
+                if len(preview) >= self.max_rows or used_bytes + size > self.max_bytes:
+                    truncated = True
+                    continue
+                preview.append(record)
+                used_bytes += size
+
+        if not truncated:
+            return preview
+
+        for stats in summary.values():
+            stats["sum"] = round(stats["sum"], 2)
+            stats["avg"] = round(stats["sum"] / stats["count"], 2)
+        return [{
+            "truncated": True,
+            "total_rows": total_rows,
+            "returned_rows": len(preview),
+            "message": "Результат слишком большой: показано превью. "
+                       "Используй агрегатные функции, WHERE или LIMIT.",
+            "summary": summary,
+            "rows": preview,
+        }]
+
     def _convert_value(self, value):
         """Конвертирует специальные типы данных"""
         if isinstance(value, decimal.Decimal):
@@ -217,67 +410,190 @@ class ExecuteQueryTool(Tool):
 
     def _validate_query(self, query: str):
         """Проверяет запрос на безопасность"""
-        query = query.upper().strip()
-        
-        # Проверка типа запроса
-        if not query.startswith("SELECT"):
-            raise ValueError("Разрешены только SELECT-запросы")
-
-        # Запрещенные операции
-        forbidden_keywords = {
-            "INSERT", "UPDATE", "DELETE", "DROP", 
-            "ALTER", "CREATE", "TRUNCATE", "GRANT"
-        }
-        for keyword in forbidden_keywords:
-            if keyword in query:
-                raise ValueError(f"Запрещенная операция: {keyword}")
+        validate_query(query, self.allowed_tables)
 
-        # Проверка доступных таблиц
-        allowed_tables = {"TRANSACTIONS", "CURRENCIES"}  # В верхнем регистре
-        from_match = re.search(r"FROM\s+(\w+)", query, re.IGNORECASE)
-        if from_match and from_match.group(1).upper() not in allowed_tables:
-            raise ValueError("Доступ к этой таблице запрещен")
+
+class AnalyticsTool(Tool):
+    """Аналитика по транзакциям одним вызовом поверх кадра в памяти (analytics.py)."""
+    name = "analytics"
+    description = """
+    Готовая аналитика по transactions без SQL, суммы пересчитаны в одну валюту по курсу на дату операции.
+    analysis: totals — итог, количество, среднее (с group_by — по группам);
+    trend — итоги по периодам со скользящим средним и изменением к предыдущему периоду;
+    compare — период против предыдущего и того же периода год назад (по умолчанию последний период с данными);
+    share — доли групп в итоге.
+    """
+    inputs = {
+        "analysis": {"type": "string", "description": "totals, trend, compare или share"},
+        "operation_type": {"type": "string", "description": "expense (по умолчанию) или income", "nullable": True},
+        "period": {"type": "string", "description": "day, week, month (по умолчанию), quarter или year", "nullable": True},
+        "group_by": {"type": "string", "description": "currency, location или comment", "nullable": True},
+        "start": {"type": "string", "description": "Начало диапазона YYYY-MM-DD включительно", "nullable": True},
+        "end": {"type": "string", "description": "Конец диапазона YYYY-MM-DD включительно", "nullable": True},
+        "currency": {"type": "string", "description": "Валюта итогов. По умолчанию 'RUB'", "nullable": True},
+        "window": {"type": "integer", "description": "Окно скользящего среднего в периодах для trend. По умолчанию 3", "nullable": True},
+        "top": {"type": "integer", "description": "Сколько групп вернуть. По умолчанию 10", "nullable": True}
+    }
+    output_type = "object"
+
+    def __init__(self, analytics: TransactionAnalytics):
+        """
+        Args:
+            analytics: Аналитика над общим кадром транзакций.
+        """
+        super().__init__()
+        self.analytics = analytics
+
+    def forward(
+        self,
+        analysis: str,
+        operation_type: Optional[str] = None,
+        period: Optional[str] = None,
+        group_by: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        currency: Optional[str] = None,
+        window: Optional[int] = None,
+        top: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        common = {
+            "operation_type": (operation_type or "expense").lower(),
+            "currency": (currency or "RUB").upper(),
+            "start": start,
+            "end": end,
+        }
+        period = (period or "month").lower()
+        try:
+            if period not in PERIODS:
+                raise ValueError(f"Неизвестный период {period!r}; доступны: {', '.join(PERIODS)}")
+            # Явный 0 не подменяется значением по умолчанию, а отклоняется
+            window = 3 if window is None else int(window)
+            top = 10 if top is None else int(top)
+            if top < 1:
+                raise ValueError("top должен быть не меньше 1")
+            analysis = analysis.lower()
+            if analysis == "totals":
+                result = self.analytics.totals(group_by=group_by, top=top, **common)
+            elif analysis == "trend":
+                result = self.analytics.trend(period=period, window=window, **common)
+            elif analysis == "compare":
+                result = self.analytics.compare(period=period, group_by=group_by, top=top, **common)
+            elif analysis == "share":
+                result = self.analytics.share(group_by=group_by or "comment", top=top, **common)
+            else:
+                raise ValueError("analysis должен быть totals, trend, compare или share")
+        except ValueError as e:
+            return {"error": f"Ошибка аналитики: {str(e)}"}
+        annotate(frame_rows=len(self.analytics.frame.get()))
+        return result
 
 
 class CalculatorTool(Tool):
     name = "calculator"
     description = """
-    Выполняет математические вычисления. Поддерживает:
-    - Базовые арифметические операции (+-*/)
-    - Суммирование списка чисел
-    - Работу с десятичными числами
+    Точные вычисления в Decimal: + - * / // % **, скобки, функции abs, round, min, max, sum, avg, sqrt.
+    Несколько независимых выражений считаются одним вызовом (expressions).
+    Формула от x применяется сразу ко всему списку чисел или строкам execute_query (values);
+    в строках числовые поля доступны и по своим именам.
     """
     inputs = {
         "expression": {
             "type": "string",
             "description": "Выражение для вычисления. Примеры: "
                           "'45.7 + 128.91', "
-                          "'сумма 100 200 300'"
+                          "'сумма 100 200 300', "
+                          "с values: 'x * 0.87' или 'amount * 90.5'",
+            "nullable": True
+        },
+        "expressions": {
+            "type": "array",
+            "description": "Список выражений; результаты возвращаются в том же порядке",
+            "nullable": True
+        },
+        "values": {
+            "type": ["array", "object"],
+            "description": "Числа или таблица execute_query, к каждому значению или строке применяется expression",
+            "nullable": True
+        },
+        "field": {
+            "type": "string",
+            "description": "Поле строки, доступное в expression как x. По умолчанию 'amount'",
+            "nullable": True
+        },
+        "precision": {
+            "type": "integer",
+            "description": "Знаков после запятой в результате. По умолчанию 2",
+            "nullable": True
         }
     }
     output_type = "object"
 
-    def forward(self, expression: str) -> Dict[str, Union[float, str]]:
+    # Поэлементный результат возвращается только для небольших наборов, чтобы не раздувать контекст
+    max_itemized = 100
+
+    def forward(
+        self,
+        expression: Optional[str] = None,
+        expressions: Optional[List[str]] = None,
+        values: Optional[List] = None,
+        field: Optional[str] = None,
+        precision: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        precision = 2 if precision is None else int(precision)
         try:
-            # Нормализация выражения
-            expr = expression.lower().replace(',', '.').strip()
-            
-            # Обработка команды "сумма"
-            if expr.startswith("сумма"):
-                numbers = [float(n) for n in re.findall(r'\d+\.?\d*', expr)]
-                result = sum(numbers)
-            else:
-                # Проверка на безопасные символы
-                if not re.fullmatch(r'^[\d\s\.\+\-\*\/\(\)]+$', expr):
-                    raise ValueError("Выражение содержит недопустимые символы")
-                
-                # Замена альтернативных символов операций
-                expr = expr.replace('×', '*').replace('÷', '/')
-                
-                # Безопасное вычисление
-                result = eval(expr, {'__builtins__': None}, {})
-            
-            return {"result": round(float(result), 2)}
-            
+            if values is not None:
+                if not expression:
+                    raise ValueError("Для values нужна формула в expression, например 'x * 0.87'")
+                return self._evaluate_values(expression, expand_rows(values), field or "amount", precision)
+            if expressions:
+                return self._evaluate_many(expressions, precision)
+            if not expression:
+                raise ValueError("Передайте expression или expressions")
+            return {"result": self._evaluate(expression, precision)}
         except Exception as e:
-            return {"error": f"Ошибка вычисления: {str(e)}"}
\ No newline at end of file
+            return {"error": f"Ошибка вычисления: {str(e)}"}
+
+    @staticmethod
+    def _evaluate(expression: str, precision: int) -> float:
+        expr = expression.lower().strip()
+        # Обработка команды "сумма"
+        if expr.startswith("сумма"):
+            numbers = re.findall(r'-?\d+(?:[.,]\d+)?', expr)
+            return to_number(sum((decimal.Decimal(n.replace(',', '.')) for n in numbers), decimal.Decimal(0)), precision)
+        return to_number(compile_expression(expression).evaluate(), precision)
+
+    def _evaluate_many(self, expressions: List[str], precision: int) -> Dict[str, Any]:
+        results, errors = [], {}
+        for i, expression in enumerate(expressions):
+            try:
+                results.append(self._evaluate(str(expression), precision))
+            except Exception as e:
+                results.append(None)
+                errors[i] = str(e)
+        annotate(expressions=len(expressions))
+        return {"results": results, "errors": errors} if errors else {"results": results}
+
+    def _evaluate_values(self, expression: str, values: List, field: str, precision: int) -> Dict[str, Any]:
+        compiled = compile_expression(expression)
+        if values and isinstance(values[0], dict):
+            columns = {
+                name: np.array([row.get(field if name == "x" else name) for row in values], dtype=float)
+                for name in compiled.variables
+            }
+        else:
+            columns = {"x": np.array(values, dtype=float)}
+        result = compiled.evaluate_vector(columns) if values else np.array([])
+        finite = np.isfinite(result)
+        valid = result[finite]
+        annotate(values=len(values))
+        summary: Dict[str, Any] = {"count": int(valid.size)}
+        if valid.size:
+            # Половина — от нуля, как to_number у скалярных выражений
+            stats = round_half_up([valid.sum(), valid.mean(), valid.min(), valid.max()], precision)
+            summary.update(zip(("sum", "mean", "min", "max"), stats.tolist()))
+        if valid.size < result.size:
+            summary["skipped"] = int(result.size - valid.size)
+        if result.size <= self.max_itemized:
+            rounded = round_half_up(result, precision).tolist()
+            summary["results"] = [v if ok else None for v, ok in zip(rounded, finite)]
+        return summary
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""Фоновое выполнение запросов к агенту с потоковой выдачей шагов.
+
+Запрос выполняется в пуле потоков, а события (вызовы инструментов, SQL,
+наблюдения, фрагменты ответа модели) складываются в очередь, которую
+интерфейс забирает без блокировки. Выполнение можно остановить: агент
+прерывается перед следующим шагом, уже полученные события сохраняются,
+а события после отмены отбрасываются.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from smolagents.agents import ActionOutput, ToolOutput
+from smolagents.memory import ActionStep, FinalAnswerStep, ToolCall
+from smolagents.models import ChatMessageStreamDelta
+
+DEFAULT_MAX_WORKERS = 8
+MAX_OBSERVATION_CHARS = 2000
+
+
+def agent_events(agent, query: str) -> Iterator[Dict[str, Any]]:
+    """Запускает агента в потоковом режиме и переводит его шаги в простые события.
+
+    Типы событий:
+        * ``delta`` — фрагмент текста модели (``text``);
+        * ``tool_call`` — вызов инструмента (``name``, ``arguments``);
+        * ``observation`` — результат инструмента (``name``, ``observation``);
+        * ``step`` — шаг завершён (``step``, ``duration``, ``error``);
+        * ``final`` — окончательный ответ (``answer``).
+    """
+    for event in agent.run(query, stream=True):
+        if isinstance(event, ChatMessageStreamDelta):
+            if event.content:
+                yield {"type": "delta", "text": event.content}
+        elif isinstance(event, ToolCall):
+            if event.name != "final_answer":
+                yield {"type": "tool_call", "name": event.name, "arguments": event.arguments}
+        elif isinstance(event, ToolOutput):
+            if not event.is_final_answer:
+                observation = str(event.observation)
+                if len(observation) > MAX_OBSERVATION_CHARS:
+                    observation = observation[:MAX_OBSERVATION_CHARS] + "…"
+                yield {"type": "observation", "name": event.tool_call.name, "observation": observation}
+        elif isinstance(event, ActionStep):
+            yield {
+                "type": "step",
+                "step": event.step_number,
+                "duration": event.timing.duration,
+                "error": str(event.error) if event.error else None,
+            }
+        elif isinstance(event, FinalAnswerStep):
+            yield {"type": "final", "answer": event.output}
+        elif isinstance(event, ActionOutput):
+            continue
+
+
+class AgentRun:
+    """Одно выполнение запроса: очередь событий, статус и отмена.
+
+    Args:
+        query: Текст запроса.
+        agent: Агент этой сессии; используется для прерывания.
+    """
+
+    def __init__(self, query: str, agent=None):
+        self.query = query
+        self.agent = agent
+        self.events: List[Dict[str, Any]] = []
+        self.answer: Any = None
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+        self._queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._cancel = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Забирает накопившиеся события без ожидания и возвращает новые"""
+        new = []
+        while True:
+            try:
+                new.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self.events.extend(new)
+        return new
+
+    def cancel(self):
+        """Просит агента остановиться перед следующим шагом.
+
+        Флаг агента сбрасывается в начале agent.run(), поэтому запрос,
+        который ещё ждёт в очереди пула, останавливает сам _run.
+        """
+        self._cancel.set()
+        if self.agent is not None:
+            self.agent.interrupt()
+
+    def _run(self, events: Callable[[], Iterator[Dict[str, Any]]]):
+        stream = None
+        try:
+            if self._cancel.is_set():
+                return
+            stream = events()
+            for event in stream:
+                # После отмены события (и ответ) отбрасываются; закрытие
+                # генератора останавливает агента и не даёт записать ответ в кэш
+                if self._cancel.is_set():
+                    break
+                if event["type"] == "final":
+                    self.answer = event["answer"]
+                self._queue.put(event)
+        except Exception as e:
+            if not self._cancel.is_set():
+                self.error = str(e)
+                self._queue.put({"type": "error", "error": self.error})
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            if self._cancel.is_set() and self.answer is None:
+                self.cancelled = True
+                self._queue.put({"type": "cancelled"})
+            self.finished = time.monotonic()
+
+
+class AgentRunner:
+    """Пул потоков, в котором выполняются запросы всех сессий.
+
+    Args:
+        max_workers: Сколько запросов выполняется одновременно; остальные ждут в очереди пула.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+
+    def submit(self, query: str, events: Callable[[], Iterator[Dict[str, Any]]], agent=None) -> AgentRun:
+        """Ставит запрос в очередь.
+
+        Args:
+            query: Текст запроса.
+            events: Функция без аргументов, возвращающая итератор событий (см. agent_events).
+            agent: Агент, которого нужно прерывать при отмене.
+        """
+        run = AgentRun(query, agent)
+        run._queue.put({"type": "queued"})
+        run.future = self._executor.submit(run._run, events)
+        return run
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,638 @@
+"""Аналитика по transactions в памяти процесса.
+
+Таблица загружается в столбцы NumPy (TransactionFrame): даты — номера дней,
+текстовые столбцы — коды категорий, суммы — float64. Кадр держится
+в памяти и догружается по id: при изменении файла базы читаются только
+строки с id больше последнего загруженного. Если число строк в базе
+не сходится с кадром (удаления), кадр перечитывается целиком; правка
+старых строк на месте без удалений не отслеживается — для неё есть reload().
+Кадр сохраняется рядом с базой (``<db>.frame.npz``), и после перезапуска
+процесса догружаются только новые строки; снимок, который не сходится с
+базой (число строк, последний id, сумма amount), не используется.
+
+Суммы пересчитываются в целевую валюту по курсу на дату операции из
+fx_rates (fx_history), а если исторического курса нет — по текущему курсу.
+Пересчитанный столбец кэшируется по валюте и тоже дополняется по id.
+
+Группировки, скользящие средние и сравнения периодов считаются
+``np.bincount`` по отфильтрованным строкам, поэтому вопрос «как изменились
+траты к прошлому году» на миллионах строк занимает миллисекунды.
+"""
+import datetime
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from schema_catalog import DataVersionProbe
+
+CATEGORICAL_COLUMNS = ("currency", "operation_type", "location", "comment")
+PERIODS = ("day", "week", "month", "quarter", "year")
+NO_DATE = -1
+
+_EPOCH = datetime.date(1970, 1, 1)
+_NAT = np.datetime64("NaT", "D").astype(np.int64)
+
+
+class FrameData:
+    """Неизменяемый снимок кадра; новые данные приходят новым снимком.
+
+    Attributes:
+        ids: id строк по возрастанию.
+        day: Дата операции — номер дня от 1970-01-01 (NO_DATE, если даты нет).
+        amount: Сумма в валюте операции (nan, если суммы нет).
+        codes: Коды категорий текстовых столбцов.
+        categories: Значения категорий по кодам.
+        generation: Номер полной загрузки; дополнение по id его не меняет.
+    """
+
+    def __init__(self, ids: np.ndarray, day: np.ndarray, amount: np.ndarray,
+                 codes: Dict[str, np.ndarray], categories: Dict[str, List], generation: int):
+        self.ids = ids
+        self.day = day
+        self.amount = amount
+        self.codes = codes
+        self.categories = categories
+        self.generation = generation
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @functools.cached_property
+    def months(self) -> np.ndarray:
+        """Номер месяца от 1970-01 для каждой строки (считается один раз на снимок)"""
+        return self.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+    def code_of(self, column: str, value: Any) -> Optional[int]:
+        """Код значения текстового столбца или None, если такого значения нет"""
+        try:
+            return self.categories[column].index(value)
+        except ValueError:
+            return None
+
+
+def _empty_data(generation: int) -> FrameData:
+    return FrameData(
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0),
+        {column: np.empty(0, dtype=np.int32) for column in CATEGORICAL_COLUMNS},
+        {column: [] for column in CATEGORICAL_COLUMNS}, generation,
+    )
+
+
+def _parse_days(values: Tuple) -> np.ndarray:
+    try:
+        days = np.array(values, dtype="datetime64[D]").astype(np.int64)
+    except ValueError:
+        days = np.array([_parse_day(value) for value in values], dtype=np.int64)
+    return np.where(days == _NAT, NO_DATE, days)
+
+
+def _parse_day(value: Optional[str]) -> int:
+    try:
+        return (datetime.date.fromisoformat(value) - _EPOCH).days
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+class TransactionFrame:
+    """Таблица transactions в столбцах NumPy с догрузкой новых строк по id.
+
+    Изменения файла проверяются через PRAGMA data_version не чаще раза
+    в ``check_interval`` секунд.
+
+    Args:
+        db_path: Путь к файлу SQLite.
+        check_interval: Интервал проверки изменений, секунд.
+        chunk_size: Сколько строк читать из базы за раз.
+        cache_path: Файл снимка кадра. По умолчанию ``<db>.frame.npz``;
+            ``False`` отключает сохранение на диск.
+    """
+
+    def __init__(self, db_path: str, check_interval: float = 1.0, chunk_size: int = 100_000,
+                 cache_path: Optional[str] = None):
+        self.db_path = db_path
+        if cache_path is None:
+            cache_path = f"{db_path}.frame.npz"
+        self.cache_path = cache_path or None
+        self.check_interval = check_interval
+        self.chunk_size = chunk_size
+        self._probe = DataVersionProbe(db_path)
+        self._lock = threading.Lock()
+        self._data: Optional[FrameData] = None
+        self._index: Dict[str, Dict[Any, int]] = {}
+        self._version: Optional[int] = None
+        self._next_check = 0.0
+        self.full_loads = 0
+        self.appended = 0
+
+    def get(self) -> FrameData:
+        """Актуальный снимок кадра (загружает или догружает при необходимости)"""
+        data = self._data
+        if data is not None and time.monotonic() < self._next_check:
+            return data
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            version = self._probe.data_version()
+            if self._data is None or version is None or version != self._version:
+                self._version = version
+                if self._data is None:
+                    self._load_persisted()
+                self._refresh()
+            return self._data
+
+    def reload(self) -> FrameData:
+        """Перечитывает таблицу целиком"""
+        with self._lock:
+            self._version = self._probe.data_version()
+            self._load_all()
+            return self._data
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def _refresh(self):
+        if self._data is None:
+            self._load_all()
+            return
+        conn = self._connect()
+        try:
+            last_id = int(self._data.ids[-1]) if len(self._data) else 0
+            new = self._read(conn, last_id)
+            count = self._count(conn)
+        finally:
+            conn.close()
+        if count != len(self._data) + len(new):
+            # Строки удалялись (или id переиспользованы): догрузка по id невозможна
+            self._load_all()
+        elif len(new):
+            self._data = self._concat(self._data, new)
+            self.appended += len(new)
+            self._persist()
+
+    def _load_all(self):
+        self._index = {column: {} for column in CATEGORICAL_COLUMNS}
+        generation = self._data.generation + 1 if self._data is not None else 0
+        conn = self._connect()
+        try:
+            self._data = self._concat(_empty_data(generation), self._read(conn, None))
+        finally:
+            conn.close()
+        self.full_loads += 1
+        self._persist()
+
+    def _load_persisted(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path) as saved:
+                categories = json.loads(str(saved["categories"]))
+                data = FrameData(
+                    saved["ids"], saved["day"], saved["amount"],
+                    {column: saved[f"codes_{column}"] for column in CATEGORICAL_COLUMNS},
+                    {column: categories[column] for column in CATEGORICAL_COLUMNS}, 0,
+                )
+        except (OSError, KeyError, ValueError):
+            return
+        if not self._matches(data):
+            return
+        # Дальше снимок дополняется так же, как кадр в памяти (см. _refresh)
+        self._index = {column: {value: code for code, value in enumerate(data.categories[column])}
+                       for column in CATEGORICAL_COLUMNS}
+        self._data = data
+
+    def _matches(self, data: FrameData) -> bool:
+        """Совпадают ли строки базы с id до последнего в снимке со снимком.
+
+        Сверяются число строк, последний id и сумма amount: так снимок
+        другой базы с тем же числом строк или после удалений и правок
+        сумм не используется, а строки, добавленные после него, догружаются.
+        """
+        conn = self._connect()
+        try:
+            if not self._exists(conn):
+                return not len(data)
+            last_id = int(data.ids[-1]) if len(data) else 0
+            count, max_id, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(amount) FROM transactions WHERE id <= ?",
+                (last_id,),
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+        expected = float(np.nansum(data.amount))
+        return (
+            count == len(data) and max_id == last_id
+            and abs(total - expected) <= 1e-9 * max(1.0, abs(expected))
+        )
+
+    def _persist(self):
+        if not self.cache_path:
+            return
+        data = self._data
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f, ids=data.ids, day=data.day, amount=data.amount,
+                    categories=np.array(json.dumps(data.categories, ensure_ascii=False)),
+                    **{f"codes_{column}": data.codes[column] for column in CATEGORICAL_COLUMNS},
+                )
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Кадр продолжает работать из памяти, если директория недоступна для записи
+            pass
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection) -> int:
+        if not TransactionFrame._exists(conn):
+            return 0
+        return conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    @staticmethod
+    def _exists(conn: sqlite3.Connection) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_schema WHERE type='table' AND name='transactions'"
+        ).fetchone() is not None
+
+    def _read(self, conn: sqlite3.Connection, after_id: Optional[int]) -> FrameData:
+        """Строки с id > after_id (все, если None) в виде кадра без поколения"""
+        parts = []
+        if self._exists(conn):
+            cursor = conn.execute(
+                "SELECT id, currency, amount, operation_type, location, comment, "
+                "substr(operation_date, 1, 10) FROM transactions WHERE id > ? ORDER BY id",
+                (after_id if after_id is not None else -1,),
+            )
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                ids, currency, amount, operation_type, location, comment, dates = zip(*rows)
+                text = dict(zip(CATEGORICAL_COLUMNS, (currency, operation_type, location, comment)))
+                parts.append((
+                    np.array(ids, dtype=np.int64),
+                    _parse_days(dates),
+                    np.array(amount, dtype=float),
+                    {column: self._encode(column, values) for column, values in text.items()},
+                ))
+        if not parts:
+            return _empty_data(-1)
+        return FrameData(
+            np.concatenate([part[0] for part in parts]),
+            np.concatenate([part[1] for part in parts]),
+            np.concatenate([part[2] for part in parts]),
+            {column: np.concatenate([part[3][column] for part in parts]) for column in CATEGORICAL_COLUMNS},
+            {column: list(self._index[column]) for column in CATEGORICAL_COLUMNS},
+            -1,
+        )
+
+    def _encode(self, column: str, values: Tuple) -> np.ndarray:
+        index = self._index.setdefault(column, {})
+        return np.fromiter((index.setdefault(value, len(index)) for value in values),
+                           dtype=np.int32, count=len(values))
+
+    def _concat(self, data: FrameData, new: FrameData) -> FrameData:
+        return FrameData(
+            np.concatenate([data.ids, new.ids]),
+            np.concatenate([data.day, new.day]),
+            np.concatenate([data.amount, new.amount]),
+            {column: np.concatenate([data.codes[column], new.codes[column]]) for column in CATEGORICAL_COLUMNS},
+            {column: list(self._index[column]) for column in CATEGORICAL_COLUMNS},
+            data.generation,
+        )
+
+
+class CurrencyColumn:
+    """Суммы кадра в одной валюте: курс на дату операции, иначе текущий курс.
+
+    Курс считается один раз на уникальную пару (валюта, день). Столбец
+    кэшируется по валюте и дополняется при догрузке строк; при смене
+    версии истории курсов он пересчитывается целиком.
+
+    Args:
+        historical_rate: ``rate(base, quote, date)`` из истории курсов или None.
+        current_rate: ``get_rate(base, quote)`` — текущий курс или None.
+        rates_version: ``version()`` истории курсов (FxRateStore.version) или None.
+    """
+
+    def __init__(self, historical_rate: Optional[Callable[[str, str, str], Optional[float]]] = None,
+                 current_rate: Optional[Callable[[str, str], float]] = None,
+                 rates_version: Optional[Callable[[], int]] = None):
+        self.historical_rate = historical_rate
+        self.current_rate = current_rate
+        self.rates_version = rates_version
+        self._lock = threading.Lock()
+        # валюта → ((поколение кадра, версия курсов), суммы, валюты по текущему курсу)
+        self._cache: Dict[str, Tuple[Tuple[int, int], np.ndarray, frozenset]] = {}
+
+    def get(self, data: FrameData, target: str) -> Tuple[np.ndarray, frozenset]:
+        """Суммы в target для всех строк кадра и валюты, пересчитанные по текущему курсу"""
+        key = (data.generation, self.rates_version() if self.rates_version is not None else 0)
+        with self._lock:
+            cached = self._cache.get(target)
+            if cached is not None and cached[0] == key and len(cached[1]) == len(data):
+                return cached[1], cached[2]
+            start = len(cached[1]) if cached is not None and cached[0] == key else 0
+            converted, current = self._convert(data, target, start)
+            if start:
+                converted = np.concatenate([cached[1][:start], converted])
+                current = current | cached[2]
+            self._cache[target] = (key, converted, current)
+            return converted, current
+
+    def _convert(self, data: FrameData, target: str, start: int) -> Tuple[np.ndarray, frozenset]:
+        currency = data.codes["currency"][start:].astype(np.int64)
+        day = data.day[start:]
+        # Ключ пары (валюта, день); NO_DATE становится нулём
+        keys, inverse = np.unique(currency * (1 << 32) + (day - NO_DATE), return_inverse=True)
+        rates = np.empty(len(keys))
+        current_used, current_rates = set(), {}
+        for i, key in enumerate(keys.tolist()):
+            code, day_number = divmod(key, 1 << 32)
+            base = data.categories["currency"][code]
+            rates[i] = np.nan
+            if base is None:
+                continue
+            base = str(base).upper()
+            rate = None
+            if self.historical_rate is not None and day_number + NO_DATE != NO_DATE:
+                date = (_EPOCH + datetime.timedelta(days=day_number + NO_DATE)).isoformat()
+                rate = self.historical_rate(base, target, date)
+            if rate is None and base == target:
+                rate = 1.0
+            if rate is None and self.current_rate is not None:
+                if base not in current_rates:
+                    try:
+                        current_rates[base] = self.current_rate(base, target)
+                    except Exception:
+                        current_rates[base] = None
+                rate = current_rates[base]
+                if rate is not None:
+                    current_used.add(base)
+            if rate is not None:
+                rates[i] = rate
+        return data.amount[start:] * rates[inverse.reshape(-1)], frozenset(current_used)
+
+
+def period_index(day: np.ndarray, period: str, months: Optional[np.ndarray] = None) -> np.ndarray:
+    """Номер периода для каждого дня (недели начинаются с понедельника).
+
+    Args:
+        months: Готовые номера месяцев для тех же дней (FrameData.months).
+    """
+    if period == "day":
+        return day
+    if period == "week":
+        # 1970-01-01 — четверг: сдвиг на 3 дня делает понедельник началом недели
+        return (day + 3) // 7
+    if months is None:
+        months = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if period == "month":
+        return months
+    if period == "quarter":
+        return months // 3
+    if period == "year":
+        return months // 12
+    raise ValueError(f"Неизвестный период {period!r}; доступны: {', '.join(PERIODS)}")
+
+
+def period_bounds(index: int, period: str) -> Tuple[int, int]:
+    """Первый и последний день периода"""
+    if period == "day":
+        return index, index
+    if period == "week":
+        first = index * 7 - 3
+        return first, first + 6
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    first_month = index * months
+    first = np.datetime64(first_month, "M").astype("datetime64[D]").astype(np.int64)
+    last = np.datetime64(first_month + months, "M").astype("datetime64[D]").astype(np.int64) - 1
+    return int(first), int(last)
+
+
+def period_label(index: int, period: str) -> str:
+    if period == "quarter":
+        return f"{1970 + index // 4}-Q{index % 4 + 1}"
+    if period == "year":
+        return str(1970 + index)
+    if period == "month":
+        return str(np.datetime64(index, "M"))
+    return day_label(period_bounds(index, period)[0])
+
+
+def day_label(day: int) -> str:
+    return (_EPOCH + datetime.timedelta(days=int(day))).isoformat()
+
+
+def parse_day(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    day = _parse_day(str(value).strip()[:10])
+    if day == NO_DATE:
+        raise ValueError(f"Дата должна быть в формате YYYY-MM-DD: {value!r}")
+    return day
+
+
+def shift_months(day: int, months: int) -> int:
+    """Тот же день месяца months месяцев назад/вперёд (31-е → последний день короткого месяца)"""
+    date = _EPOCH + datetime.timedelta(days=int(day))
+    year, month = divmod(date.year * 12 + date.month - 1 + months, 12)
+    first = (datetime.date(year, month + 1, 1) - _EPOCH).days
+    month_last = int(np.datetime64(year * 12 + month - 1970 * 12 + 1, "M").astype("datetime64[D]").astype(np.int64)) - 1
+    return min(first + date.day - 1, month_last)
+
+
+def _money(value: float) -> float:
+    return round(float(value), 2)
+
+
+def _change(current: float, base: float) -> Optional[float]:
+    return round(float((current - base) / abs(base) * 100), 1) if base else None
+
+
+class TransactionAnalytics:
+    """Аналитические запросы к кадру: итоги, динамика, сравнение периодов, доли.
+
+    Args:
+        frame: Кадр транзакций.
+        currency_column: Пересчёт сумм в целевую валюту.
+    """
+
+    max_points = 60
+
+    def __init__(self, frame: TransactionFrame, currency_column: Optional[CurrencyColumn] = None):
+        self.frame = frame
+        self.currency_column = currency_column or CurrencyColumn()
+
+    def _prepare(self, operation_type: str, currency: str, start: Optional[str], end: Optional[str]):
+        data = self.frame.get()
+        values, current = self.currency_column.get(data, currency)
+        type_code = data.code_of("operation_type", operation_type)
+        mask = (data.codes["operation_type"] == (type_code if type_code is not None else -1))
+        mask &= data.day != NO_DATE
+        first, last = parse_day(start), parse_day(end)
+        if first is not None:
+            mask &= data.day >= first
+        if last is not None:
+            mask &= data.day <= last
+        unconverted = int(np.count_nonzero(mask & np.isnan(values)))
+        mask &= ~np.isnan(values)
+        meta: Dict[str, Any] = {"currency": currency, "operation_type": operation_type}
+        if current:
+            meta["current_rate_currencies"] = sorted(current)
+        if unconverted:
+            meta["unconverted_rows"] = unconverted
+        return data, values, mask, meta
+
+    def _grouped(self, data: FrameData, values: np.ndarray, mask: np.ndarray, group_by: str):
+        if group_by not in CATEGORICAL_COLUMNS:
+            raise ValueError(f"Группировка возможна по {', '.join(CATEGORICAL_COLUMNS)}")
+        codes = data.codes[group_by]
+        size = len(data.categories[group_by])
+        rows = np.flatnonzero(mask)
+        if len(rows) < len(mask) // 4:
+            # Узкий диапазон (месяц, квартал): дешевле выбрать строки по номерам
+            totals = np.bincount(codes[rows], weights=values[rows], minlength=size)
+            counts = np.bincount(codes[rows], minlength=size)
+        else:
+            # Широкий: веса вместо выборки, без копирования отобранных строк
+            totals = np.bincount(codes, weights=np.where(mask, values, 0.0), minlength=size)
+            counts = np.bincount(codes, weights=mask, minlength=size).astype(np.int64)
+        return totals, counts, data.categories[group_by]
+
+    def totals(self, operation_type: str = "expense", currency: str = "RUB", start: Optional[str] = None,
+               end: Optional[str] = None, group_by: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+        """Сумма, количество и среднее; с group_by — по группам, крупные сначала"""
+        data, values, mask, result = self._prepare(operation_type, currency, start, end)
+        selected = values[mask]
+        result.update({
+            "total": _money(selected.sum()),
+            "count": int(selected.size),
+            "mean": _money(selected.mean()) if selected.size else None,
+            "max": _money(selected.max()) if selected.size else None,
+        })
+        if group_by:
+            totals, counts, names = self._grouped(data, values, mask, group_by)
+            order = [i for i in np.argsort(-totals, kind="stable") if counts[i]][:top]
+            result["group_by"] = group_by
+            result["groups"] = [
+                {"group": names[i], "total": _money(totals[i]), "count": int(counts[i]),
+                 "mean": _money(totals[i] / counts[i])}
+                for i in order
+            ]
+        return result
+
+    def trend(self, operation_type: str = "expense", currency: str = "RUB", start: Optional[str] = None,
+              end: Optional[str] = None, period: str = "month", window: int = 3) -> Dict[str, Any]:
+        """Итоги по периодам (пустые периоды — нули), скользящее среднее и изменение к предыдущему"""
+        window = int(window)
+        if window < 1:
+            raise ValueError("Окно скользящего среднего должно быть не меньше 1")
+        data, values, mask, result = self._prepare(operation_type, currency, start, end)
+        result.update({"period": period, "window": window, "points": []})
+        if not mask.any():
+            return result
+        index = period_index(data.day, period, data.months)
+        selected = index[mask]
+        first, last = int(selected.min()), int(selected.max())
+        offsets = np.where(mask, index - first, 0)
+        totals = np.bincount(offsets, weights=np.where(mask, values, 0.0), minlength=last - first + 1)
+        counts = np.bincount(offsets, weights=mask, minlength=last - first + 1).astype(np.int64)
+        cumulative = np.concatenate([[0.0], np.cumsum(totals)])
+        points = []
+        for i, total in enumerate(totals):
+            point = {"period": period_label(first + i, period), "total": _money(total), "count": int(counts[i])}
+            if i + 1 >= window:
+                point["rolling_mean"] = _money((cumulative[i + 1] - cumulative[i + 1 - window]) / window)
+            if i:
+                point["change_pct"] = _change(total, totals[i - 1])
+            points.append(point)
+        if len(points) > self.max_points:
+            result["omitted_points"] = len(points) - self.max_points
+            points = points[-self.max_points:]
+        result["points"] = points
+        return result
+
+    def compare(self, operation_type: str = "expense", currency: str = "RUB", start: Optional[str] = None,
+                end: Optional[str] = None, period: str = "month", group_by: Optional[str] = None,
+                top: int = 10) -> Dict[str, Any]:
+        """Текущий период против предыдущего и того же периода год назад.
+
+        Текущий период — [start, end] или последний период с данными.
+        Незавершённый период сравнивается с тем же числом дней предыдущих.
+        """
+        data, values, mask, result = self._prepare(operation_type, currency, None, None)
+        if start is not None or end is not None:
+            days = data.day[mask]
+            first = parse_day(start) if start is not None else int(days.min()) if days.size else 0
+            last = parse_day(end) if end is not None else int(days.max()) if days.size else first
+            previous = (first - (last - first + 1), first - 1)
+        else:
+            if not mask.any():
+                return dict(result, error="Нет операций для сравнения")
+            latest = int(data.day[mask].max())
+            current_index = int(period_index(np.array([latest]), period)[0])
+            first, period_last = period_bounds(current_index, period)
+            last = min(period_last, latest)
+            previous_first, previous_last = period_bounds(current_index - 1, period)
+            if last < period_last:
+                # Незавершённый период: столько же дней (для месяцев — по календарю) от начала предыдущего
+                months = {"month": 1, "quarter": 3, "year": 12}.get(period)
+                elapsed_last = shift_months(last, -months) if months else previous_first + (last - first)
+                previous_last = min(previous_last, elapsed_last)
+            previous = (previous_first, previous_last)
+            result["period"] = period_label(current_index, period)
+        ranges = {"current": (first, last), "previous": previous,
+                  "year_ago": (shift_months(first, -12), shift_months(last, -12))}
+
+        selections = {}
+        for name, (low, high) in ranges.items():
+            selected = mask & (data.day >= low) & (data.day <= high)
+            selections[name] = selected
+            total = values[selected].sum()
+            result[name] = {"start": day_label(low), "end": day_label(high),
+                            "total": _money(total), "count": int(np.count_nonzero(selected))}
+        for name in ("previous", "year_ago"):
+            result[name]["change_pct"] = _change(result["current"]["total"], result[name]["total"])
+
+        if group_by:
+            grouped = {name: self._grouped(data, values, selected, group_by)
+                       for name, selected in selections.items()}
+            current_totals, current_counts, names = grouped["current"]
+            order = [i for i in np.argsort(-current_totals, kind="stable") if current_counts[i]][:top]
+            result["group_by"] = group_by
+            result["groups"] = [
+                {
+                    "group": names[i],
+                    "current": _money(current_totals[i]),
+                    "previous": _money(grouped["previous"][0][i]),
+                    "year_ago": _money(grouped["year_ago"][0][i]),
+                    "change_pct": _change(current_totals[i], grouped["previous"][0][i]),
+                    "yoy_pct": _change(current_totals[i], grouped["year_ago"][0][i]),
+                }
+                for i in order
+            ]
+        return result
+
+    def share(self, operation_type: str = "expense", currency: str = "RUB", start: Optional[str] = None,
+              end: Optional[str] = None, group_by: str = "comment", top: int = 10) -> Dict[str, Any]:
+        """Доли групп в итоге; всё, что не вошло в top, — в other"""
+        data, values, mask, result = self._prepare(operation_type, currency, start, end)
+        totals, counts, names = self._grouped(data, values, mask, group_by)
+        overall = totals.sum()
+        order = [i for i in np.argsort(-totals, kind="stable") if counts[i]]
+        share = lambda value: round(float(value / overall * 100), 1) if overall else None
+        result.update({"group_by": group_by, "total": _money(overall), "groups": [
+            {"group": names[i], "total": _money(totals[i]), "share_pct": share(totals[i])}
+            for i in order[:top]
+        ]})
+        rest = totals[order[top:]].sum() if len(order) > top else 0.0
+        if len(order) > top:
+            result["other"] = {"groups": len(order) - top, "total": _money(rest), "share_pct": share(rest)}
+        return result
@@ -0,0 +1,174 @@
+"""Кэш готовых ответов агента для повторяющихся вопросов.
+
+Вопрос приводится к канонической форме: нижний регистр, без пунктуации и
+лишних пробелов, «январе 2025» → ``2025-01``, «рублях»/«RUB» → ``RUB``,
+«потратил»/«траты» → ``expense``; служебные слова («сколько», «я», «в»,
+«за»...) отбрасываются. Порядок и повторы остальных слов сохраняются:
+«в рублях, а не в долларах» и «в долларах, а не в рублях» — разные
+вопросы. Поэтому «Сколько я потратил в январе 2025 в рублях?» и «Траты
+за январь 2025 в RUB» дают один ключ ``expense 2025-01 RUB``.
+
+Для более далёких перефразировок можно передать функцию локальных
+эмбеддингов: похожие вопросы ищутся по косинусной близости.
+
+Ответы живут не дольше TTL и сбрасываются при любом изменении базы данных.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fast_path import EXPENSE_WORDS, INCOME_WORDS, MONTH_RE, canonical_currency, parse_month
+from query_cache import DatabaseVersion
+
+_TOKEN_RE = re.compile(r"\d{4}-\d{2}|\d+(?:[.,]\d+)?|[^\W\d_]+|[-+*/×÷()%$€₽]")
+# Слова, которые не меняют смысла вопроса; отрицание «не» и предлоги направления
+# («из», «к») остаются в ключе
+FILLER_WORDS = frozenset({
+    "сколько", "я", "мне", "мой", "моя", "мои", "моих", "в", "во", "за", "на", "по", "а",
+    "покажи", "скажи", "подскажи", "пожалуйста", "денег",
+})
+
+
+def normalize_question(question: str) -> str:
+    """Каноническая форма вопроса для ключа кэша.
+
+    >>> normalize_question("Сколько я потратил в январе 2025 в рублях?")
+    'expense 2025-01 RUB'
+    >>> normalize_question("траты за январь 2025 в RUB")
+    'expense 2025-01 RUB'
+    >>> normalize_question("в рублях, а не в долларах") == normalize_question("в долларах, а не в рублях")
+    False
+    """
+    text = question.lower().replace("ё", "е")
+
+    def month_token(match: re.Match) -> str:
+        period = parse_month(match.group(0))
+        return f" {period[0]:04d}-{period[1]:02d} " if period else match.group(0)
+
+    text = MONTH_RE.sub(month_token, text)
+    tokens: List[str] = []
+    for token in _TOKEN_RE.findall(text):
+        if token in FILLER_WORDS:
+            continue
+        currency = canonical_currency(token)
+        if currency:
+            token = currency
+        elif token.startswith(EXPENSE_WORDS):
+            token = "expense"
+        elif token.startswith(INCOME_WORDS):
+            token = "income"
+        tokens.append(token.replace(",", "."))
+    return " ".join(tokens)
+
+
+class AnswerCache:
+    """LRU-кэш ответов с TTL и сбросом при изменении базы.
+
+    Args:
+        db_path: Путь к файлу SQLite, изменения которого делают ответы устаревшими.
+        max_entries: Максимальное число ответов.
+        ttl: Время жизни ответа по умолчанию, секунд.
+        embed: Необязательная функция эмбеддинга текста для поиска похожих вопросов.
+        similarity_threshold: Минимальная косинусная близость для попадания по эмбеддингу.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_entries: int = 512,
+        ttl: float = 600.0,
+        embed: Optional[Callable[[str], Sequence[float]]] = None,
+        similarity_threshold: float = 0.92,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.database_version = DatabaseVersion(db_path)
+        self._lock = threading.Lock()
+        # ключ → (ответ, момент истечения, эмбеддинг)
+        self._entries: "OrderedDict[str, Tuple[Any, float, Optional[np.ndarray]]]" = OrderedDict()
+        self._version: Optional[Tuple] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[Any]:
+        key = normalize_question(question)
+        if not key:
+            return None
+        version = self.database_version()
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if self.embed is None or not self._entries:
+                self.misses += 1
+                return None
+
+        # Эмбеддинг считается вне блокировки: он может быть медленным
+        vector = self._embed(question)
+        with self._lock:
+            key, entry = self._nearest(vector, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question: str, answer: Any, ttl: Optional[float] = None):
+        key = normalize_question(question)
+        if not key:
+            return
+        vector = self._embed(question) if self.embed is not None else None
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        version = self.database_version()
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (answer, expires, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed(text), dtype=float)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _nearest(self, vector: np.ndarray, now: float):
+        """Самый похожий непросроченный вопрос по косинусной близости"""
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry[2] is not None and entry[1] > now
+        ]
+        if not candidates:
+            return None, None
+        similarities = np.stack([entry[2] for _, entry in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None, None
+        return candidates[best]
+
+    def _check_version(self, version: Tuple):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
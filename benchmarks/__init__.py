@@ -0,0 +1 @@
+"""Бенчмарки производительности. Запуск из корня репозитория: python -m benchmarks.<имя>"""
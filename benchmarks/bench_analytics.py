@@ -0,0 +1,110 @@
+"""Инструмент analytics против эквивалентного SQL на синтетической базе.
+
+Курсы USD и EUR к RUB на каждый день загружаются в fx_rates, поэтому
+оба варианта пересчитывают суммы по курсу на дату операции:
+
+    python -m benchmarks.bench_analytics --rows 1000000
+"""
+import argparse
+import csv
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from analytics import CurrencyColumn, TransactionAnalytics, TransactionFrame
+from data_loader import bulk_load, generate_chunks
+from db import create_readonly_engine
+from fx_history import load_rates_csv, store_for_engine
+from Tools import AnalyticsTool
+
+YOY_SQL = (
+    "SELECT SUM(fx_convert(amount, currency, 'RUB', operation_date)) FROM transactions "
+    "WHERE operation_type = 'expense' AND operation_date BETWEEN :start AND :end"
+)
+TREND_SQL = (
+    "SELECT substr(operation_date, 1, 7) AS month, SUM(fx_convert(amount, currency, 'RUB', operation_date)) "
+    "FROM transactions WHERE operation_type = 'expense' GROUP BY month ORDER BY month"
+)
+
+
+def write_rates(path: str, start: str = "2022-12-01", days: int = 900):
+    first = datetime.date.fromisoformat(start)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "base", "quote", "rate"])
+        for i in range(days):
+            date = (first + datetime.timedelta(days=i)).isoformat()
+            writer.writerow([date, "USD", "RUB", round(75 + i * 0.02, 4)])
+            writer.writerow([date, "EUR", "RUB", round(82 + i * 0.02, 4)])
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--append", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        rates_path = os.path.join(tmp, "rates.csv")
+        bulk_load(db_path, generate_chunks(args.rows))
+        write_rates(rates_path)
+        load_rates_csv(db_path, [rates_path])
+        engine = create_readonly_engine(db_path)
+        store = store_for_engine(engine)
+
+        frame = TransactionFrame(db_path, check_interval=0.0)
+        tool = AnalyticsTool(TransactionAnalytics(frame, CurrencyColumn(store.rate, rates_version=store.version)))
+        start = time.perf_counter()
+        frame.get()
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        tool.forward("totals")
+        convert = time.perf_counter() - start
+        print(f"загрузка кадра {args.rows} строк: {load * 1000:8.1f} мс, пересчёт в RUB: {convert * 1000:8.1f} мс")
+
+        calls = {
+            "compare (год к году)": {"analysis": "compare", "start": "2025-01-01", "end": "2025-03-31"},
+            "compare по comment": {"analysis": "compare", "period": "year", "group_by": "comment"},
+            "trend по месяцам": {"analysis": "trend", "period": "month", "window": 3},
+            "share по location": {"analysis": "share", "group_by": "location"},
+        }
+        for name, arguments in calls.items():
+            print(f"analytics {name:<24} {median_ms(lambda: tool.forward(**arguments), args.repeat):8.2f} мс")
+
+        def sql_yoy():
+            with engine.connect() as conn:
+                for low, high in (("2025-01-01", "2025-03-31"), ("2024-01-01", "2024-03-31")):
+                    conn.execute(text(YOY_SQL), {"start": low, "end": high}).fetchall()
+
+        def sql_trend():
+            with engine.connect() as conn:
+                conn.execute(text(TREND_SQL)).fetchall()
+
+        print(f"SQL {'год к году':<30} {median_ms(sql_yoy, 3):8.2f} мс")
+        print(f"SQL {'trend по месяцам':<30} {median_ms(sql_trend, 3):8.2f} мс")
+
+        bulk_load(db_path, generate_chunks(args.append, seed=1, start="2025-05-01", end="2025-05-31"),
+                  defer_indexes=False)
+        start = time.perf_counter()
+        tool.forward("totals")
+        print(f"догрузка {args.append} строк по id и запрос: {(time.perf_counter() - start) * 1000:8.1f} мс "
+              f"(полных загрузок: {frame.full_loads}, догружено: {frame.appended})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""CalculatorTool: прежний eval против скомпилированных выражений и векторного режима.
+
+    python -m benchmarks.bench_calculator --values 100000
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from Tools import CalculatorTool
+
+EXPRESSION = "5429.09 * 1.0805 + 3482.12 + 3810.68 * 1.0805"
+
+
+def legacy_forward(expression: str):
+    """Прежняя реализация: проверка регуляркой и eval"""
+    expr = expression.lower().replace(',', '.').strip()
+    if not re.fullmatch(r'^[\d\s\.\+\-\*\/\(\)]+$', expr):
+        raise ValueError("Выражение содержит недопустимые символы")
+    return {"result": round(float(eval(expr, {'__builtins__': None}, {})), 2)}
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--values", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=2_000)
+    args = parser.parse_args()
+    calculator = CalculatorTool()
+
+    legacy = timed(lambda: legacy_forward(EXPRESSION), args.repeat)
+    compiled = timed(lambda: calculator.forward(EXPRESSION), args.repeat)
+    print(f"одно выражение:     eval {legacy * 1e6:8.1f} мкс, AST+Decimal {compiled * 1e6:8.1f} мкс")
+
+    amounts = np.random.default_rng(0).lognormal(7, 1, args.values).round(2).tolist()
+    rows = [{"amount": amount} for amount in amounts]
+    start = time.perf_counter()
+    for amount in amounts[:10_000]:
+        calculator.forward(f"{amount} * 90.5")
+    per_call = (time.perf_counter() - start) / min(len(amounts), 10_000) * len(amounts)
+    vector = timed(lambda: calculator.forward("x * 90.5", values=rows), 3)
+    print(f"{args.values} сумм:   по одной {per_call * 1000:8.1f} мс, values {vector * 1000:8.1f} мс")
+
+    expressions = [f"{amount} * 90.5 + 100" for amount in amounts[:50]]
+    batch = timed(lambda: calculator.forward(expressions=expressions), 200)
+    print(f"50 выражений:       одним вызовом {batch * 1000:6.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
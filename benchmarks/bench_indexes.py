@@ -0,0 +1,73 @@
+"""Задержка канонических запросов промпта до и после создания индексов.
+
+    python -m benchmarks.bench_indexes --rows 10000000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic import create_transactions_db
+from index_advisor import IndexAdvisor
+
+CANONICAL_QUERIES = [
+    "SELECT currency, SUM(amount) FROM transactions WHERE operation_type = 'income' GROUP BY currency",
+    "SELECT * FROM transactions WHERE location = 'Diaz PLC' AND operation_date > '2025-01-01'",
+    "SELECT amount, currency FROM transactions WHERE operation_type = 'expense' AND operation_date = '2025-01-01'",
+    "SELECT currency, SUM(amount) FROM transactions WHERE operation_type = 'expense' "
+    "AND operation_date BETWEEN '2025-01-01' AND '2025-01-31' GROUP BY currency",
+    "SELECT strftime('%Y-%m', operation_date) AS month, SUM(amount) FROM transactions "
+    "WHERE operation_type = 'expense' AND currency = 'RUB' GROUP BY month",
+]
+
+
+def measure(db_path: str, repeats: int) -> list:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        timings = []
+        for query in CANONICAL_QUERIES:
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                samples.append(time.perf_counter() - start)
+            timings.append(statistics.median(samples))
+        return timings
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--db", help="Существующий файл; по умолчанию создаётся временный")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "bench.db")
+        if not args.db:
+            start = time.perf_counter()
+            create_transactions_db(db_path, args.rows)
+            print(f"Сгенерировано {args.rows} строк за {time.perf_counter() - start:.1f} с")
+
+        before = measure(db_path, args.repeats)
+        advisor = IndexAdvisor(db_path)
+        start = time.perf_counter()
+        created = advisor.apply_canonical()
+        # Советник добирает индексы для запросов, которые всё ещё сканируют таблицу
+        created += advisor.apply(advisor.recommend(CANONICAL_QUERIES))
+        print(f"Создано индексов: {len(created)} за {time.perf_counter() - start:.1f} с")
+        for ddl in created:
+            print(f"  {ddl}")
+        after = measure(db_path, args.repeats)
+
+        print(f"{'до, мс':>10} {'после, мс':>10} {'ускорение':>10}  запрос")
+        for query, b, a in zip(CANONICAL_QUERIES, before, after):
+            print(f"{b * 1000:10.2f} {a * 1000:10.2f} {b / a:9.1f}x  {query[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Размер наблюдений инструментов: str() результата против компактного формата.
+
+Типичные результаты execute_query и list_tables на синтетической базе
+сериализуются так, как их видела модель раньше (``str()`` в smolagents),
+и через observations.ObservationFormatter:
+
+    python -m benchmarks.bench_observations --rows 100000 --max-tokens 1500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from data_loader import bulk_load, generate_chunks
+from db import create_readonly_engine
+from observations import ObservationFormatter
+from prompts import estimate_tokens
+from Tools import ExecuteQueryTool, ListTablesTool
+
+QUERIES = {
+    "итоги по валютам": "SELECT currency, operation_type, SUM(amount) AS total, COUNT(*) AS n "
+                        "FROM transactions GROUP BY currency, operation_type",
+    "топ-20 мест": "SELECT location, SUM(amount) AS total FROM transactions WHERE operation_type = 'expense' "
+                   "GROUP BY location ORDER BY total DESC LIMIT 20",
+    "суммы по месяцам": "SELECT substr(operation_date, 1, 7) AS month, AVG(amount) AS avg_amount, "
+                        "SUM(amount) AS total FROM transactions GROUP BY month ORDER BY month",
+    "50 операций в RUB": "SELECT amount, currency, operation_date FROM transactions "
+                         "WHERE currency = 'RUB' ORDER BY id LIMIT 50",
+    "200 операций целиком": "SELECT * FROM transactions ORDER BY id LIMIT 200",
+    "все расходы (усечение)": "SELECT * FROM transactions WHERE operation_type = 'expense'",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        bulk_load(db_path, generate_chunks(args.rows))
+        engine = create_readonly_engine(db_path)
+        execute_query = ExecuteQueryTool(engine)
+        formatter = ObservationFormatter(args.max_tokens)
+
+        results = {"list_tables": ListTablesTool(engine=engine).forward()}
+        results.update({name: execute_query.forward(query) for name, query in QUERIES.items()})
+
+        print(f"{'наблюдение':<28}{'str()':>8}{'компактно':>11}{'экономия':>10}{'превью':>8}{'мс':>8}")
+        raw_total = compact_total = 0
+        for name, result in results.items():
+            raw = estimate_tokens(str(result).strip())
+            start = time.perf_counter()
+            _, tokens, summarized = formatter.format(result)
+            seconds = time.perf_counter() - start
+            raw_total += raw
+            compact_total += tokens
+            print(
+                f"{name:<28}{raw:>8}{tokens:>11}{1 - tokens / raw:>10.0%}"
+                f"{'да' if summarized else '':>8}{seconds * 1000:>8.1f}"
+            )
+        print(f"{'всего':<28}{raw_total:>8}{compact_total:>11}{1 - compact_total / raw_total:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
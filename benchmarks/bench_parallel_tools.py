@@ -0,0 +1,65 @@
+"""Независимые вызовы инструментов: последовательно против одновременного выполнения.
+
+    python -m benchmarks.bench_parallel_tools --fx-latency 0.2
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import FxStubServer
+from benchmarks.synthetic import create_transactions_db
+from db import create_readonly_engine
+from Tools import CurrencyConversionTool, ExecuteQueryTool
+
+
+def build_calls(fx_tool, query_tool):
+    """Типичный шаг для вопроса по нескольким валютам и периодам"""
+    return [
+        (fx_tool, {"base_currency": "USD", "target_currency": "RUB", "amount": 100.0}),
+        (fx_tool, {"base_currency": "EUR", "target_currency": "RUB", "amount": 100.0}),
+        (fx_tool, {"base_currency": "GBP", "target_currency": "RUB", "amount": 100.0}),
+        (query_tool, {"query": "SELECT currency, SUM(amount) FROM transactions "
+                               "WHERE operation_date LIKE '2024-%' GROUP BY currency"}),
+        (query_tool, {"query": "SELECT currency, SUM(amount) FROM transactions "
+                               "WHERE operation_date LIKE '2025-%' GROUP BY currency"}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--fx-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FxStubServer(args.fx_latency) as fx:
+        db_path = os.path.join(tmp, "bench.db")
+        create_transactions_db(db_path, args.rows)
+        engine = create_readonly_engine(db_path)
+
+        def fresh_tools():
+            # Новый кэш курсов для каждого режима, чтобы каждый раз шёл реальный запрос
+            fx_tool = CurrencyConversionTool("stub", api_base=fx.api_base)
+            fx_tool.rate_cache.snapshot_path = None
+            fx_tool.rate_cache.clear()
+            return build_calls(fx_tool, ExecuteQueryTool(engine))
+
+        calls = fresh_tools()
+        start = time.perf_counter()
+        for tool, arguments in calls:
+            tool(**arguments)
+        serial = time.perf_counter() - start
+
+        calls = fresh_tools()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(len(calls)) as executor:
+            list(executor.map(lambda call: call[0](**call[1]), calls))
+        threaded = time.perf_counter() - start
+
+    print(f"последовательно:           {serial * 1000:8.1f} мс")
+    print(f"потоки (max_tool_threads): {threaded * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
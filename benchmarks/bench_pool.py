@@ -0,0 +1,75 @@
+"""Пропускная способность и p99 параллельных запросов: движок по умолчанию против общего пула только для чтения.
+
+    python -m benchmarks.bench_pool --rows 1000000 --workers 16
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.bench_indexes import CANONICAL_QUERIES
+from benchmarks.synthetic import create_transactions_db
+from db import create_readonly_engine, enable_wal
+from index_advisor import IndexAdvisor
+
+
+def run_workload(engine, workers: int, queries_per_worker: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset: int):
+        local = []
+        for i in range(queries_per_worker):
+            query = CANONICAL_QUERIES[(offset + i) % len(CANONICAL_QUERIES)]
+            start = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(text(query)).fetchall()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=50, help="Запросов на поток")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        create_transactions_db(db_path, args.rows)
+        IndexAdvisor(db_path).apply_canonical()
+
+        baseline = create_engine(f"sqlite:///{db_path}")
+        results = {"create_engine по умолчанию": run_workload(baseline, args.workers, args.queries)}
+        baseline.dispose()
+
+        enable_wal(db_path)
+        pooled = create_readonly_engine(db_path, pool_size=args.workers, max_overflow=0)
+        results["пул только для чтения (WAL, mmap)"] = run_workload(pooled, args.workers, args.queries)
+        pooled.dispose()
+
+    print(f"{'запросов/с':>11} {'p50, мс':>9} {'p99, мс':>9}  конфигурация ({args.workers} потоков)")
+    for name, (throughput, p50, p99) in results.items():
+        print(f"{throughput:11.1f} {p50 * 1000:9.2f} {p99 * 1000:9.2f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Размер системного промпта: полный Financial_Agent_Prompt против компактного со схемой.
+
+Для каждого вопроса считается оценка токенов системного промпта и
+контекста, который полный промпт добавляет лишним шагом list_tables
+(его наблюдение повторно отправляется модели на всех следующих шагах):
+
+    python -m benchmarks.bench_prompt --steps 3
+"""
+import argparse
+import json
+import os
+
+from smolagents import FinalAnswerTool
+from smolagents.agents import populate_template
+
+from benchmarks.synthetic import create_transactions_db
+from db import create_readonly_engine
+from prompts import Financial_Agent_Prompt, build_system_prompt, compact_schema, estimate_tokens
+from Tools import (
+    BatchCurrencyConversionTool, CalculatorTool, CurrencyConversionTool, ExecuteQueryTool, ListTablesTool,
+)
+
+QUESTIONS = [
+    "Сколько я потратил в январе 2025 в рублях?",
+    "Конвертируй 1000 USD в RUB",
+    "Где я больше всего потратил в марте 2025?",
+    "Какие столбцы есть в таблице транзакций?",
+    "Покажи доходы за последний квартал в долларах",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="user_transactions.db")
+    parser.add_argument("--steps", type=int, default=3, help="Типичное число шагов агента на вопрос")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        create_transactions_db(args.db, 10_000)
+    engine = create_readonly_engine(args.db)
+    list_tables = ListTablesTool(engine=engine)
+    currency = CurrencyConversionTool("bench")
+    tools = {
+        tool.name: tool for tool in (
+            list_tables, ExecuteQueryTool(engine), CalculatorTool(), currency,
+            BatchCurrencyConversionTool(currency.rate_cache), FinalAnswerTool(),
+        )
+    }
+    catalog = list_tables.forward()
+    schema = compact_schema(catalog)
+    # Наблюдение list_tables в том виде, в каком оно попадает в память агента
+    observation_tokens = estimate_tokens(json.dumps(catalog, ensure_ascii=False))
+    legacy_tokens = estimate_tokens(populate_template(Financial_Agent_Prompt, {"tools": tools}))
+
+    print(f"компактная схема: {estimate_tokens(schema)} токенов, наблюдение list_tables: {observation_tokens}")
+    print(f"{'вопрос':<48}{'было':>8}{'стало':>8}{'за вопрос было':>16}{'стало':>8}")
+    for question in QUESTIONS:
+        compact_tokens = estimate_tokens(
+            populate_template(build_system_prompt(question, schema), {"tools": tools})
+        )
+        # Было: лишний первый шаг list_tables, затем его наблюдение в каждом следующем шаге
+        legacy_total = legacy_tokens * (args.steps + 1) + observation_tokens * args.steps
+        compact_total = compact_tokens * args.steps
+        print(f"{question[:46]:<48}{legacy_tokens:>8}{compact_tokens:>8}{legacy_total:>16}{compact_total:>8}")
+
+
+if __name__ == "__main__":
+    main()
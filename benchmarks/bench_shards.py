@@ -0,0 +1,92 @@
+"""Базы пользователей (shards.py) против одной общей базы.
+
+Для каждого числа пользователей создаются их базы по --rows строк и одна
+общая база со всеми строками. Замеряются запрос одного пользователя к
+своей базе через ShardRouter (с открытием баз по LRU) и тот же запрос к
+общей базе, а также сводка fan_out по всем базам в одном процессе и в пуле:
+
+    python -m benchmarks.bench_shards --users 10,100,1000 --rows 2000 --processes 4
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.replay import parse_size
+from data_loader import bulk_load, generate_chunks
+from db import create_readonly_engine, dispose_engines
+from Financial_Agent import create_tools
+from shards import ShardRouter, provision
+from Tools import CurrencyConversionTool
+
+QUERY = (
+    "SELECT currency, SUM(amount) AS total, COUNT(*) AS n FROM transactions "
+    "WHERE operation_type = 'expense' AND operation_date >= '2025-01-01' GROUP BY currency"
+)
+MERGE = {"total": "sum", "n": "sum"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="10,100,1000", help="Числа пользователей через запятую")
+    parser.add_argument("--rows", type=int, default=2000, help="Строк в базе одного пользователя")
+    parser.add_argument("--max-open", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    currency = CurrencyConversionTool("bench")
+    for users in (parse_size(size) for size in args.users.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            router = ShardRouter(
+                os.path.join(tmp, "shards"),
+                lambda db_path, **kwargs: create_tools(
+                    db_path, currency_tool=currency, query_log_path=None, result_cache=False, **kwargs
+                ),
+                max_open=args.max_open,
+            )
+            monolith = os.path.join(tmp, "all.db")
+            start = time.perf_counter()
+            for i in range(users):
+                db_path = router.path_for(f"user{i}")
+                provision(db_path)
+                bulk_load(db_path, generate_chunks(args.rows, seed=i))
+                bulk_load(monolith, generate_chunks(args.rows, seed=i), defer_indexes=False)
+            print(f"Пользователей {users} по {args.rows} строк (подготовка {time.perf_counter() - start:.1f} с):")
+
+            rng = random.Random(0)
+            timings = []
+            for _ in range(args.queries):
+                user_id = f"user{rng.randrange(users)}"
+                start = time.perf_counter()
+                router.tenant(user_id).tools["execute_query"].forward(QUERY)
+                timings.append(time.perf_counter() - start)
+            stats = router.stats()
+            print(f"  запрос пользователя к своей базе: p50 {statistics.median(timings) * 1000:7.2f} мс, "
+                  f"max {max(timings) * 1000:7.2f} мс (открыто баз {stats['opened']}, закрыто {stats['evicted']})")
+
+            engine = create_readonly_engine(monolith)
+            timings = []
+            for _ in range(min(args.queries, 20)):
+                start = time.perf_counter()
+                with engine.connect() as conn:
+                    conn.execute(text(QUERY)).fetchall()
+                timings.append(time.perf_counter() - start)
+            engine.dispose()
+            print(f"  тот же запрос к общей базе ({users * args.rows} строк): "
+                  f"p50 {statistics.median(timings) * 1000:7.2f} мс")
+
+            for processes in sorted({0, args.processes}):
+                result = router.fan_out(QUERY, MERGE, processes=processes)
+                label = "в одном процессе" if processes <= 1 else f"в пуле из {processes} процессов"
+                print(f"  fan_out по {result['shards']} базам {label}: {result['seconds'] * 1000:8.1f} мс")
+            router.close()
+            dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Время холодного старта модуля Financial_Agent.
+
+Каждый сценарий запускается в отдельном процессе на копии базы во
+временном каталоге, поэтому кэши модулей и файл каталога схемы не
+переживают между запусками:
+
+    python -m benchmarks.bench_startup --repeat 5
+
+Сценарии:
+    * import — только ``import Financial_Agent``;
+    * tools — импорт и сборка инструментов (движок, fx-функции, кэши);
+    * catalog — то же плюс построение каталога схемы (первый list_tables);
+    * catalog (cached) — каталог читается из файла, сохранённого предыдущим запуском.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import": "import Financial_Agent",
+    "tools": "import Financial_Agent; Financial_Agent.get_tools()",
+    "catalog": "import Financial_Agent; Financial_Agent.get_tools()['list_tables'].catalog.get()",
+}
+
+
+def run_once(code: str, cwd: str) -> float:
+    env = dict(os.environ, PYTHONPATH=ROOT, currency_api_key=os.environ.get("currency_api_key", "bench"))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(ROOT, "user_transactions.db"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = [run_once("pass", ROOT) for _ in range(args.repeat)]
+    print(f"{'интерпретатор':<18} {statistics.median(baseline) * 1000:8.1f} мс")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "user_transactions.db")
+        catalog_path = db_path + ".catalog.json"
+        for name, code in SCENARIOS.items():
+            timings = []
+            for _ in range(args.repeat):
+                shutil.copyfile(args.db, db_path)
+                if os.path.exists(catalog_path):
+                    os.remove(catalog_path)
+                timings.append(run_once(code, tmp))
+            print(f"{name:<18} {statistics.median(timings) * 1000:8.1f} мс")
+
+        # Каталог, сохранённый последним запуском, остаётся действительным
+        timings = [run_once(SCENARIOS["catalog"], tmp) for _ in range(args.repeat)]
+        print(f"{'catalog (cached)':<18} {statistics.median(timings) * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Накладные расходы проверки запросов: первый разбор и повтор из кэша.
+
+    python -m benchmarks.bench_validator
+"""
+import argparse
+import time
+
+from benchmarks.bench_indexes import CANONICAL_QUERIES
+from sql_validator import cache_clear, validate_query
+
+ALLOWED_TABLES = frozenset({"transactions", "currencies", "fx_rates"})
+
+EXTRA_QUERIES = [
+    "WITH monthly AS (SELECT strftime('%Y-%m', operation_date) AS month, SUM(amount) AS total "
+    "FROM transactions WHERE operation_type = 'expense' GROUP BY month) "
+    "SELECT month, total FROM monthly ORDER BY month",
+    "SELECT t.currency, SUM(t.amount * f.rate) FROM transactions t JOIN fx_rates f "
+    "ON f.base = t.currency AND f.date = t.operation_date WHERE f.quote = 'RUB' GROUP BY t.currency",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=10_000)
+    args = parser.parse_args()
+
+    queries = CANONICAL_QUERIES + EXTRA_QUERIES
+    cold = []
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(args.repeats // 10):
+            cache_clear()
+            validate_query(query, ALLOWED_TABLES)
+        cold.append((time.perf_counter() - start) / (args.repeats // 10))
+
+    warm = []
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            validate_query(query, ALLOWED_TABLES)
+        warm.append((time.perf_counter() - start) / args.repeats)
+
+    print(f"{'разбор, мкс':>12} {'кэш, мкс':>10}  запрос")
+    for query, c, w in zip(queries, cold, warm):
+        print(f"{c * 1e6:12.1f} {w * 1e6:10.1f}  {query[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Воспроизведение записанных сценариев агента без внешних API.
+
+Модель (OpenAIServerModel из Model.py) подключается к локальной
+OpenAI-совместимой заглушке, которая отвечает записанными вызовами
+инструментов с записанными задержками, а курсы валют — к локальной
+заглушке exchangerate-api. Инструменты работают по-настоящему на
+синтетических базах transactions заданных размеров, поэтому любое
+изменение в Tools.py можно измерить офлайн:
+
+    python -m benchmarks.replay --sizes 10k,1M --repeat 3 --concurrency 4
+    python -m benchmarks.replay --sizes 10M --latency-scale 0 --indexes --rollups
+
+Для каждого размера выводятся задержка ответа (p50/p95), пропускная
+способность, время LLM и каждого инструмента. Синтетические базы
+сохраняются в --data-dir и переиспользуются.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.stubs import FxStubServer, OpenAIStubServer
+from benchmarks.synthetic import create_transactions_db
+from db import dispose_engines
+from tracing import RunTrace, Tracer
+
+SCENARIOS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_scenarios.json")
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().lower()
+    if size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def record_scenario(agent, question: str, trace: Optional[RunTrace] = None) -> Dict[str, Any]:
+    """Сценарий для воспроизведения из памяти агента после реального запуска.
+
+    Задержки LLM берутся из трассы (tracing.Tracer.run), если она передана.
+    """
+    from smolagents.memory import ActionStep
+
+    llm_seconds = {step["step"]: step["llm_seconds"] for step in trace.steps} if trace else {}
+    steps = []
+    for step in agent.memory.steps:
+        if not isinstance(step, ActionStep) or not step.tool_calls:
+            continue
+        steps.append({
+            "llm_seconds": round(llm_seconds.get(step.step_number) or 0.0, 3),
+            "completion_tokens": step.token_usage.output_tokens if step.token_usage else 0,
+            "tool_calls": [{"name": call.name, "arguments": call.arguments} for call in step.tool_calls],
+        })
+    return {"question": question, "steps": steps}
+
+
+class ListSink:
+    """Приёмник трасс в памяти"""
+
+    def __init__(self):
+        self.traces: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def write(self, trace: Dict[str, Any]):
+        with self._lock:
+            self.traces.append(trace)
+
+
+def prepare_database(path: str, rows: int, indexes: bool, rollups: bool):
+    if not os.path.exists(path):
+        print(f"  генерация {rows} строк → {path}")
+        create_transactions_db(path, rows)
+    if indexes:
+        from index_advisor import IndexAdvisor
+        IndexAdvisor(path).apply_canonical()
+    if rollups:
+        import rollups as rollup_tables
+        rollup_tables.install(path)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q * (len(values) - 1))))]
+
+
+def summarize(traces: List[Dict[str, Any]], wall: float) -> str:
+    seconds = [trace["seconds"] for trace in traces]
+    errors = sum(1 for trace in traces if trace["error"])
+    llm = [step["llm_seconds"] for trace in traces for step in trace["steps"] if step["llm_seconds"] is not None]
+    steps = sum(len(trace["steps"]) for trace in traces)
+    prompt_tokens = sum(step["input_tokens"] for trace in traces for step in trace["steps"])
+    observations = [item for trace in traces for item in trace.get("observations", [])]
+    tools: Dict[str, List[float]] = {}
+    for trace in traces:
+        for span in trace["spans"]:
+            tools.setdefault(span["tool"], []).append(span["seconds"])
+
+    lines = [
+        f"  запросов {len(traces)} (ошибок {errors}) за {wall:.2f} с: {len(traces) / wall:.2f} запр/с",
+        f"  ответ: p50 {_percentile(seconds, 0.5) * 1000:.0f} мс, p95 {_percentile(seconds, 0.95) * 1000:.0f} мс, "
+        f"среднее {statistics.fmean(seconds) * 1000:.0f} мс",
+        f"  шагов {steps}, токенов запроса {prompt_tokens} ({prompt_tokens / max(steps, 1):.0f} на шаг)",
+        f"  наблюдений {len(observations)}: {sum(item['tokens'] for item in observations)} токенов "
+        f"(str() дал бы {sum(item['raw_tokens'] for item in observations)}), "
+        f"сокращено до превью {sum(1 for item in observations if item['summarized'])}",
+        f"  {'':<26}{'вызовов':>8}{'среднее, мс':>13}{'p95, мс':>10}{'всего, с':>10}",
+    ]
+    for name, values in [("LLM", llm)] + sorted(tools.items(), key=lambda item: -sum(item[1])):
+        if values:
+            lines.append(
+                f"  {name:<26}{len(values):>8}{statistics.fmean(values) * 1000:>13.1f}"
+                f"{_percentile(values, 0.95) * 1000:>10.1f}{sum(values):>10.2f}"
+            )
+    return "\n".join(lines)
+
+
+def replay(db_path: str, scenarios: List[Dict[str, Any]], args) -> str:
+    from smolagents import LogLevel, OpenAIServerModel
+
+    from Financial_Agent import build_agent, create_tools, prepare_agent
+
+    sink = ListSink()
+    tracer = Tracer(sink)
+    with FxStubServer(args.fx_latency) as fx, OpenAIStubServer(scenarios, args.latency_scale) as llm:
+        tools = create_tools(
+            db_path, currency_api_key="bench", fx_api_base=fx.api_base, query_log_path=None,
+            result_cache=not args.cold, tracer=tracer,
+        )
+        rate_cache = tools["currency_converter"].rate_cache
+        rate_cache.snapshot_path = None
+        rate_cache.clear()
+        model = OpenAIServerModel(model_id="replay-stub", api_base=llm.api_base, api_key="stub")
+        # Каталог схемы строится один раз на базу (как прогрев в приложении) и в замер не входит
+        start = time.perf_counter()
+        tools["list_tables"].catalog.get()
+        catalog_seconds = time.perf_counter() - start
+        local = threading.local()
+
+        def run(question: str):
+            # Агент на поток: память агента не разделяется между запросами
+            agent = getattr(local, "agent", None)
+            if agent is None:
+                agent = local.agent = build_agent(
+                    stream_outputs=args.stream, tools=tools, model=model, tracer=tracer
+                )
+                agent.logger.level = LogLevel.OFF
+            with tracer.run(question) as trace:
+                trace.route = "agent"
+                prepare_agent(agent, question)
+                if args.stream:
+                    for _ in agent.run(question, stream=True):
+                        pass
+                else:
+                    agent.run(question)
+
+        questions = [scenario["question"] for scenario in scenarios] * args.repeat
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            for future in [executor.submit(run, question) for question in questions]:
+                try:
+                    future.result()
+                except Exception:
+                    # Ошибка уже записана в трассу
+                    pass
+        wall = time.perf_counter() - start
+    dispose_engines(db_path)
+    return f"  каталог схемы: {catalog_seconds:.2f} с\n" + summarize(sink.traces, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,1M", help="Размеры баз через запятую: 10k, 1M, 10M")
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH, help="JSON со сценариями (см. record_scenario)")
+    parser.add_argument("--data-dir", default=".bench_data", help="Каталог для синтетических баз")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Множитель записанных задержек LLM")
+    parser.add_argument("--fx-latency", type=float, default=0.15, help="Задержка заглушки курсов, с")
+    parser.add_argument("--stream", action="store_true", help="Потоковые ответы модели, как в интерфейсе")
+    parser.add_argument("--cold", action="store_true", help="Без кэша результатов execute_query")
+    parser.add_argument("--indexes", action="store_true", help="Создать канонические индексы")
+    parser.add_argument("--rollups", action="store_true", help="Установить таблицы-свёртки")
+    args = parser.parse_args()
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    os.makedirs(args.data_dir, exist_ok=True)
+    for size in args.sizes.split(","):
+        rows = parse_size(size)
+        db_path = os.path.join(args.data_dir, f"transactions_{size.strip().lower()}.db")
+        print(f"База {size.strip()} ({rows} строк):")
+        prepare_database(db_path, rows, args.indexes, args.rollups)
+        print(replay(db_path, scenarios, args))
+
+
+if __name__ == "__main__":
+    main()
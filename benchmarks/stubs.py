@@ -0,0 +1,182 @@
+"""Локальные заглушки внешних API для бенчмарков."""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Курсы к USD; таблица любой базы выводится через них
+USD_RATES = {"USD": 1.0, "RUB": 90.0, "EUR": 0.92, "GBP": 0.79, "CNY": 7.2, "KZT": 450.0}
+
+
+class FxStubServer:
+    """HTTP-сервер в формате exchangerate-api ``/v6/{key}/latest/{base}`` с искусственной задержкой.
+
+    Args:
+        latency: Задержка ответа, секунд.
+        rates: Курсы к USD.
+    """
+
+    def __init__(self, latency: float = 0.0, rates: Dict[str, float] = USD_RATES):
+        self.latency = latency
+        self.rates = rates
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.latency)
+                base = self.path.rstrip("/").rsplit("/", 1)[-1].upper()
+                if base in stub.rates:
+                    body = {
+                        "result": "success",
+                        "base_code": base,
+                        "conversion_rates": {
+                            code: rate / stub.rates[base] for code, rate in stub.rates.items()
+                        },
+                    }
+                else:
+                    body = {"result": "error", "error-type": "unsupported-code"}
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v6"
+
+    def __enter__(self) -> "FxStubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class OpenAIStubServer:
+    """OpenAI-совместимый ``/v1/chat/completions``, воспроизводящий записанные сценарии агента.
+
+    Сценарий выбирается по тексту задачи в сообщениях, номер шага — по числу
+    ответов ассистента в истории. Каждый ответ задерживается на записанное
+    время шага, умноженное на ``latency_scale``. Поддерживаются обычные и
+    потоковые (SSE) ответы.
+
+    Args:
+        scenarios: Сценарии: {"question", "steps": [{"tool_calls": [{"name", "arguments"}], "llm_seconds"}]}.
+        latency_scale: Множитель записанных задержек (0 — без задержек).
+    """
+
+    def __init__(self, scenarios: List[Dict[str, Any]], latency_scale: float = 1.0):
+        self.scenarios = scenarios
+        self.latency_scale = latency_scale
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                stub.requests += 1
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                step, prompt_tokens = stub._reply(body.get("messages", []))
+                time.sleep(step.get("llm_seconds", 0.0) * stub.latency_scale)
+                completion = {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                }
+                tool_calls = [
+                    {
+                        "index": i,
+                        "id": f"call_{uuid.uuid4().hex[:12]}",
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": json.dumps(call["arguments"], ensure_ascii=False)},
+                    }
+                    for i, call in enumerate(step["tool_calls"])
+                ]
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": step.get("completion_tokens", 30),
+                    "total_tokens": prompt_tokens + step.get("completion_tokens", 30),
+                }
+                if body.get("stream"):
+                    chunks = [
+                        {**completion, "object": "chat.completion.chunk", "choices": [
+                            {"index": 0, "delta": {"role": "assistant", "content": "", "tool_calls": tool_calls},
+                             "finish_reason": None}]},
+                        {**completion, "object": "chat.completion.chunk", "choices": [
+                            {"index": 0, "delta": {}, "finish_reason": "tool_calls"}]},
+                        {**completion, "object": "chat.completion.chunk", "choices": [], "usage": usage},
+                    ]
+                    payload = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+                    self._send(payload.encode(), "text/event-stream")
+                else:
+                    message = {"role": "assistant", "content": None,
+                               "tool_calls": [{k: v for k, v in call.items() if k != "index"} for call in tool_calls]}
+                    payload = {**completion, "object": "chat.completion", "usage": usage,
+                               "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls"}]}
+                    self._send(json.dumps(payload).encode(), "application/json")
+
+            def _send(self, payload: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _reply(self, messages: List[Dict[str, Any]]):
+        """Записанный шаг для истории сообщений и оценка токенов запроса"""
+        text = "\n".join(_message_text(message) for message in messages)
+        scenario = self._find(text)
+        step_index = sum(1 for message in messages if message.get("role") == "assistant")
+        prompt_tokens = len(json.dumps(messages, ensure_ascii=False).encode("utf-8")) // 4
+        if scenario is None or step_index >= len(scenario["steps"]):
+            answer = {"name": "final_answer", "arguments": {"answer": "Нет записанного сценария"}}
+            return {"tool_calls": [answer]}, prompt_tokens
+        return scenario["steps"][step_index], prompt_tokens
+
+    def _find(self, text: str) -> Optional[Dict[str, Any]]:
+        # Последнее вхождение: задача идёт после системного промпта с примерами
+        best, position = None, -1
+        for scenario in self.scenarios:
+            found = text.rfind(scenario["question"])
+            if found > position:
+                best, position = scenario, found
+        return best
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def __enter__(self) -> "OpenAIStubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
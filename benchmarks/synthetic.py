@@ -0,0 +1,14 @@
+"""Синтетическая таблица transactions для бенчмарков (см. data_loader)."""
+from typing import Iterator
+
+from data_loader import TRANSACTIONS_DDL, Row, bulk_load, generate_chunks
+
+
+def generate_rows(rows: int, seed: int = 0) -> Iterator[Row]:
+    for chunk in generate_chunks(rows, seed):
+        yield from chunk
+
+
+def create_transactions_db(path: str, rows: int, seed: int = 0, batch_size: int = 50_000):
+    """Создаёт файл SQLite с таблицей transactions из rows строк"""
+    bulk_load(path, generate_chunks(rows, seed, chunk_size=batch_size))
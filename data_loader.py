@@ -0,0 +1,503 @@
+"""Генерация реалистичных транзакций и массовая загрузка в таблицу transactions.
+
+Синтетические данные повторяют форму настоящей выписки: в основном рублёвые
+траты с логнормальными суммами, редкие крупные поступления (зарплата,
+переводы), популярные и «хвостовые» места операций, хронологический порядок
+дат. Выписки банков в CSV и Parquet читаются потоково, кусками, и приводятся
+к той же схеме.
+
+Загрузка идёт пакетными ``executemany`` в одной транзакции, индексы
+и триггеры свёрток снимаются на время загрузки и строятся заново после
+неё. Журнал отключается только для новой или пустой таблицы; загрузка
+в базу с данными идёт с журналом и при сбое откатывается. Строки
+выписки, которые не удалось разобрать (например, строка «Итого» или
+операция без суммы), пропускаются и перечисляются в отчёте:
+
+    python data_loader.py generate --db big.db --rows 10M --indexes --rollups --wal
+    python data_loader.py import --db user_transactions.db statement.csv 2025.parquet
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TRANSACTIONS_DDL = """
+CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        currency TEXT,
+        amount REAL,
+        operation_type TEXT,
+        location TEXT,
+        comment TEXT,
+        operation_date TEXT
+    )
+"""
+
+COLUMNS = ("currency", "amount", "operation_type", "location", "comment", "operation_date")
+INSERT_SQL = (
+    f"INSERT INTO transactions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+DEFAULT_CHUNK_SIZE = 100_000
+
+Row = Tuple[str, float, str, str, str, str]
+
+# Валюта: (доля операций, рублей за единицу)
+CURRENCIES: Dict[str, Tuple[float, float]] = {"RUB": (0.75, 1.0), "USD": (0.17, 90.0), "EUR": (0.08, 98.0)}
+INCOME_SHARE = 0.08
+
+# Категория трат: (доля операций, медиана суммы в рублях, разброс логнормального распределения, места)
+EXPENSE_CATEGORIES: Dict[str, Tuple[float, float, float, Tuple[str, ...]]] = {
+    "Супермаркеты": (0.30, 900.0, 0.8, ("Пятёрочка", "Перекрёсток", "Магнит", "ВкусВилл", "Лента", "Ашан")),
+    "Кафе и рестораны": (0.16, 750.0, 0.7, ("Шоколадница", "Кофе Хауз", "Теремок", "Вкусно и точка", "Додо Пицца")),
+    "Транспорт": (0.14, 250.0, 0.9, ("Яндекс Такси", "Метрополитен", "Ситидрайв", "Аэроэкспресс")),
+    "Маркетплейсы": (0.12, 2_200.0, 1.0, ("Ozon", "Wildberries", "Яндекс Маркет", "AliExpress")),
+    "Топливо": (0.06, 2_500.0, 0.4, ("Лукойл", "Роснефть", "Газпромнефть", "Shell")),
+    "Аптеки": (0.05, 650.0, 0.8, ("Аптека Ригла", "36,6", "Аптека Горздрав")),
+    "Связь и подписки": (0.05, 450.0, 0.5, ("МТС", "Билайн", "Яндекс Плюс", "Netflix", "Spotify")),
+    "Коммунальные платежи": (0.04, 6_500.0, 0.4, ("ЖКУ Москва", "Мосэнергосбыт")),
+    "Путешествия": (0.03, 18_000.0, 1.0, ("Booking.com", "Аэрофлот", "РЖД", "Airbnb")),
+    "Одежда": (0.05, 4_000.0, 0.9, ("Zara", "Uniqlo", "Спортмастер", "Lamoda")),
+}
+# Категория поступлений: (доля поступлений, медиана в рублях, разброс, источники)
+INCOME_CATEGORIES: Dict[str, Tuple[float, float, float, Tuple[str, ...]]] = {
+    "Зарплата": (0.55, 95_000.0, 0.25, ("ООО Ромашка", "АО Техносервис")),
+    "Переводы": (0.30, 5_000.0, 1.1, ("Перевод СБП", "Перевод по номеру карты")),
+    "Кэшбэк": (0.10, 600.0, 0.8, ("Кэшбэк банка",)),
+    "Проценты": (0.05, 1_800.0, 0.6, ("Проценты по вкладу",)),
+}
+# «Хвост» мест операций: редкие магазины, которые встречаются по нескольку раз
+_TAIL_NAMES = (
+    "Smith", "Miller", "Diaz", "Young", "Jones", "Larson", "Banks", "Fry", "Morales", "Owens",
+    "Johnson", "Brown", "Garcia", "Davis", "Wilson", "Moore", "Taylor", "Clark", "Lewis", "Walker",
+)
+_TAIL_SUFFIXES = ("PLC", "Inc", "LLC", "Ltd", "Group", "and Sons")
+TAIL_SHARE = 0.25
+
+
+def parse_count(value: str) -> int:
+    """Число строк с суффиксом: 10k, 1.5M"""
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:])
+    return int(float(value[:-1]) * multiplier) if multiplier else int(value)
+
+
+class _Categories:
+    """Категории в виде массивов для векторного выбора"""
+
+    def __init__(self, categories: Dict[str, Tuple[float, float, float, Tuple[str, ...]]]):
+        names = list(categories)
+        weights = np.array([categories[name][0] for name in names])
+        self.probabilities = weights / weights.sum()
+        self.names = np.array(names, dtype=object)
+        self.log_medians = np.log([categories[name][1] for name in names])
+        self.sigmas = np.array([categories[name][2] for name in names])
+        self.places = [np.array(categories[name][3], dtype=object) for name in names]
+
+    def sample(self, rng: np.random.Generator, size: int):
+        """Категории, суммы в рублях и места для size операций"""
+        index = rng.choice(len(self.names), size=size, p=self.probabilities)
+        amounts = np.exp(rng.normal(self.log_medians[index], self.sigmas[index]))
+        places = np.empty(size, dtype=object)
+        for i, pool in enumerate(self.places):
+            mask = index == i
+            count = int(mask.sum())
+            if count:
+                # Популярность мест внутри категории убывает как 1/ранг
+                ranks = 1.0 / np.arange(1, len(pool) + 1)
+                places[mask] = pool[rng.choice(len(pool), size=count, p=ranks / ranks.sum())]
+        return self.names[index], amounts, places
+
+
+def generate_chunks(
+    rows: int,
+    seed: int = 0,
+    start: str = "2023-01-01",
+    end: str = "2025-04-30",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[Row]]:
+    """Синтетические транзакции кусками по chunk_size строк.
+
+    Даты возрастают вместе с id, как в настоящей выписке; суммы хранятся
+    в валюте операции. Результат детерминирован для одного seed.
+
+    Yields:
+        list[tuple]: Строки в порядке столбцов COLUMNS.
+    """
+    rng = np.random.default_rng(seed)
+    first = datetime.date.fromisoformat(start).toordinal()
+    days = datetime.date.fromisoformat(end).toordinal() - first + 1
+    dates = np.array([datetime.date.fromordinal(first + i).isoformat() for i in range(days)], dtype=object)
+    currency_names = np.array(list(CURRENCIES), dtype=object)
+    currency_weights = np.array([weight for weight, _ in CURRENCIES.values()])
+    currency_rates = np.array([rate for _, rate in CURRENCIES.values()])
+    expenses, incomes = _Categories(EXPENSE_CATEGORIES), _Categories(INCOME_CATEGORIES)
+    tail = np.array([f"{name} {suffix}" for name in _TAIL_NAMES for suffix in _TAIL_SUFFIXES]
+                    + [f"{a}-{b}" for a, b in itertools.permutations(_TAIL_NAMES, 2)]
+                    + [f"{a}, {b} and {c}" for a, b, c in itertools.permutations(_TAIL_NAMES, 3)], dtype=object)
+
+    for offset in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - offset)
+        # Кусок покрывает свою долю периода, внутри куска даты отсортированы
+        low, high = offset * days // rows, ((offset + size) * days + rows - 1) // rows
+        day = np.sort(rng.integers(low, max(high, low + 1), size=size))
+
+        income = rng.random(size) < INCOME_SHARE
+        categories = np.empty(size, dtype=object)
+        amounts_rub = np.empty(size)
+        places = np.empty(size, dtype=object)
+        for mask, source in ((~income, expenses), (income, incomes)):
+            count = int(mask.sum())
+            if count:
+                categories[mask], amounts_rub[mask], places[mask] = source.sample(rng, count)
+        in_tail = ~income & (rng.random(size) < TAIL_SHARE)
+        places[in_tail] = tail[rng.integers(0, len(tail), size=int(in_tail.sum()))]
+
+        currency = rng.choice(len(currency_names), size=size, p=currency_weights / currency_weights.sum())
+        amounts = np.maximum(np.round(amounts_rub / currency_rates[currency], 2), 0.01)
+        yield list(zip(
+            currency_names[currency].tolist(),
+            amounts.tolist(),
+            np.where(income, "income", "expense").tolist(),
+            places.tolist(),
+            categories.tolist(),
+            dates[day].tolist(),
+        ))
+
+
+def bulk_load(
+    db_path: str,
+    chunks: Iterable[Sequence[Row]],
+    indexes: Iterable[str] = (),
+    defer_indexes: bool = True,
+    cache_size: int = -512_000,
+    journal: Optional[bool] = None,
+) -> int:
+    """Загружает строки в transactions одной транзакцией.
+
+    На время загрузки существующие индексы и триггеры таблицы удаляются,
+    после неё создаются заново вместе с индексами из ``indexes`` (DDL).
+    Если в базе были триггеры свёрток (rollups.py), свёртки пересчитываются.
+
+    Без журнала загрузка быстрее, но база монопольно заблокирована, а сбой
+    посреди загрузки (в том числе ошибка в строках ``chunks``) может
+    повредить файл; режим журнала потом восстанавливается. С журналом
+    ошибка откатывает загрузку целиком, и читатели не блокируются.
+
+    Args:
+        db_path: Путь к файлу SQLite; файл и таблица создаются при необходимости.
+        chunks: Куски строк в порядке столбцов COLUMNS.
+        indexes: Дополнительные CREATE INDEX, выполняемые после загрузки.
+        defer_indexes: Снимать индексы на время загрузки. Для небольшой
+            догрузки в большую базу дешевле оставить их на месте.
+        cache_size: PRAGMA cache_size на время загрузки и построения индексов.
+        journal: Загружать с журналом. По умолчанию журнал отключается,
+            только если в transactions ещё нет строк.
+
+    Returns:
+        int: Количество загруженных строк.
+    """
+    indexes = list(indexes)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    loaded = 0
+    journal_mode = None
+    completed = False
+    try:
+        conn.execute(TRANSACTIONS_DDL)
+        if journal is None:
+            journal = conn.execute("SELECT EXISTS (SELECT 1 FROM transactions)").fetchone()[0] == 1
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if not journal:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Сортировка при построении индексов в несколько потоков
+        conn.execute(f"PRAGMA threads={os.cpu_count() or 1}")
+        conn.execute(f"PRAGMA cache_size={int(cache_size)}")
+
+        deferred = conn.execute(
+            "SELECT type, name, sql FROM sqlite_schema "
+            "WHERE tbl_name = 'transactions' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ).fetchall()
+        if not defer_indexes:
+            deferred = [item for item in deferred if item[0] == "trigger"]
+        conn.execute("BEGIN")
+        for kind, name, _ in deferred:
+            conn.execute(f'DROP {kind.upper()} "{name}"')
+        for chunk in chunks:
+            conn.executemany(INSERT_SQL, chunk)
+            loaded += len(chunk)
+        for _, _, sql in deferred:
+            conn.execute(sql)
+        for ddl in indexes:
+            conn.execute(ddl)
+        conn.execute("COMMIT")
+        if any(kind == "index" for kind, _, _ in deferred) or indexes:
+            conn.execute("ANALYZE")
+        completed = True
+    finally:
+        # Режим журнала восстанавливается и после ошибки, иначе база остаётся без журнала
+        if journal_mode is not None and not journal:
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                conn.execute("PRAGMA locking_mode=NORMAL")
+                conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            except sqlite3.Error:
+                # Не подменяем исходную ошибку загрузки
+                if completed:
+                    raise
+        conn.close()
+
+    if any(name.startswith("transactions_rollup_") for kind, name, _ in deferred if kind == "trigger"):
+        import rollups
+
+        rollups.rebuild(db_path)
+    return loaded
+
+
+# Заголовки выписок банков → столбцы transactions (сравнение без учёта регистра)
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "operation_date": ("operation_date", "date", "дата", "дата операции", "дата платежа", "дата транзакции"),
+    "amount": ("amount", "сумма", "сумма операции", "сумма платежа", "сумма в валюте счёта"),
+    "currency": ("currency", "валюта", "валюта операции", "валюта платежа"),
+    "operation_type": ("operation_type", "type", "тип", "тип операции"),
+    "location": ("location", "описание", "место", "место операции", "получатель", "контрагент", "merchant"),
+    "comment": ("comment", "комментарий", "категория", "назначение платежа", "category"),
+}
+INCOME_TYPES = {"income", "доход", "пополнение", "зачисление", "поступление", "credit"}
+EXPENSE_TYPES = {"expense", "расход", "списание", "покупка", "оплата", "debit"}
+_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y")
+
+
+def _parse_amount(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).replace("\xa0", "").replace(" ", "").replace(",", ".")
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Неизвестный формат суммы: {value!r}") from None
+
+
+def _parse_date(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, datetime.date):
+        return value.isoformat()[:10] if value is not None else None
+    text = str(value).strip().split(" ")[0].split("T")[0]
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Неизвестный формат даты: {value!r}")
+
+
+class ExportRowParser:
+    """Приводит строку выписки (словарь «заголовок → значение») к строке transactions.
+
+    Заголовки сопоставляются по COLUMN_ALIASES. Если в выписке нет типа
+    операции, он определяется по знаку суммы: отрицательная — расход.
+    Сумма сохраняется по модулю. Строка без суммы или даты или с
+    неразборчивыми суммой или датой — ValueError.
+
+    Args:
+        headers: Заголовки выписки.
+        default_currency: Валюта, если в выписке нет столбца валюты.
+    """
+
+    def __init__(self, headers: Sequence[str], default_currency: str = "RUB"):
+        normalized = {str(header).strip().lower(): header for header in headers}
+        self.fields: Dict[str, Any] = {}
+        for column, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in normalized:
+                    self.fields[column] = normalized[alias]
+                    break
+        missing = [column for column in ("operation_date", "amount") if column not in self.fields]
+        if missing:
+            raise ValueError(f"В выписке нет столбцов {missing}; заголовки: {list(headers)}")
+        self.default_currency = default_currency
+
+    def _get(self, record: Dict[str, Any], column: str) -> Any:
+        return record.get(self.fields[column]) if column in self.fields else None
+
+    def _text(self, record: Dict[str, Any], column: str) -> Optional[str]:
+        value = self._get(record, column)
+        return str(value).strip() or None if value is not None else None
+
+    def __call__(self, record: Dict[str, Any]) -> Row:
+        amount = _parse_amount(self._get(record, "amount"))
+        if amount is None:
+            raise ValueError("Нет суммы")
+        kind = (self._text(record, "operation_type") or "").lower()
+        if kind in INCOME_TYPES:
+            operation_type = "income"
+        elif kind in EXPENSE_TYPES:
+            operation_type = "expense"
+        else:
+            operation_type = "expense" if amount < 0 else "income"
+        date = _parse_date(self._get(record, "operation_date"))
+        if date is None:
+            raise ValueError("Нет даты")
+        currency = (self._text(record, "currency") or self.default_currency).upper()
+        return (
+            {"RUR": "RUB", "₽": "RUB", "$": "USD", "€": "EUR"}.get(currency, currency),
+            round(abs(float(amount)), 2),
+            operation_type,
+            self._text(record, "location"),
+            self._text(record, "comment"),
+            date,
+        )
+
+
+def _parsed_chunks(records: Iterable[Dict[str, Any]], parser: ExportRowParser, chunk_size: int,
+                   rejected: Optional[List[Tuple[int, str]]]) -> Iterator[List[Row]]:
+    def parse() -> Iterator[Row]:
+        for number, record in enumerate(records, 1):
+            try:
+                yield parser(record)
+            except ValueError as e:
+                if rejected is None:
+                    raise ValueError(f"Запись {number}: {e}") from None
+                rejected.append((number, str(e)))
+
+    rows = parse()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_csv_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = "utf-8-sig",
+                    default_currency: str = "RUB",
+                    rejected: Optional[List[Tuple[int, str]]] = None) -> Iterator[List[Row]]:
+    """Читает CSV-выписку кусками; разделитель (, ; или табуляция) определяется по началу файла.
+
+    Заголовки проверяются сразу при вызове, а не при первом куске.
+
+    Args:
+        rejected: Список для пропущенных строк ``(номер записи, причина)``;
+            без него первая неразборчивая строка — ValueError.
+    """
+    f = open(path, newline="", encoding=encoding)
+    try:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        reader = csv.DictReader(f, dialect=dialect)
+        parser = ExportRowParser(reader.fieldnames or [], default_currency)
+    except Exception:
+        f.close()
+        raise
+
+    def chunks() -> Iterator[List[Row]]:
+        with f:
+            yield from _parsed_chunks(reader, parser, chunk_size, rejected)
+
+    return chunks()
+
+
+def read_parquet_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, default_currency: str = "RUB",
+                        rejected: Optional[List[Tuple[int, str]]] = None) -> Iterator[List[Row]]:
+    """Читает Parquet-выписку пакетами по chunk_size строк (нужен pyarrow; rejected — как в read_csv_chunks)"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Для чтения Parquet нужен pyarrow: pip install pyarrow") from e
+    source = pq.ParquetFile(path)
+    parser = ExportRowParser(source.schema_arrow.names, default_currency)
+    records = (record for batch in source.iter_batches(batch_size=chunk_size) for record in batch.to_pylist())
+    return _parsed_chunks(records, parser, chunk_size, rejected)
+
+
+def read_export_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, **kwargs) -> Iterator[List[Row]]:
+    """Куски строк из выписки; формат определяется по расширению файла"""
+    if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+        return read_parquet_chunks(path, chunk_size, **kwargs)
+    return read_csv_chunks(path, chunk_size, **kwargs)
+
+
+def import_exports(db_path: str, paths: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   **kwargs) -> Tuple[int, Dict[str, List[Tuple[int, str]]]]:
+    """Загружает выписки в transactions (см. bulk_load).
+
+    Заголовки всех файлов проверяются до начала загрузки. Неразборчивые
+    строки не прерывают загрузку, а попадают в отчёт.
+
+    Returns:
+        (количество загруженных строк, {файл: [(номер записи, причина)]} для пропущенных строк)
+    """
+    rejected: Dict[str, List[Tuple[int, str]]] = {}
+    readers = [read_export_chunks(path, chunk_size, rejected=rejected.setdefault(path, [])) for path in paths]
+    loaded = bulk_load(db_path, itertools.chain.from_iterable(readers), **kwargs)
+    return loaded, {path: rows for path, rows in rejected.items() if rows}
+
+
+def print_rejected(rejected: Dict[str, List[Tuple[int, str]]], limit: int = 10):
+    """Печатает пропущенные строки выписок (не больше limit на файл)"""
+    for path, rows in rejected.items():
+        print(f"{path}: пропущено строк {len(rows)}")
+        for number, reason in rows[:limit]:
+            print(f"  запись {number}: {reason}")
+        if len(rows) > limit:
+            print(f"  … и ещё {len(rows) - limit}")
+
+
+def canonical_index_ddl() -> List[str]:
+    """CREATE INDEX для канонических индексов советника (index_advisor)"""
+    from index_advisor import CANONICAL_INDEXES, index_ddl
+
+    return [index_ddl(table, columns) for table, columns in CANONICAL_INDEXES if table == "transactions"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация и массовая загрузка транзакций")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="Синтетические транзакции")
+    generate.add_argument("--rows", default="1M", help="Количество строк: 100k, 1M, 10M")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--start", default="2023-01-01")
+    generate.add_argument("--end", default="2025-04-30")
+    imports = commands.add_parser("import", help="Выписки банков в CSV или Parquet")
+    imports.add_argument("paths", nargs="+")
+    for command in (generate, imports):
+        command.add_argument("--db", required=True, help="Путь к базе данных")
+        command.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        command.add_argument("--indexes", action="store_true", help="Создать канонические индексы после загрузки")
+        command.add_argument("--rollups", action="store_true", help="Установить таблицы-свёртки")
+        command.add_argument("--wal", action="store_true", help="Перевести базу в режим WAL после загрузки")
+    args = parser.parse_args()
+
+    indexes = canonical_index_ddl() if args.indexes else []
+    start = time.perf_counter()
+    if args.command == "generate":
+        chunks = generate_chunks(parse_count(args.rows), args.seed, args.start, args.end, args.chunk_size)
+        loaded = bulk_load(args.db, chunks, indexes)
+    else:
+        loaded, rejected = import_exports(args.db, args.paths, args.chunk_size, indexes=indexes)
+        print_rejected(rejected)
+    seconds = time.perf_counter() - start
+    print(f"Загружено {loaded} строк за {seconds:.1f} с ({loaded / seconds * 60 / 1e6:.1f} млн строк/мин)")
+    if args.rollups:
+        import rollups
+
+        rollups.install(args.db)
+    if args.wal:
+        from db import enable_wal
+
+        enable_wal(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Общий пул соединений SQLite только для чтения.
+
+Все инструменты агента получают один движок на файл базы данных через
+``get_engine``. Соединения открываются в режиме ``mode=ro`` с
+``PRAGMA query_only``, увеличенным кэшем страниц и mmap.
+
+Чтобы читатели не блокировались записью, базу стоит перевести в WAL.
+Это меняет сам файл, поэтому делается явно при развёртывании или загрузке
+данных, а не при открытии движка:
+
+    python db.py --wal user_transactions.db
+    python data_loader.py import --db user_transactions.db --wal statement.csv
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_DB_PATH = os.environ.get("TRANSACTIONS_DB", "user_transactions.db")
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+# Отрицательное значение — размер в КиБ (64 МБ на соединение)
+DEFAULT_CACHE_SIZE = -64_000
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def enable_wal(db_path: str) -> bool:
+    """Переводит базу в режим WAL (настройка сохраняется в файле).
+
+    Returns:
+        bool: True, если база работает в WAL.
+    """
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return mode.lower() == "wal"
+
+
+def create_readonly_engine(
+    db_path: str = DEFAULT_DB_PATH,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_overflow: int = DEFAULT_POOL_SIZE,
+    mmap_size: int = DEFAULT_MMAP_SIZE,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+) -> Engine:
+    """Создаёт движок с пулом соединений только для чтения.
+
+    Args:
+        db_path: Путь к файлу SQLite.
+        pool_size: Число постоянно открытых соединений.
+        max_overflow: Сколько соединений можно открыть сверх pool_size при пиковой нагрузке.
+        mmap_size: Размер отображения файла в память, байт.
+        cache_size: PRAGMA cache_size для каждого соединения.
+    """
+    path = os.path.abspath(db_path)
+    engine = create_engine(
+        f"sqlite+pysqlite:///file:{path}?mode=ro&uri=true",
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA query_only=ON")
+            cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+            cursor.execute(f"PRAGMA cache_size={int(cache_size)}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def get_engine(db_path: str = DEFAULT_DB_PATH, wal: bool = False, **kwargs) -> Engine:
+    """Возвращает общий движок только для чтения для файла базы данных.
+
+    Повторные вызовы с тем же путём возвращают тот же движок; параметры пула
+    учитываются только при первом создании.
+
+    Args:
+        db_path: Путь к файлу SQLite.
+        wal: Перевести базу в WAL перед открытием (изменяет файл базы).
+    """
+    path = os.path.abspath(db_path)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            if wal:
+                enable_wal(path)
+            engine = create_readonly_engine(path, **kwargs)
+            _engines[path] = engine
+        return engine
+
+
+def dispose_engines(db_path: Optional[str] = None):
+    """Закрывает соединения общих движков (всех или одного файла)"""
+    with _engines_lock:
+        paths = [os.path.abspath(db_path)] if db_path else list(_engines)
+        for path in paths:
+            engine = _engines.pop(path, None)
+            if engine is not None:
+                engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Настройка файла базы данных")
+    parser.add_argument("db", nargs="+", help="Пути к базам данных")
+    parser.add_argument("--wal", action="store_true", help="Перевести базы в режим WAL")
+    args = parser.parse_args()
+    if args.wal:
+        for path in args.db:
+            print(f"{path}: {'WAL' if enable_wal(path) else 'не удалось включить WAL'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Безопасные арифметические выражения для калькулятора агента.
+
+Выражение разбирается модулем ``ast`` и проверяется по белому списку узлов:
+числа, переменные, + - * / // % **, унарный минус и функции из FUNCTIONS.
+Проверенное дерево компилируется в байт-код один раз и кэшируется, поэтому
+повторные вызовы с той же формулой не разбирают её заново.
+
+Одно скомпилированное выражение вычисляется двумя способами:
+
+    * ``evaluate`` — в Decimal, точно для денежных сумм;
+    * ``evaluate_vector`` — над массивами NumPy за один проход, когда
+      формула применяется к столбцу (например, amount из execute_query).
+"""
+import ast
+import decimal
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+MAX_EXPRESSION_LENGTH = 10_000
+MAX_NODES = 500
+MAX_EXPONENT = 1_000
+# Точность промежуточных вычислений в Decimal (знаков)
+DECIMAL_PRECISION = 34
+
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+# Операторы, которые заменяются вызовом функции из пространства имён
+_OPERATOR_FUNCTIONS = {ast.Pow: "_pow", ast.FloorDiv: "_floordiv", ast.Mod: "_mod"}
+_FUNCTION_CALL_RE = re.compile(r"[^\W\d]\w*\s*\(")
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+
+
+def _check_exponent(exponent) -> None:
+    if np.max(np.abs(exponent)) > MAX_EXPONENT:
+        raise ValueError(f"Слишком большая степень (больше {MAX_EXPONENT})")
+
+
+def _decimal_pow(base: Decimal, exponent: Decimal) -> Decimal:
+    _check_exponent(float(exponent))
+    return base ** exponent
+
+
+def _vector_pow(base, exponent):
+    _check_exponent(exponent)
+    return np.power(base, exponent)
+
+
+def _decimal_floordiv(left: Decimal, right: Decimal) -> Decimal:
+    return _decimal_divmod(left, right)[0]
+
+
+def _decimal_mod(left: Decimal, right: Decimal) -> Decimal:
+    return _decimal_divmod(left, right)[1]
+
+
+def _decimal_divmod(left: Decimal, right: Decimal) -> Tuple[Decimal, Decimal]:
+    """divmod с округлением частного вниз, как у float и NumPy.
+
+    Decimal округляет частное // к нулю, и знак остатка % совпадает со
+    знаком делимого: -7 % 3 даёт -1 вместо 2.
+    """
+    if not right:
+        # Decimal сообщает об остатке от деления на ноль как о InvalidOperation
+        raise ZeroDivisionError
+    quotient, remainder = divmod(left, right)
+    if remainder and (remainder < 0) != (right < 0):
+        quotient -= 1
+        remainder += right
+    return quotient, remainder
+
+
+def _decimal_round(value: Decimal, digits: Decimal = Decimal(0)) -> Decimal:
+    return value.quantize(Decimal(1).scaleb(-int(digits)), rounding=decimal.ROUND_HALF_UP)
+
+
+def round_half_up(values, digits: int = 0) -> np.ndarray:
+    """Округление массива половиной от нуля, как ROUND_HALF_UP у Decimal.
+
+    np.round округляет половину к чётному (0.125 → 0.12), а 2.675 в float
+    чуть меньше половины; поэтому масштабированное значение сначала
+    приводится к 9 знакам, и 2.675 даёт 2.68, как в Decimal.
+    """
+    scale = 10.0 ** int(digits)
+    values = np.asarray(values, dtype=float)
+    return np.sign(values) * np.floor(np.round(np.abs(values) * scale, 9) + 0.5) / scale
+
+
+def _vector_reduce(ufunc):
+    return lambda first, *rest: ufunc.reduce(np.broadcast_arrays(first, *rest)) if rest else first
+
+
+# Функции выражений: (Decimal-реализация, NumPy-реализация)
+FUNCTIONS: Dict[str, Tuple[Callable, Callable]] = {
+    "abs": (abs, np.abs),
+    "round": (_decimal_round, round_half_up),
+    "min": (lambda *args: min(args), _vector_reduce(np.minimum)),
+    "max": (lambda *args: max(args), _vector_reduce(np.maximum)),
+    "sum": (lambda *args: sum(args, Decimal(0)), lambda *args: sum(args)),
+    "avg": (lambda *args: sum(args, Decimal(0)) / len(args), lambda *args: sum(args) / len(args)),
+    "sqrt": (lambda value: value.sqrt(), np.sqrt),
+}
+
+
+class CompiledExpression:
+    """Проверенное и скомпилированное выражение.
+
+    Attributes:
+        source: Нормализованный текст выражения.
+        variables: Имена переменных, которые нужно передать при вычислении.
+    """
+
+    def __init__(self, source: str, code, constants: Tuple[str, ...], variables: Tuple[str, ...]):
+        self.source = source
+        self.variables = variables
+        self._code = code
+        self._constants = constants
+        self._vector_constants = {f"_c{i}": float(value) for i, value in enumerate(constants)}
+
+    def evaluate(self, variables: Optional[Mapping[str, object]] = None) -> Decimal:
+        """Значение в Decimal; переменные приводятся к Decimal через str"""
+        namespace = {name: scalar for name, (scalar, _) in FUNCTIONS.items()}
+        namespace.update(_pow=_decimal_pow, _floordiv=_decimal_floordiv, _mod=_decimal_mod)
+        namespace.update({f"_c{i}": Decimal(value) for i, value in enumerate(self._constants)})
+        namespace.update({name: Decimal(str(value)) for name, value in self._bind(variables).items()})
+        with decimal.localcontext() as context:
+            context.prec = DECIMAL_PRECISION
+            context.traps[decimal.DivisionByZero] = True
+            context.traps[decimal.InvalidOperation] = True
+            try:
+                return eval(self._code, {"__builtins__": {}}, namespace)
+            except ZeroDivisionError:
+                raise ValueError("Деление на ноль") from None
+            except decimal.Overflow:
+                raise ValueError("Слишком большое число") from None
+            except decimal.InvalidOperation:
+                raise ValueError("Недопустимая операция (например, корень из отрицательного числа)") from None
+
+    def evaluate_vector(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Значения над массивами одной длины за один проход NumPy (float64).
+
+        Деление на ноль и пропуски дают nan/inf вместо исключения.
+        """
+        arrays = {name: np.asarray(value, dtype=float) for name, value in self._bind(columns).items()}
+        namespace = {name: vector for name, (_, vector) in FUNCTIONS.items()}
+        namespace.update(_pow=_vector_pow, _floordiv=np.floor_divide, _mod=np.mod)
+        namespace.update(self._vector_constants)
+        namespace.update(arrays)
+        with np.errstate(all="ignore"):
+            result = eval(self._code, {"__builtins__": {}}, namespace)
+        length = max((len(array) for array in arrays.values()), default=1)
+        return np.broadcast_to(np.asarray(result, dtype=float), (length,))
+
+    def _bind(self, variables: Optional[Mapping[str, object]]) -> Dict[str, object]:
+        variables = variables or {}
+        missing = [name for name in self.variables if name not in variables]
+        if missing:
+            raise ValueError(f"Неизвестные переменные: {', '.join(missing)}")
+        return {name: variables[name] for name in self.variables}
+
+
+class _Compiler(ast.NodeTransformer):
+    """Проверяет узлы по белому списку и выносит числа, ** // и % в имена пространства"""
+
+    def __init__(self):
+        self.constants = []
+        self.variables = set()
+
+    def generic_visit(self, node):
+        raise ValueError(f"Недопустимая конструкция: {type(node).__name__}")
+
+    def visit_Expression(self, node: ast.Expression):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Недопустимое значение: {node.value!r}")
+        self.constants.append(repr(node.value))
+        return ast.copy_location(ast.Name(id=f"_c{len(self.constants) - 1}", ctx=ast.Load()), node)
+
+    def visit_Name(self, node: ast.Name):
+        if node.id.startswith("_") or node.id in FUNCTIONS:
+            raise ValueError(f"Недопустимое имя: {node.id}")
+        self.variables.add(node.id)
+        return node
+
+    def visit_UnaryOp(self, node: ast.UnaryOp):
+        if not isinstance(node.op, (ast.USub, ast.UAdd)):
+            raise ValueError(f"Недопустимый оператор: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp):
+        left, right = self.visit(node.left), self.visit(node.right)
+        function = _OPERATOR_FUNCTIONS.get(type(node.op))
+        if function is not None:
+            call = ast.Call(func=ast.Name(id=function, ctx=ast.Load()), args=[left, right], keywords=[])
+            return ast.copy_location(call, node)
+        if not isinstance(node.op, _BINARY_OPERATORS):
+            raise ValueError(f"Недопустимый оператор: {type(node.op).__name__}")
+        node.left, node.right = left, right
+        return node
+
+    def visit_Call(self, node: ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"Недопустимая функция; доступны: {', '.join(FUNCTIONS)}")
+        if not node.args:
+            raise ValueError(f"Функции {node.func.id} нужен хотя бы один аргумент")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+def normalize(expression: str) -> str:
+    """Приводит запись к синтаксису Python: ×, ÷, ^ и десятичная запятая вне вызовов функций"""
+    expression = expression.strip().lower().rstrip("=").strip()
+    expression = expression.replace("×", "*").replace("÷", "/").replace("^", "**")
+    if not _FUNCTION_CALL_RE.search(expression):
+        expression = _DECIMAL_COMMA_RE.sub(".", expression)
+    return expression
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Разбирает, проверяет и компилирует выражение (результат кэшируется)"""
+    source = normalize(expression)
+    if not source:
+        raise ValueError("Пустое выражение")
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Выражение длиннее {MAX_EXPRESSION_LENGTH} символов")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Синтаксическая ошибка: {e.msg}") from None
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise ValueError(f"Выражение сложнее {MAX_NODES} узлов")
+    compiler = _Compiler()
+    tree = ast.fix_missing_locations(compiler.visit(tree))
+    code = compile(tree, "<expression>", "eval")
+    return CompiledExpression(source, code, tuple(compiler.constants), tuple(sorted(compiler.variables)))
+
+
+def to_number(value: Decimal, precision: int = 2) -> float:
+    """Округляет Decimal до precision знаков (половина — вверх) для ответа"""
+    if not value.is_finite():
+        raise ValueError("Результат не является конечным числом")
+    with decimal.localcontext() as context:
+        context.prec = DECIMAL_PRECISION
+        try:
+            return float(_decimal_round(value, Decimal(precision)))
+        except decimal.InvalidOperation:
+            raise ValueError("Слишком большое число") from None
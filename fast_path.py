@@ -0,0 +1,269 @@
+"""Быстрый путь: ответы на простые запросы без обращения к LLM.
+
+Перед запуском агента запрос проверяется на три шаблона:
+
+* арифметика — «Рассчитай (500 + 250) * 0.2» → CalculatorTool;
+* конвертация — «Конвертируй 1000 USD в RUB» → CurrencyConversionTool;
+* траты/доходы за месяц — «Сколько я потратил в январе 2025 в рублях?» →
+  параметризованный SQL. В другую валюту суммы переводятся так же, как
+  у агента: по курсу на дату операции (fx_convert), если в fx_rates есть
+  курсы, иначе итоги по валютам — через BatchCurrencyConversionTool.
+
+Запрос должен целиком совпасть с шаблоном: любое лишнее слово, второй
+месяц, место или число («самая большая трата», «в Diaz PLC», «больше
+5000») меняет смысл вопроса, и такой запрос, как и всё нераспознанное или
+завершившееся ошибкой, передаётся агенту.
+"""
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Engine, inspect, text
+
+MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+MONTH_NAMES = {
+    1: "январь", 2: "февраль", 3: "март", 4: "апрель", 5: "май", 6: "июнь",
+    7: "июль", 8: "август", 9: "сентябрь", 10: "октябрь", 11: "ноябрь", 12: "декабрь",
+}
+MONTH_RE = re.compile(
+    r"\b(январ\w*|феврал\w*|март\w*|апрел\w*|ма[йяе]|июн\w*|июл\w*|август\w*"
+    r"|сентябр\w*|октябр\w*|ноябр\w*|декабр\w*)\s+(\d{4})\b"
+)
+
+CURRENCY_ALIASES = {
+    "rub": "RUB", "руб": "RUB", "рубл": "RUB", "₽": "RUB",
+    "usd": "USD", "доллар": "USD", "$": "USD",
+    "eur": "EUR", "евро": "EUR", "€": "EUR",
+}
+CURRENCY_PATTERN = r"(rub|usd|eur|рубл\w*|руб\.?|доллар\w*|евро|₽|\$|€)"
+
+EXPENSE_WORDS = ("потратил", "потрачено", "трат", "расход", "израсходовал")
+INCOME_WORDS = ("заработал", "получил", "доход", "поступлени")
+
+_ARITHMETIC_RE = re.compile(
+    r"^(?:рассчитай|посчитай|вычисли|сколько будет|calculate)?\s*:?\s*([\d\s.,+\-*/()×÷]+?)\s*[?=]?\s*$"
+)
+_CONVERSION_RE = re.compile(
+    r"^(?:конвертируй|переведи|сколько будет|convert)?\s*(\d+(?:[.,]\d+)?)\s*"
+    + CURRENCY_PATTERN + r"\s+(?:в|во|to)\s+" + CURRENCY_PATTERN + r"\s*\??$"
+)
+_MONTH_FORM = (
+    r"(январ[ьяе]|феврал[ьяе]|март[ае]?|апрел[ьяе]|ма[йяе]|июн[ьяе]|июл[ьяе]|август[ае]?"
+    r"|сентябр[ьяе]|октябр[ьяе]|ноябр[ьяе]|декабр[ьяе])"
+)
+_PERIOD_TAIL = (
+    r"\s+(?:в|за)\s+" + _MONTH_FORM + r"\s+(\d{4})(?:\s+(?:года|году|г\.?))?"
+    r"(?:\s+(?:в|во)\s+(рублях|руб\.?|rub|долларах|usd|евро|eur|₽|\$|€))?"
+)
+# «Сколько я потратил в январе 2025 в рублях» / «Траты за январь 2025»
+_MONTHLY_TOTAL_RES = (
+    re.compile(
+        r"^(?:сколько\s+)?(?:я\s+)?(?:всего\s+)?(?P<verb>потратил[а]?|заработал[а]?|получил[а]?)"
+        r"(?:\s+всего)?" + _PERIOD_TAIL + r"$"
+    ),
+    re.compile(r"^(?:покажи\s+)?(?:мои\s+)?(?P<verb>траты|расходы|доходы)" + _PERIOD_TAIL + r"$"),
+)
+
+
+def canonical_currency(word: str) -> Optional[str]:
+    """Код валюты по слову: 'рублях' → 'RUB', '$' → 'USD'"""
+    word = word.lower().rstrip(".")
+    for alias, code in CURRENCY_ALIASES.items():
+        if word.startswith(alias):
+            return code
+    return None
+
+
+def parse_month(query: str) -> Optional[Tuple[int, int]]:
+    """Месяц и год из фразы «в январе 2025» → (2025, 1)"""
+    match = MONTH_RE.search(query)
+    if match is None:
+        return None
+    word, year = match.groups()
+    for stem, month in MONTHS.items():
+        if word.startswith(stem):
+            return int(year), month
+    return None
+
+
+class RouterStats:
+    """Доля запросов, обслуженных быстрым путём, и задержки по маршрутам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.latency: Dict[str, float] = {}
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+            self.latency[route] = self.latency.get(route, 0.0) + seconds
+
+    def report(self) -> Dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            fast = sum(n for route, n in self.counts.items() if route != "agent")
+            fast_time = sum(t for route, t in self.latency.items() if route != "agent")
+            agent = self.counts.get("agent", 0)
+            return {
+                "total": total,
+                "fast_path_share": fast / total if total else 0.0,
+                "fast_path_avg_seconds": fast_time / fast if fast else None,
+                "agent_avg_seconds": self.latency.get("agent", 0.0) / agent if agent else None,
+                "routes": dict(self.counts),
+            }
+
+
+class FastPathRouter:
+    """Маршрутизатор запросов перед агентом.
+
+    Args:
+        engine: Движок базы данных с таблицей transactions.
+        calculator: Экземпляр CalculatorTool.
+        currency_tool: Экземпляр CurrencyConversionTool.
+        batch_currency_tool: Экземпляр BatchCurrencyConversionTool.
+        fx_store: FxRateStore, функции которого зарегистрированы на engine, или None.
+        stats: Общая статистика нескольких маршрутизаторов (например, всех баз пользователей).
+    """
+
+    def __init__(self, engine: Engine, calculator, currency_tool, batch_currency_tool,
+                 fx_store=None, stats: Optional[RouterStats] = None):
+        self.engine = engine
+        self.calculator = calculator
+        self.currency_tool = currency_tool
+        self.batch_currency_tool = batch_currency_tool
+        self.fx_store = fx_store
+        self.stats = stats if stats is not None else RouterStats()
+        self._has_monthly_rollup: Optional[bool] = None
+
+    def answer(self, query: str, agent):
+        """Отвечает быстрым путём или запускает агента; задержка учитывается в stats"""
+        start = time.perf_counter()
+        routed = self.route(query)
+        if routed is not None:
+            route, response = routed
+        else:
+            route, response = "agent", agent.run(query)
+        self.stats.record(route, time.perf_counter() - start)
+        return response
+
+    def route(self, query: str) -> Optional[Tuple[str, str]]:
+        """Возвращает (маршрут, ответ) или None, если запрос нужно отдать агенту"""
+        normalized = " ".join(query.lower().split())
+        for route, handler in (
+            ("calculator", self._arithmetic),
+            ("currency", self._conversion),
+            ("spending", self._monthly_totals),
+        ):
+            try:
+                response = handler(normalized)
+            except Exception:
+                # Любая ошибка быстрого пути — повод отдать запрос агенту
+                response = None
+            if response is not None:
+                return route, response
+        return None
+
+    def _arithmetic(self, query: str) -> Optional[str]:
+        match = _ARITHMETIC_RE.match(query)
+        if match is None:
+            return None
+        expression = match.group(1).strip()
+        if not re.search(r"\d\s*[+\-*/×÷]\s*[\d(]", expression):
+            return None
+        result = self.calculator.forward(expression)
+        if "error" in result:
+            return None
+        return f"{expression} = {result['result']}"
+
+    def _conversion(self, query: str) -> Optional[str]:
+        match = _CONVERSION_RE.match(query)
+        if match is None:
+            return None
+        amount = float(match.group(1).replace(",", "."))
+        base, target = canonical_currency(match.group(2)), canonical_currency(match.group(3))
+        if base is None or target is None:
+            return None
+        result = self.currency_tool.forward(base, target, amount)
+        return (
+            f"{amount:g} {base} = {result['conversion_result']:.2f} {target} "
+            f"(курс {result['conversion_rate']})"
+        )
+
+    def _monthly_totals(self, query: str) -> Optional[str]:
+        query = query.replace("ё", "е").rstrip("?!. ")
+        match = next((m for m in (r.match(query) for r in _MONTHLY_TOTAL_RES) if m is not None), None)
+        if match is None:
+            return None
+        verb, month_word, year, currency = match.group("verb", 2, 3, 4)
+        if verb.startswith(EXPENSE_WORDS):
+            operation_type, label = "expense", "Траты"
+        else:
+            operation_type, label = "income", "Доходы"
+        period = parse_month(f"{month_word} {year}")
+        if period is None:
+            return None
+        year, month = period
+        target = canonical_currency(currency) if currency else None
+
+        totals = self._query_month(operation_type, year, month)
+        period_label = f"{MONTH_NAMES[month]} {year}"
+        if not totals:
+            return f"{label} за {period_label}: операций не найдено"
+
+        if target is None:
+            parts = ", ".join(f"{total:.2f} {currency}" for currency, total in totals.items())
+            return f"{label} за {period_label}: {parts}"
+
+        if self.fx_store is not None and self.fx_store.has_rates():
+            total = self._query_month_converted(operation_type, year, month, target)
+            return f"{label} за {period_label}: {total:.2f} {target} (по курсу на дату операции, fx_convert)"
+
+        converted = self.batch_currency_tool.forward(
+            [[total, currency] for currency, total in totals.items()], target
+        )
+        if "error" in converted:
+            return None
+        details = "; ".join(
+            f"{currency}: {item['amount']:.2f} × {item['rate']:.4f}"
+            for currency, item in converted["totals_by_currency"].items()
+        )
+        return f"{label} за {period_label}: {converted['total']:.2f} {target} ({details})"
+
+    def _query_month_converted(self, operation_type: str, year: int, month: int, target: str) -> float:
+        """Сумма за месяц в target по курсу на дату каждой операции"""
+        month_key = f"{year:04d}-{month:02d}"
+        next_month = f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+        query = text(
+            "SELECT TOTAL(fx_convert(amount, currency, :target, operation_date)) FROM transactions "
+            "WHERE operation_type = :type AND operation_date >= :start AND operation_date < :end"
+        )
+        params = {"target": target, "type": operation_type, "start": f"{month_key}-01", "end": f"{next_month}-01"}
+        with self.engine.connect() as conn:
+            return conn.execute(query, params).scalar()
+
+    def _query_month(self, operation_type: str, year: int, month: int) -> Dict[str, float]:
+        """Суммы за месяц по валютам: из свёртки, если она есть, иначе из transactions"""
+        if self._has_monthly_rollup is None:
+            self._has_monthly_rollup = inspect(self.engine).has_table("transactions_monthly")
+        month_key = f"{year:04d}-{month:02d}"
+        if self._has_monthly_rollup:
+            query = text(
+                "SELECT currency, SUM(total_amount) FROM transactions_monthly "
+                "WHERE month = :month AND operation_type = :type GROUP BY currency"
+            )
+            params = {"month": month_key, "type": operation_type}
+        else:
+            next_month = f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+            query = text(
+                "SELECT currency, SUM(amount) FROM transactions "
+                "WHERE operation_type = :type AND operation_date >= :start AND operation_date < :end "
+                "GROUP BY currency"
+            )
+            params = {"type": operation_type, "start": f"{month_key}-01", "end": f"{next_month}-01"}
+        with self.engine.connect() as conn:
+            return {currency: total for currency, total in conn.execute(query, params) if total is not None}
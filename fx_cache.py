@@ -0,0 +1,168 @@
+"""Кэш таблиц валютных курсов для CurrencyConversionTool.
+
+Ответ ``/latest/{base}`` содержит курсы ко всем валютам сразу, поэтому
+кэшируется целая таблица по базовой валюте. Поддерживаются TTL, вывод
+кросс-курсов из уже загруженных таблиц, объединение одновременных запросов
+одной базы в одну загрузку и снимок на диске на случай недоступности API.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_TTL = 3600.0
+DEFAULT_SNAPSHOT_PATH = "fx_snapshot.json"
+
+
+class RateCache:
+    """Потокобезопасный кэш таблиц курсов.
+
+    Args:
+        fetch: Функция, возвращающая таблицу курсов ``{валюта: курс}`` для базовой валюты.
+            Должна выбрасывать ConnectionError, если API недоступен.
+        ttl: Время жизни таблицы в секундах.
+        snapshot_path: Файл снимка курсов; None отключает сохранение на диск.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Dict[str, float]],
+        ttl: float = DEFAULT_TTL,
+        snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._tables: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load_snapshot()
+
+    def get_rate(self, base: str, target: str) -> float:
+        """Возвращает курс base → target, загружая таблицу только при необходимости"""
+        base, target = base.upper(), target.upper()
+        if base == target:
+            return 1.0
+
+        with self._lock:
+            rate = self._cached_rate(base, target, fresh_only=True)
+            if rate is not None:
+                self.hits += 1
+                return rate
+            self.misses += 1
+
+        try:
+            rates = self.get_table(base)
+        except ConnectionError:
+            # API недоступен: используем устаревшие данные из памяти или снимка
+            with self._lock:
+                rate = self._cached_rate(base, target, fresh_only=False)
+            if rate is None:
+                raise
+            return rate
+
+        if target not in rates:
+            raise ValueError(f"Валюта {target} не найдена")
+        return rates[target]
+
+    def get_table(self, base: str) -> Dict[str, float]:
+        """Возвращает свежую таблицу курсов базовой валюты.
+
+        Одновременные запросы одной и той же базы ждут единственную загрузку.
+        """
+        base = base.upper()
+        rates, future, owner = self._claim(base)
+        if rates is not None:
+            return rates
+        if not owner:
+            return future.result()
+        try:
+            rates = self.fetch(base)
+        except BaseException as e:
+            self._fail(base, future, e)
+            raise
+        return self._store(base, future, rates)
+
+    def _claim(self, base: str):
+        """Свежая таблица из кэша или future загрузки (и признак, что загружать нам)"""
+        with self._lock:
+            entry = self._tables.get(base)
+            if entry is not None and self._is_fresh(entry):
+                return entry[1], None, False
+            future = self._inflight.get(base)
+            if future is not None:
+                return None, future, False
+            future = Future()
+            self._inflight[base] = future
+            return None, future, True
+
+    def _fail(self, base: str, future: Future, error: BaseException):
+        with self._lock:
+            del self._inflight[base]
+        future.set_exception(error)
+
+    def _store(self, base: str, future: Future, rates: Dict[str, float]) -> Dict[str, float]:
+        rates = {code.upper(): float(rate) for code, rate in rates.items()}
+        with self._lock:
+            self._tables[base] = (time.time(), rates)
+            del self._inflight[base]
+        future.set_result(rates)
+        self._save_snapshot()
+        return rates
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def _is_fresh(self, entry: Tuple[float, Dict[str, float]]) -> bool:
+        return time.time() - entry[0] < self.ttl
+
+    def _cached_rate(self, base: str, target: str, fresh_only: bool) -> Optional[float]:
+        """Ищет прямой курс, затем кросс-курс через любую подходящую таблицу"""
+        entry = self._tables.get(base)
+        if entry is not None and (not fresh_only or self._is_fresh(entry)):
+            if target in entry[1]:
+                return entry[1][target]
+
+        for entry in self._tables.values():
+            if fresh_only and not self._is_fresh(entry):
+                continue
+            rates = entry[1]
+            if base in rates and target in rates and rates[base]:
+                return rates[target] / rates[base]
+        return None
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                payload = json.load(f)
+            self._tables = {
+                base: (float(entry["fetched_at"]), dict(entry["rates"]))
+                for base, entry in payload.items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            self._tables = {}
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            payload = {
+                base: {"fetched_at": fetched_at, "rates": rates}
+                for base, (fetched_at, rates) in self._tables.items()
+            }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with self._save_lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self.snapshot_path)
+            except OSError:
+                pass
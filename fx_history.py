@@ -0,0 +1,244 @@
+"""Исторические валютные курсы в SQLite и конвертация прямо в SQL-запросах.
+
+Курсы хранятся в таблице ``fx_rates (date, base, quote, rate)`` и загружаются
+из CSV-файлов пакетами. На движке SQLAlchemy регистрируются функции
+
+    fx_rate(base, quote, date)              -- курс на дату (последний известный)
+    fx_convert(amount, base, quote, date)   -- сумма в валюте quote
+
+так что агрегаты вида «траты по месяцам в RUB» считаются одним запросом:
+
+    SELECT strftime('%Y-%m', operation_date) AS month,
+           SUM(fx_convert(amount, currency, 'RUB', operation_date))
+    FROM transactions WHERE operation_type = 'expense' GROUP BY month
+"""
+import argparse
+import csv
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Engine, event
+
+from schema_catalog import DataVersionProbe, sqlite_path
+
+FX_RATES_DDL = """
+CREATE TABLE IF NOT EXISTS fx_rates (
+    date TEXT NOT NULL,
+    base TEXT NOT NULL,
+    quote TEXT NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (base, quote, date)
+) WITHOUT ROWID
+"""
+
+
+def load_rates_csv(db_path: str, paths: Iterable[str], batch_size: int = 10_000) -> int:
+    """Загружает курсы из CSV-файлов с колонками date, base, quote, rate.
+
+    Повторная загрузка тех же дат перезаписывает курсы.
+
+    Returns:
+        int: Количество загруженных строк.
+    """
+    conn = sqlite3.connect(db_path)
+    loaded = 0
+    try:
+        conn.execute(FX_RATES_DDL)
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as f:
+                batch: List[Tuple[str, str, str, float]] = []
+                for row in csv.DictReader(f):
+                    batch.append((
+                        row["date"].strip(),
+                        row["base"].strip().upper(),
+                        row["quote"].strip().upper(),
+                        float(row["rate"]),
+                    ))
+                    if len(batch) >= batch_size:
+                        loaded += _insert_batch(conn, batch)
+                        batch = []
+                loaded += _insert_batch(conn, batch)
+        conn.commit()
+    finally:
+        conn.close()
+    return loaded
+
+
+def _insert_batch(conn: sqlite3.Connection, batch: List[Tuple[str, str, str, float]]) -> int:
+    conn.executemany(
+        "INSERT OR REPLACE INTO fx_rates (date, base, quote, rate) VALUES (?, ?, ?, ?)", batch
+    )
+    return len(batch)
+
+
+class FxRateStore:
+    """Курсы из ``fx_rates`` в памяти с поиском курса на дату.
+
+    Используется последний курс с датой не позже запрошенной. Если прямой пары
+    нет, используется обратная пара или кросс-курс через промежуточную валюту.
+    Таблица перечитывается, когда меняется файл базы данных
+    (проверка не чаще раза в ``check_interval`` секунд).
+    """
+
+    def __init__(self, db_path: str, check_interval: float = 1.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._probe = DataVersionProbe(db_path)
+        self._lock = threading.Lock()
+        self._pairs: Dict[Tuple[str, str], Tuple[List[str], List[float]]] = {}
+        self._memo: Dict[Tuple[str, str, str], Optional[float]] = {}
+        self._version: Optional[int] = None
+        self._revision = 0
+        self._loaded = False
+        self._next_check = 0.0
+
+    def rate(self, base: str, quote: str, date: str) -> Optional[float]:
+        """Возвращает курс base → quote на дату или None, если курс неизвестен"""
+        if base is None or quote is None or date is None:
+            return None
+        base, quote, date = base.upper(), quote.upper(), str(date)[:10]
+        if base == quote:
+            return 1.0
+        self._refresh_if_changed()
+        key = (base, quote, date)
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        value = self._lookup(base, quote, date)
+        if value is None:
+            for pivot in {b for b, _ in self._pairs}:
+                first = self._lookup(base, pivot, date)
+                second = self._lookup(pivot, quote, date) if first is not None else None
+                if second is not None:
+                    value = first * second
+                    break
+        self._memo[key] = value
+        return value
+
+    def version(self) -> int:
+        """Номер версии курсов: растёт, когда перечитанная fx_rates отличается от прежней"""
+        self._refresh_if_changed()
+        return self._revision
+
+    def has_rates(self) -> bool:
+        """Есть ли в fx_rates хотя бы один курс"""
+        self._refresh_if_changed()
+        return bool(self._pairs)
+
+    def convert(self, amount: Optional[float], base: str, quote: str, date: str,
+                current_rate: Optional[Callable[[str, str], float]] = None) -> Optional[float]:
+        """Сумма в валюте quote по курсу на дату.
+
+        Если исторического курса нет, используется текущий курс
+        ``current_rate(base, quote)``; без него — ValueError: молча
+        пропущенная строка исказила бы SUM.
+        """
+        if amount is None:
+            return None
+        rate = self.rate(base, quote, date)
+        if rate is None and current_rate is not None and base is not None and quote is not None:
+            rate = current_rate(base.upper(), quote.upper())
+        if rate is None:
+            raise ValueError(f"Нет курса {base}/{quote} на {date}")
+        return amount * rate
+
+    def reload(self):
+        """Перечитывает таблицу fx_rates"""
+        pairs: Dict[Tuple[str, str], Tuple[List[str], List[float]]] = {}
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_schema WHERE type='table' AND name='fx_rates'"
+            ).fetchone()
+            if exists:
+                # Порядок первичного ключа: строки уже отсортированы по дате внутри пары
+                for date, base, quote, rate in conn.execute(
+                    "SELECT date, base, quote, rate FROM fx_rates ORDER BY base, quote, date"
+                ):
+                    dates, rates = pairs.setdefault((base, quote), ([], []))
+                    dates.append(date)
+                    rates.append(rate)
+        finally:
+            conn.close()
+        with self._lock:
+            # data_version меняется и от записи в transactions: версия растёт, только если курсы другие
+            if pairs != self._pairs:
+                self._revision += 1
+            self._pairs = pairs
+            self._memo = {}
+            self._loaded = True
+
+    def _refresh_if_changed(self):
+        now = time.monotonic()
+        if self._loaded and now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        version = self._probe.data_version()
+        if not self._loaded or version is None or version != self._version:
+            self._version = version
+            self.reload()
+
+    def _lookup(self, base: str, quote: str, date: str) -> Optional[float]:
+        """Прямой или обратный курс на дату"""
+        series = self._pairs.get((base, quote))
+        if series is not None:
+            index = bisect_right(series[0], date) - 1
+            if index >= 0:
+                return series[1][index]
+        series = self._pairs.get((quote, base))
+        if series is not None:
+            index = bisect_right(series[0], date) - 1
+            if index >= 0 and series[1][index]:
+                return 1.0 / series[1][index]
+        return None
+
+
+def register_fx_functions(engine: Engine, store: FxRateStore,
+                          current_rate: Optional[Callable[[str, str], float]] = None):
+    """Регистрирует fx_rate и fx_convert на всех соединениях движка.
+
+    Функции не объявляются детерминированными: результат зависит от
+    содержимого fx_rates, которое меняется между запросами.
+
+    Args:
+        current_rate: ``get_rate(base, quote)`` для дат без исторического курса.
+    """
+
+    def fx_convert(amount, base, quote, date):
+        return store.convert(amount, base, quote, date, current_rate)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("fx_rate", 3, store.rate)
+        dbapi_connection.create_function("fx_convert", 4, fx_convert)
+
+    # Уже открытые соединения пула созданы без функций
+    engine.dispose()
+
+
+def store_for_engine(engine: Engine,
+                     current_rate: Optional[Callable[[str, str], float]] = None) -> Optional[FxRateStore]:
+    """Создаёт хранилище курсов для файла БД движка и регистрирует функции"""
+    db_path = sqlite_path(engine)
+    if db_path is None:
+        return None
+    store = FxRateStore(db_path)
+    register_fx_functions(engine, store, current_rate)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка исторических курсов в fx_rates")
+    parser.add_argument("csv", nargs="+", help="CSV-файлы с колонками date, base, quote, rate")
+    parser.add_argument("--db", default="user_transactions.db", help="Путь к базе данных")
+    args = parser.parse_args()
+    loaded = load_rates_csv(args.db, args.csv)
+    print(f"Загружено курсов: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
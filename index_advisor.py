@@ -0,0 +1,375 @@
+"""Советник по индексам для запросов агента.
+
+ExecuteQueryTool записывает выполненные запросы в QueryLog. IndexAdvisor
+прогоняет их через ``EXPLAIN QUERY PLAN``, находит полные сканирования
+таблиц и предлагает составные (по возможности покрывающие) индексы:
+сначала столбцы из условий равенства, затем столбец диапазона, затем
+столбцы GROUP BY/ORDER BY и остальные используемые столбцы.
+
+Пригодность индекса проверяется на пустой копии схемы в памяти, поэтому
+рекомендации можно получать без построения индексов на большой базе.
+
+    QUERY_LOG=query_log.jsonl streamlit run App.py   # журнал ведётся, только если задан
+    python index_advisor.py --db user_transactions.db --log query_log.jsonl --apply
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Индексы под запросы из системного промпта и примеров интерфейса
+CANONICAL_INDEXES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("transactions", ("operation_type", "operation_date", "currency", "amount")),
+    ("transactions", ("operation_type", "currency", "operation_date", "amount")),
+    ("transactions", ("operation_date", "operation_type", "currency", "amount")),
+    ("transactions", ("location", "operation_date")),
+]
+
+_IDENTIFIER = r'"?([A-Za-z_][A-Za-z0-9_]*)"?'
+_EQUALITY_RE = re.compile(_IDENTIFIER + r"\s*(?:=|==|\bIN\b|\bIS\b(?!\s+NOT))", re.IGNORECASE)
+_RANGE_RE = re.compile(_IDENTIFIER + r"\s*(?:<=|>=|<|>|\bBETWEEN\b|\bLIKE\b|\bGLOB\b)", re.IGNORECASE)
+_CLAUSE_RE = re.compile(
+    r"\b(WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|UNION|EXCEPT|INTERSECT)\b", re.IGNORECASE
+)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+    except FileNotFoundError:
+        return 0
+
+
+class QueryLog:
+    """Журнал выполненных запросов с подсчётом повторов.
+
+    Args:
+        path: Файл JSONL для накопления запросов между запусками; None — только память.
+        max_queries: Максимум различных запросов в памяти.
+        max_lines: Сколько последних запросов хранить в файле. Когда строк
+            становится вдвое больше, файл переписывается с последними max_lines.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_queries: int = 1000, max_lines: int = 10_000):
+        self.path = path
+        self.max_queries = max_queries
+        self.max_lines = max_lines
+        self.counts: Counter = Counter()
+        self._lines: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def record(self, query: str):
+        query = " ".join(query.split())
+        with self._lock:
+            if query in self.counts or len(self.counts) < self.max_queries:
+                self.counts[query] += 1
+            if self.path:
+                try:
+                    self._append(json.dumps({"query": query}, ensure_ascii=False) + "\n")
+                except OSError:
+                    pass
+
+    def _append(self, line: str):
+        if self._lines is None:
+            self._lines = _count_lines(self.path)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self._lines += 1
+        if self._lines >= 2 * self.max_lines:
+            with open(self.path, encoding="utf-8") as f:
+                tail = deque(f, maxlen=self.max_lines)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(tail)
+            os.replace(tmp_path, self.path)
+            self._lines = len(tail)
+
+    def queries(self) -> List[str]:
+        """Запросы в порядке убывания частоты"""
+        with self._lock:
+            return [query for query, _ in self.counts.most_common()]
+
+    @classmethod
+    def load(cls, path: str) -> "QueryLog":
+        log = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    log.record(json.loads(line)["query"])
+        log.path = path
+        return log
+
+
+class IndexAdvisor:
+    """Анализирует планы запросов и рекомендует индексы.
+
+    Args:
+        db_path: Путь к файлу SQLite.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def _connect(self, readonly: bool = True) -> sqlite3.Connection:
+        if readonly:
+            return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        return sqlite3.connect(self.db_path)
+
+    def explain(self, query: str, conn: Optional[sqlite3.Connection] = None) -> List[str]:
+        """Возвращает строки EXPLAIN QUERY PLAN"""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+        finally:
+            if own:
+                conn.close()
+
+    @staticmethod
+    def full_scans(plan: Sequence[str]) -> List[str]:
+        """Таблицы, которые читаются полностью: без индекса или по непокрывающему индексу"""
+        tables = []
+        for detail in plan:
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if match and "COVERING INDEX" not in detail:
+                tables.append(match.group(1))
+        return tables
+
+    def table_columns(self, conn: sqlite3.Connection) -> Dict[str, List[str]]:
+        tables = [
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_schema WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )
+        ]
+        return {
+            table: [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+            for table in tables
+        }
+
+    def recommend(self, queries: Iterable[str]) -> List[Dict]:
+        """Рекомендует индексы для запросов с полным сканированием.
+
+        Returns:
+            List[Dict]: Рекомендации с ключами table, columns, ddl, queries и plan_after.
+        """
+        conn = self._connect()
+        try:
+            columns_by_table = self.table_columns(conn)
+            existing = self.existing_indexes(conn)
+            recommendations: Dict[Tuple[str, Tuple[str, ...]], Dict] = {}
+            for query in queries:
+                try:
+                    scans = self.full_scans(self.explain(query, conn))
+                except sqlite3.Error:
+                    continue
+                for table in scans:
+                    columns, key_len = self._index_columns(query, columns_by_table.get(table, []))
+                    if not columns or self._covered(table, columns, key_len, existing):
+                        continue
+                    # Перестановка уже предложенного индекса с теми же ключами не нужна
+                    entry = next((
+                        rec for (rec_table, rec_columns), rec in recommendations.items()
+                        if rec_table == table
+                        and self._covered(table, columns, key_len, {table: [rec_columns]})
+                    ), None)
+                    if entry is None:
+                        entry = recommendations.setdefault((table, columns), {
+                            "table": table,
+                            "columns": list(columns),
+                            "ddl": index_ddl(table, columns),
+                            "queries": [],
+                        })
+                    entry["queries"].append(query)
+        finally:
+            conn.close()
+
+        result = self._drop_prefixes(list(recommendations.values()))
+        self._verify(result)
+        return result
+
+    def apply(self, recommendations: Iterable[Dict]) -> List[str]:
+        """Создаёт рекомендованные индексы и обновляет статистику планировщика"""
+        created = []
+        conn = self._connect(readonly=False)
+        try:
+            for rec in recommendations:
+                conn.execute(rec["ddl"])
+                created.append(rec["ddl"])
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+        return created
+
+    def apply_canonical(self) -> List[str]:
+        """Создаёт индексы под канонические запросы промпта"""
+        conn = self._connect()
+        try:
+            columns_by_table = self.table_columns(conn)
+        finally:
+            conn.close()
+        return self.apply(
+            {"ddl": index_ddl(table, columns)}
+            for table, columns in CANONICAL_INDEXES
+            if set(columns) <= set(columns_by_table.get(table, []))
+        )
+
+    @staticmethod
+    def existing_indexes(conn: sqlite3.Connection) -> Dict[str, List[Tuple[str, ...]]]:
+        indexes: Dict[str, List[Tuple[str, ...]]] = {}
+        for table, name in conn.execute(
+            "SELECT tbl_name, name FROM sqlite_schema WHERE type='index'"
+        ).fetchall():
+            columns = tuple(row[2] for row in conn.execute(f'PRAGMA index_info("{name}")'))
+            indexes.setdefault(table, []).append(columns)
+        return indexes
+
+    @staticmethod
+    def _covered(table: str, columns: Tuple[str, ...], key_len: int,
+                 existing: Dict[str, List[Tuple[str, ...]]]) -> bool:
+        """Есть ли индекс с теми же ключевыми столбцами, содержащий все нужные столбцы"""
+        key = set(columns[:key_len])
+        return any(
+            set(index[:key_len]) == key and set(columns) <= set(index)
+            for index in existing.get(table, [])
+        )
+
+    @staticmethod
+    def _drop_prefixes(recommendations: List[Dict]) -> List[Dict]:
+        """Убирает индексы, являющиеся префиксом другого рекомендованного индекса"""
+        kept = []
+        for rec in recommendations:
+            cols = tuple(rec["columns"])
+            dominated = any(
+                other is not rec
+                and other["table"] == rec["table"]
+                and len(other["columns"]) > len(cols)
+                and tuple(other["columns"][:len(cols)]) == cols
+                for other in recommendations
+            )
+            if dominated:
+                for other in recommendations:
+                    if (other is not rec and other["table"] == rec["table"]
+                            and tuple(other["columns"][:len(cols)]) == cols):
+                        other["queries"].extend(rec["queries"])
+                        break
+            else:
+                kept.append(rec)
+        return kept
+
+    def _verify(self, recommendations: List[Dict]):
+        """Проверяет планы на пустой копии схемы с рекомендованными индексами"""
+        if not recommendations:
+            return
+        source = self._connect()
+        shadow = sqlite3.connect(":memory:")
+        try:
+            for (sql,) in source.execute(
+                "SELECT sql FROM sqlite_schema WHERE type IN ('table', 'index') "
+                "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+            ):
+                shadow.execute(sql)
+            for rec in recommendations:
+                shadow.execute(rec["ddl"])
+            for rec in recommendations:
+                rec["plan_after"] = {query: self.explain(query, shadow) for query in rec["queries"]}
+        except sqlite3.Error:
+            pass
+        finally:
+            source.close()
+            shadow.close()
+
+    @staticmethod
+    def _index_columns(query: str, table_columns: Sequence[str]) -> Tuple[Tuple[str, ...], int]:
+        """Порядок столбцов индекса: равенства, диапазон, группировка, остальные.
+
+        Returns:
+            Кортеж (столбцы индекса, число ключевых столбцов из WHERE).
+        """
+        if not table_columns:
+            return (), 0
+        known = {col.lower(): col for col in table_columns}
+        stripped = _STRING_RE.sub("''", query)
+        clauses = _split_clauses(stripped)
+        where = clauses.get("WHERE", "")
+
+        def columns_in(pattern: re.Pattern, fragment: str) -> List[str]:
+            found = []
+            for name in pattern.findall(fragment):
+                col = known.get(name.lower())
+                if col and col not in found:
+                    found.append(col)
+            return found
+
+        equality = columns_in(_EQUALITY_RE, where)
+        ranges = [col for col in columns_in(_RANGE_RE, where) if col not in equality]
+        ordered = equality + ranges[:1]
+        key_len = len(ordered)
+
+        grouping = []
+        for clause in ("GROUP BY", "ORDER BY"):
+            for name in re.findall(_IDENTIFIER, clauses.get(clause, "")):
+                col = known.get(name.lower())
+                if col and col not in ordered and col not in grouping:
+                    grouping.append(col)
+        ordered += grouping
+        if not ordered:
+            return (), 0
+
+        # Покрывающий индекс: добавляем остальные упомянутые столбцы, если это не SELECT *
+        if not re.search(r"SELECT\s+(?:DISTINCT\s+)?\*", stripped, re.IGNORECASE):
+            for name in re.findall(_IDENTIFIER, stripped):
+                col = known.get(name.lower())
+                if col and col not in ordered and col.lower() != "id":
+                    ordered.append(col)
+        return tuple(ordered), key_len
+
+
+def _split_clauses(query: str) -> Dict[str, str]:
+    """Делит запрос верхнего уровня на секции WHERE, GROUP BY, ORDER BY и т.д."""
+    clauses: Dict[str, str] = {}
+    matches = list(_CLAUSE_RE.finditer(query))
+    for i, match in enumerate(matches):
+        name = " ".join(match.group(1).upper().split())
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(query)
+        clauses.setdefault(name, query[match.end():end])
+    return clauses
+
+
+def index_ddl(table: str, columns: Sequence[str]) -> str:
+    name = f"idx_{table}_" + "_".join(columns)
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    return f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_list})'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рекомендации индексов по журналу запросов")
+    parser.add_argument("--db", default="user_transactions.db", help="Путь к базе данных")
+    parser.add_argument("--log", default="query_log.jsonl", help="Журнал запросов (JSONL)")
+    parser.add_argument("--canonical", action="store_true", help="Создать канонические индексы")
+    parser.add_argument("--apply", action="store_true", help="Создать рекомендованные индексы")
+    args = parser.parse_args()
+
+    advisor = IndexAdvisor(args.db)
+    if args.canonical:
+        for ddl in advisor.apply_canonical():
+            print(ddl)
+    # Журнал ведётся только с QUERY_LOG (Financial_Agent), поэтому файла может не быть
+    if not os.path.exists(args.log):
+        print(f"Журнал запросов {args.log} не найден: рекомендации пропущены (журнал включается переменной QUERY_LOG)")
+        return
+    recommendations = advisor.recommend(QueryLog.load(args.log).queries())
+    for rec in recommendations:
+        print(f"{rec['ddl']}  -- запросов: {len(rec['queries'])}")
+    if args.apply:
+        advisor.apply(recommendations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Компактные наблюдения агента: что модель видит после вызова инструмента.
+
+smolagents превращает результат инструмента в текст через ``str()``: список
+словарей execute_query повторяет имена столбцов в каждой строке, а дробные
+числа попадают в контекст со всеми знаками. Здесь результат сериализуется
+экономнее:
+
+    * список однотипных объектов — заголовок и строки значений
+      (``{"columns": [...], "rows": [[...]]}``); значения, одинаковые во
+      всех строках, выносятся в ``same``;
+    * дробные числа округляются: суммы от 100 — до копеек, меньшие
+      значения (курсы, проценты) — до 6 значащих цифр;
+    * JSON без лишних пробелов и экранирования кириллицы.
+
+Если наблюдение всё равно больше бюджета токенов, самая длинная таблица
+сокращается до превью со сводкой по числовым столбцам всех её строк.
+Инструменты по-прежнему возвращают обычные структуры (их используют
+fast_path и кэши), а форматирование подключается к агенту
+(ObservationFormatter.instrument_agent).
+"""
+import json
+import math
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from prompts import estimate_tokens
+from tracing import current_run
+
+MAX_OBSERVATION_TOKENS = 1500
+# Таблица строится начиная с двух объектов, общие значения выносятся начиная с трёх
+MIN_TABLE_ROWS = 2
+MIN_SAME_ROWS = 3
+# Дробные числа по модулю не меньше этого округляются до копеек
+MONEY_THRESHOLD = 100
+SIGNIFICANT_DIGITS = 6
+
+
+def round_number(value: float):
+    """Округление для наблюдения; целые значения записываются без дробной части"""
+    if not math.isfinite(value):
+        return value
+    if value.is_integer() and abs(value) < 1e15:
+        return int(value)
+    if abs(value) >= MONEY_THRESHOLD:
+        return round(value, 2)
+    return float(f"{value:.{SIGNIFICANT_DIGITS}g}")
+
+
+def columnar(records: List[Dict]) -> Dict[str, Any]:
+    """Список объектов в виде заголовка столбцов и строк значений"""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    rows = [[compact(record.get(column)) for column in columns] for record in records]
+    same = []
+    if len(rows) >= MIN_SAME_ROWS:
+        same = [i for i in range(len(columns)) if all(row[i] == rows[0][i] for row in rows)]
+    if not same or len(same) == len(columns):
+        return {"columns": columns, "rows": rows}
+    keep = [i for i in range(len(columns)) if i not in same]
+    return {
+        "columns": [columns[i] for i in keep],
+        "same": {columns[i]: rows[0][i] for i in same},
+        "rows": [[row[i] for i in keep] for row in rows],
+    }
+
+
+def compact(value):
+    """Компактная копия результата инструмента (исходный объект не изменяется)"""
+    if isinstance(value, float):
+        return round_number(value)
+    if isinstance(value, dict):
+        return {key: compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) >= MIN_TABLE_ROWS and all(isinstance(item, dict) for item in value):
+            return columnar(value)
+        return [compact(item) for item in value]
+    return value
+
+
+def is_table(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("columns"), list) and isinstance(value.get("rows"), list)
+
+
+def expand_rows(value):
+    """Обратное преобразование: таблица из наблюдения — снова список объектов.
+
+    Так модель может передать таблицу execute_query в calculator или
+    batch_currency_converter без переписывания. Остальное возвращается как есть.
+    """
+    # Усечённый результат execute_query — список из одного объекта с превью в rows
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict) and "rows" in value[0]:
+        value = value[0]
+    if isinstance(value, dict) and not is_table(value) and "rows" in value:
+        value = value["rows"]
+    if not is_table(value):
+        return value
+    columns, same = value["columns"], value.get("same") or {}
+    return [{**dict(zip(columns, row)), **same} for row in value["rows"]]
+
+
+def dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _tables(node, parent: Optional[Dict] = None) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+    """Все таблицы в структуре вместе с объектом, в котором они лежат"""
+    if is_table(node):
+        yield node, parent
+    if isinstance(node, dict):
+        for item in node.values():
+            yield from _tables(item, node)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _tables(item, None)
+
+
+def table_summary(table: Dict) -> Dict[str, Dict[str, float]]:
+    """count/sum/min/max/avg по числовым столбцам таблицы"""
+    summary = {}
+    for i, column in enumerate(table["columns"]):
+        values = [
+            row[i] for row in table["rows"]
+            if isinstance(row[i], (int, float)) and not isinstance(row[i], bool)
+        ]
+        if values:
+            total = sum(values)
+            summary[column] = {
+                "count": len(values),
+                "sum": round_number(float(total)),
+                "min": min(values),
+                "max": max(values),
+                "avg": round_number(total / len(values)),
+            }
+    return summary
+
+
+def shrink(data, max_tokens: int) -> Tuple[str, bool]:
+    """Сокращает компактную структуру до бюджета токенов.
+
+    Самая длинная таблица урезается до превью максимальной длины, которое
+    помещается в бюджет; если сводки по всем строкам рядом ещё нет
+    (как у усечённого результата execute_query), она добавляется. Когда
+    таблиц нет или не помогает и это, текст обрезается.
+
+    Returns:
+        Текст и признак того, что наблюдение сокращено.
+    """
+    text = dumps(data)
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text, False
+
+    tables = sorted(_tables(data), key=lambda item: -len(item[0]["rows"]))
+    if tables and len(tables[0][0]["rows"]) > 1:
+        table, parent = tables[0]
+        rows = table["rows"]
+        if not (parent and "summary" in parent):
+            table["summary"] = table_summary(table)
+        table["omitted_rows"] = 0
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high + 1) // 2
+            table["rows"], table["omitted_rows"] = rows[:middle], len(rows) - middle
+            if estimate_tokens(dumps(data)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        table["rows"], table["omitted_rows"] = rows[:low], len(rows) - low
+        text = dumps(data)
+        tokens = estimate_tokens(text)
+        if tokens <= max_tokens:
+            return text, True
+
+    return truncate(text, tokens, max_tokens), True
+
+
+def truncate(text: str, tokens: int, max_tokens: int) -> str:
+    """Обрезает текст пропорционально бюджету с пометкой об исходном размере"""
+    cut = max(0, int(len(text) * max_tokens / tokens) - 40)
+    return text[:cut] + f"… [обрезано, всего ~{tokens} токенов]"
+
+
+class ObservationFormatter:
+    """Сериализация результатов инструментов в компактные наблюдения.
+
+    Args:
+        max_tokens: Бюджет токенов одного наблюдения; больше — превью и сводка.
+        skip_tools: Инструменты, результат которых не форматируется
+            (final_answer — это ответ пользователю, а не наблюдение).
+    """
+
+    def __init__(self, max_tokens: int = MAX_OBSERVATION_TOKENS, skip_tools: Tuple[str, ...] = ("final_answer",)):
+        self.max_tokens = max_tokens
+        self.skip_tools = frozenset(skip_tools)
+
+    def format(self, result) -> Tuple[str, int, bool]:
+        """Текст наблюдения, его размер в токенах и признак сокращения"""
+        if isinstance(result, str):
+            text = result.strip()
+            tokens = estimate_tokens(text)
+            if tokens <= self.max_tokens:
+                return text, tokens, False
+            text = truncate(text, tokens, self.max_tokens)
+            return text, estimate_tokens(text), True
+        text, summarized = shrink(compact(result), self.max_tokens)
+        return text, estimate_tokens(text), summarized
+
+    def instrument_agent(self, agent):
+        """Подменяет выполнение инструментов агента: модель получает компактный текст.
+
+        Размер каждого наблюдения (и то, сколько занял бы str() исходного
+        результата) записывается в текущую трассу.
+        """
+        if getattr(agent, "_compact_observations", False):
+            return agent
+        execute_tool_call = agent.execute_tool_call
+
+        def compact_tool_call(tool_name: str, arguments):
+            result = execute_tool_call(tool_name, arguments)
+            if tool_name in self.skip_tools:
+                return result
+            text, tokens, summarized = self.format(result)
+            run = current_run()
+            if run is not None:
+                run.add_observation(tool_name, tokens, estimate_tokens(str(result).strip()), summarized)
+            return text
+
+        agent.execute_tool_call = compact_tool_call
+        agent._compact_observations = True
+        return agent
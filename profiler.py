@@ -0,0 +1,203 @@
+"""Однопроходный профилировщик столбцов таблиц SQLite.
+
+За одно сканирование таблицы для каждого столбца считает количество
+уникальных значений (точно или через HyperLogLog), min/max, число NULL,
+самые частые значения и примеры. Память ограничена: точный подсчёт ведётся
+до ``exact_limit`` уникальных значений, дальше используются HyperLogLog
+и алгоритм Мисры–Гриса для частых значений.
+"""
+import hashlib
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, text
+
+DEFAULT_EXACT_LIMIT = 100_000
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def _hash64(value: Any) -> int:
+    """Стабильный 64-битный хэш значения (hash() для int не перемешивает биты)"""
+    data = f"{type(value).__name__}:{value!r}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Порядок сравнения значений разных типов как в SQLite: числа < текст < BLOB"""
+    if isinstance(value, (int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (2, bytes(value))
+
+
+def format_value(value: Any) -> str:
+    """Форматирует значение для примеров в каталоге"""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, bytes):
+        return value[:25].hex()
+    return str(value)[:50]
+
+
+class HyperLogLog:
+    """Приближённый подсчёт уникальных значений с фиксированной памятью.
+
+    Args:
+        precision: Число бит индекса регистра; ошибка около 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._rank_bits = 64 - precision
+
+    def add_hash(self, hashed: int):
+        index = hashed >> self._rank_bits
+        rest = hashed & ((1 << self._rank_bits) - 1)
+        rank = self._rank_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value: Any):
+        self.add_hash(_hash64(value))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Поправка для малых мощностей (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class ColumnProfile:
+    """Накопитель статистики одного столбца"""
+
+    def __init__(self, name: str, col_type: str, exact_limit: int = DEFAULT_EXACT_LIMIT,
+                 top_k: int = 5, sample_size: int = 5):
+        self.name = name
+        self.col_type = col_type
+        self.exact_limit = exact_limit
+        self.top_k = top_k
+        self.sample_size = sample_size
+        self.rows = 0
+        self.null_count = 0
+        self.min: Any = None
+        self.max: Any = None
+        self.samples: List[Any] = []
+        # Пока уникальных значений мало, Counter одновременно служит точным множеством
+        self.counts: Counter = Counter()
+        self.hll: Optional[HyperLogLog] = None
+        self._heavy_capacity = max(top_k * 20, 100)
+
+    def add(self, value: Any):
+        self.rows += 1
+        if value is None:
+            self.null_count += 1
+            return
+
+        key = _sort_key(value)
+        if self.min is None or key < _sort_key(self.min):
+            self.min = value
+        if self.max is None or key > _sort_key(self.max):
+            self.max = value
+
+        if self.hll is None:
+            if value not in self.counts and len(self.samples) < self.sample_size:
+                self.samples.append(value)
+            self.counts[value] += 1
+            if len(self.counts) > self.exact_limit:
+                self._switch_to_approximate()
+            return
+
+        self.hll.add(value)
+        self.counts[value] += 1
+        if len(self.counts) >= 2 * self._heavy_capacity:
+            self._prune_counts()
+
+    def _prune_counts(self):
+        """Мисра–Грис с пакетным уменьшением: вычитаем счётчик (capacity+1)-го значения"""
+        ordered = self.counts.most_common()
+        threshold = ordered[self._heavy_capacity][1] if len(ordered) > self._heavy_capacity else 0
+        self.counts = Counter(
+            {v: n - threshold for v, n in ordered[:self._heavy_capacity] if n > threshold}
+        )
+
+    def _switch_to_approximate(self):
+        self.hll = HyperLogLog()
+        for item in self.counts:
+            self.hll.add(item)
+        self._prune_counts()
+
+    @property
+    def approximate(self) -> bool:
+        return self.hll is not None
+
+    @property
+    def unique_values(self) -> int:
+        return self.hll.count() if self.hll is not None else len(self.counts)
+
+    def to_metadata(self) -> Dict:
+        """Метаданные столбца в формате ListTablesTool"""
+        metadata = {
+            "name": self.name,
+            "type": self.col_type,
+            "unique_values": self.unique_values,
+            "approximate": self.approximate,
+            "null_count": self.null_count,
+            "min": format_value(self.min) if self.min is not None else None,
+            "max": format_value(self.max) if self.max is not None else None,
+            "examples": [format_value(v) for v in self.samples] or ["NULL"],
+        }
+        top = self.counts.most_common(self.top_k)
+        # Для почти уникальных столбцов частые значения ничего не сообщают
+        if top and top[0][1] > 1:
+            metadata["top_values"] = [[format_value(v), n] for v, n in top]
+        return metadata
+
+
+def profile_table(
+    engine: Engine,
+    table: str,
+    columns: Sequence[Tuple[str, str]],
+    exact_limit: int = DEFAULT_EXACT_LIMIT,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[Dict]:
+    """Профилирует все столбцы таблицы за одно сканирование.
+
+    Args:
+        engine: Движок SQLAlchemy.
+        table: Имя таблицы.
+        columns: Пары (имя столбца, тип).
+        exact_limit: Порог уникальных значений, после которого подсчёт становится приближённым.
+        chunk_size: Размер порции строк при потоковом чтении.
+
+    Returns:
+        List[Dict]: Метаданные столбцов в порядке ``columns``.
+    """
+    profiles = [ColumnProfile(name, col_type, exact_limit) for name, col_type in columns]
+    if not profiles:
+        return []
+
+    quote = engine.dialect.identifier_preparer.quote
+    column_list = ", ".join(quote(name) for name, _ in columns)
+    query = text(f"SELECT {column_list} FROM {quote(table)}")
+
+    with engine.connect() as conn:
+        result = conn.execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                for profile, value in zip(profiles, row):
+                    profile.add(value)
+
+    return [profile.to_metadata() for profile in profiles]
@@ -1,3 +1,9 @@
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from fast_path import EXPENSE_WORDS, INCOME_WORDS
+
 Financial_Agent_Prompt = '''
 Ты — интеллектуальный финансовый ассистент, специализирующийся на работе с базами данных и валютными операциями. Твоя задача — точно и эффективно решать финансовые запросы, используя доступные инструменты.
 
@@ -26,8 +32,13 @@ Financial_Agent_Prompt = '''
    - Выбирают только нужные поля
    - Содержат условия WHERE для фильтрации
    - Используют агрегатные функции при необходимости
+   - Для итогов по дням и месяцам берут готовые свёртки transactions_daily / transactions_monthly (SUM(total_amount)), если list_tables их показывает
+   - Если execute_query вернул truncated=True, в rows только превью: total_rows и summary посчитаны по всем строкам
 4. **Обработка ошибок**: При получении ошибки анализируй её и корректируй запрос
-5. Чтобы выдать окончательный ответ на задачу, используй JSON-блок с инструментом "name": "final_answer". Это единственный способ завершить выполнение задачи — иначе ты застрянешь в бесконечном цикле. Твой финальный вывод должен выглядеть так:
+5. **Конвертация в SQL**: Если list_tables показывает таблицу fx_rates с курсами, для сумм в другой валюте по курсу на дату операции используй в execute_query функцию fx_convert(amount, currency, 'RUB', operation_date), например: SELECT SUM(fx_convert(amount, currency, 'RUB', operation_date)) FROM transactions WHERE operation_type = 'expense' AND operation_date LIKE '2025-01%'. Для дат без исторического курса fx_convert берёт текущий курс; если fx_rates пуста, суммируй по валютам и переводи итоги через batch_currency_converter
+6. **Пакетная конвертация**: Если нужно перевести несколько сумм или строки результата execute_query в одну валюту, передай их все в batch_currency_converter одним вызовом
+7. **Независимые вызовы**: Если несколько вызовов не зависят от результатов друг друга (курсы разных валют, запросы за разные периоды), выдай их в одном шаге — они выполняются одновременно
+8. Чтобы выдать окончательный ответ на задачу, используй JSON-блок с инструментом "name": "final_answer". Это единственный способ завершить выполнение задачи — иначе ты застрянешь в бесконечном цикле. Твой финальный вывод должен выглядеть так:
   Action:
   {
     "name": "final_answer",
@@ -160,4 +171,194 @@ Action:
 6. Все вычисления выполняй через calculator
 7. Ответ через `final_answer` должен включать не только итоговую строку, но и краткое обоснование каждого шага, ссылки на использованные инструменты и пояснение формул или SQL-конструкций.
 
-Твоя цель — предоставлять точные, проверяемые финансовые данные с минимальным количеством запросов.'''
\ No newline at end of file
+Твоя цель — предоставлять точные, проверяемые финансовые данные с минимальным количеством запросов.'''
+
+# Компактный промпт: схема базы подставляется из каталога, примеры выбираются под вопрос.
+# Financial_Agent_Prompt выше остаётся полной версией без схемы.
+
+PROMPT_HEADER = '''
+Ты — финансовый ассистент. Решай запросы пользователя по его базе транзакций и курсам валют с помощью инструментов.
+
+### Формат:
+1. Каждый шаг — вызов инструмента в формате VALID JSON, без текста вне JSON
+2. Независимые вызовы (курсы разных валют, запросы за разные периоды) выдавай в одном шаге — они выполняются одновременно
+3. Чтобы завершить задачу, вызови "final_answer" — это единственный способ закончить:
+  {"name": "final_answer", "arguments": {"answer": "окончательный ответ"}}
+
+### Инструменты:
+{%- for tool in tools.values() %}
+- {{ tool.name }}: {{ tool.description | trim }}
+{%- for name, spec in tool.inputs.items() %}
+    • {{ name }} ({{ spec.type }}{% if spec.get('nullable') %}, необязательный{% endif %}): {{ spec.description }}
+{%- endfor %}
+{%- endfor %}
+
+### Правила:
+1. Только SELECT; выбирай нужные поля, фильтруй WHERE, считай агрегатами в SQL, а не по строкам
+2. Итоги по дням и месяцам бери из свёрток transactions_daily / transactions_monthly (SUM(total_amount)), если они есть в схеме
+3. Таблицы в ответах инструментов — {"columns": [...], "rows": [[...]]}, общие для всех строк значения — в same; такую таблицу можно передать целиком в values калькулятора или items batch_currency_converter. При truncated или omitted_rows в rows только превью, а total_rows и summary посчитаны по всем строкам
+{fx_rule}
+5. Несколько сумм в одну валюту — одним вызовом batch_currency_converter; несколько вычислений или формулу над списком чисел — одним вызовом calculator (expressions / values)
+6. Динамику по периодам, скользящие средние, сравнение с прошлым месяцем или годом и доли категорий считай одним вызовом analytics, а не SQL
+7. При ошибке исправь запрос и повтори
+8. Суммы в ответе — с валютой, даты — YYYY-MM-DD; кратко поясни шаги, SQL и формулы
+'''
+
+FX_CONVERT_RULE = "4. Суммы в другой валюте по курсу на дату операции: fx_convert(amount, currency, 'RUB', operation_date) в SQL; для дат без исторического курса берётся текущий"
+NO_FX_CONVERT_RULE = "4. Суммы в другой валюте: SUM(amount) ... GROUP BY currency в SQL, затем итоги по валютам одним вызовом batch_currency_converter"
+
+SCHEMA_SECTION = '''
+### Схема базы данных (актуальна, list_tables вызывай только если нужны подробности):
+{% raw %}{schema}{% endraw %}
+'''
+
+NO_SCHEMA_SECTION = '''
+### Схема базы данных:
+Перед первым запросом к базе вызови list_tables.
+'''
+
+# (ключевые основы слов вопроса, текст примера)
+PROMPT_EXAMPLES: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "spending": (
+        EXPENSE_WORDS + INCOME_WORDS + ("сколько", "сумм", "итог", "всего"),
+        '''Задача: «Сколько я потратил в январе 2025 в рублях?»
+Action: {"name": "execute_query", "arguments": {"query": "SELECT currency, SUM(amount) AS total FROM transactions WHERE operation_type = 'expense' AND operation_date >= '2025-01-01' AND operation_date < '2025-02-01' GROUP BY currency"}}
+Observation: {"columns":["currency","total"],"rows":[["RUB",412350.17],["USD",2840.5]]}
+Action: {"name": "batch_currency_converter", "arguments": {"items": [[412350.17, "RUB"], [2840.5, "USD"]], "target_currency": "RUB"}}
+Observation: {"target_currency":"RUB","total":668449.65,"count":2,"totals_by_currency":{...}}
+Action: {"name": "final_answer", "arguments": {"answer": "Траты за январь 2025: 668449.65 RUB (412350.17 RUB + 2840.5 USD по курсу 90.16). SQL: SUM(amount) по валютам за 2025-01, перевод — batch_currency_converter."}}''',
+    ),
+    "conversion": (
+        ("конверт", "курс", "переведи", "обмен", "сколько будет", "usd", "eur", "доллар", "евро"),
+        '''Задача: «Сколько будет 1500 EUR в USD?»
+Action: {"name": "currency_converter", "arguments": {"base_currency": "EUR", "target_currency": "USD", "amount": 1500}}
+Observation: {"conversion_rate":1.0805,"conversion_result":1620.75}
+Action: {"name": "final_answer", "arguments": {"answer": "1500 EUR = 1620.75 USD (курс 1.0805)"}}''',
+    ),
+    "ranking": (
+        ("где", "мест", "больше всего", "меньше всего", "топ", "чаще", "крупн"),
+        '''Задача: «Где я больше всего потратил в марте 2025?»
+Action: {"name": "execute_query", "arguments": {"query": "SELECT location, SUM(fx_convert(amount, currency, 'RUB', operation_date)) AS total_rub FROM transactions WHERE operation_type = 'expense' AND operation_date LIKE '2025-03%' GROUP BY location ORDER BY total_rub DESC LIMIT 5"}}
+Observation: {"columns":["location","total_rub"],"rows":[["Smith Inc",84210.4],...]}
+Action: {"name": "final_answer", "arguments": {"answer": "Больше всего в марте 2025 потрачено в Smith Inc: 84210.40 RUB (SUM по location с пересчётом fx_convert, ORDER BY DESC)."}}''',
+    ),
+    "analytics": (
+        ("динамик", "тренд", "менял", "изменил", "сравни", "прошл", "год назад", "скользящ", "доля", "долю", "процент"),
+        '''Задача: «Как изменились мои траты в последнем месяце по сравнению с прошлым годом?»
+Action: {"name": "analytics", "arguments": {"analysis": "compare", "period": "month", "operation_type": "expense", "currency": "RUB"}}
+Observation: {"period":"2025-04","current":{"total":182340.5,...},"previous":{"total":170120,"change_pct":7.2},"year_ago":{"total":151002.3,"change_pct":20.8}}
+Action: {"name": "final_answer", "arguments": {"answer": "Траты за 2025-04: 182340.50 RUB — на 20.8% больше, чем в 2024-04 (151002.30 RUB), и на 7.2% больше, чем в 2025-03 (analytics compare)."}}''',
+    ),
+    "schema": (
+        ("таблиц", "колонк", "столбц", "схем", "структур", "поля", "полей"),
+        '''Задача: «Какие таблицы есть в базе?»
+Action: {"name": "final_answer", "arguments": {"answer": "В базе есть таблица transactions со столбцами id, currency, amount, operation_type, location, comment, operation_date (по схеме выше)."}}''',
+    ),
+}
+DEFAULT_EXAMPLE = "spending"
+
+# Варианты примеров без fx_convert — для баз с пустой fx_rates
+NO_FX_EXAMPLES: Dict[str, str] = {
+    "ranking": '''Задача: «Где я больше всего потратил в марте 2025?»
+Action: {"name": "execute_query", "arguments": {"query": "SELECT location, currency, SUM(amount) AS total FROM transactions WHERE operation_type = 'expense' AND operation_date >= '2025-03-01' AND operation_date < '2025-04-01' GROUP BY location, currency ORDER BY total DESC LIMIT 5"}}
+Observation: {"columns":["location","currency","total"],"rows":[["Smith Inc","RUB",84210.4],["Lee LLC","USD",512.3],...]}
+Action: {"name": "batch_currency_converter", "arguments": {"items": [[84210.4, "RUB"], [512.3, "USD"]], "target_currency": "RUB"}}
+Observation: {"target_currency":"RUB","total":130399.47,"converted_amounts":[84210.4,46189.07],...}
+Action: {"name": "final_answer", "arguments": {"answer": "Больше всего в марте 2025 потрачено в Smith Inc: 84210.40 RUB (SUM по location и валюте, ORDER BY DESC, перевод — batch_currency_converter)."}}''',
+}
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_MAX_VALUE_CHARS = 30
+
+
+def _short(value) -> str:
+    value = str(value)
+    return value if len(value) <= _MAX_VALUE_CHARS else value[:_MAX_VALUE_CHARS - 1] + "…"
+
+
+def _compact_column(column: Dict, primary_key: bool) -> str:
+    name, col_type = column["name"], column.get("type", "")
+    text = f"{name} {col_type}"
+    if primary_key:
+        return text + " PK"
+    allowed = column.get("allowed_values")
+    top = [value for value, _ in column.get("top_values") or []]
+    unique = column.get("unique_values")
+    if allowed:
+        return text + " ∈ {" + ", ".join(map(str, allowed)) + "}"
+    if unique is not None and unique <= 12 and top:
+        return text + " ∈ {" + ", ".join(map(_short, top)) + "}"
+    low, high = column.get("min"), column.get("max")
+    if low is not None and (col_type.upper() in ("INTEGER", "REAL", "NUMERIC") or _DATE_RE.match(str(low))):
+        return text + f" {_short(low)}…{_short(high)}"
+    examples = (top or column.get("examples") or [])[:3]
+    approx = "~" if column.get("approximate") else ""
+    if examples:
+        return text + f" ({approx}{unique} знач., напр. " + "; ".join(map(_short, examples)) + ")"
+    return text
+
+
+def compact_schema(catalog: List[Dict]) -> str:
+    """Схема из каталога (ListTablesTool) в одну строку на таблицу.
+
+    Вместо DDL и полного профиля столбцов — тип, допустимые значения,
+    диапазон или пара примеров; для свёрток добавляется их описание.
+    """
+    lines = []
+    for table in catalog:
+        ddl = table.get("ddl") or ""
+        columns = []
+        for column in table.get("columns", []):
+            primary_key = re.search(rf"\b{re.escape(column['name'])}\b[^,\n]*PRIMARY KEY", ddl) is not None
+            columns.append(_compact_column(column, primary_key))
+        line = f"{table['table_name']}: " + "; ".join(columns)
+        if table.get("description"):
+            line += f"\n  — {table['description']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def select_examples(question: str, limit: int = 2) -> List[str]:
+    """Названия примеров, ближайших к вопросу по ключевым словам (не больше limit)"""
+    text = question.lower()
+    scores = []
+    for name, (keywords, _) in PROMPT_EXAMPLES.items():
+        score = sum(1 for keyword in keywords if keyword in text)
+        if score:
+            scores.append((score, name))
+    scores.sort(key=lambda item: -item[0])
+    selected = [name for _, name in scores[:limit]]
+    return selected or [DEFAULT_EXAMPLE]
+
+
+def build_system_prompt(question: Optional[str] = None, schema: Optional[str] = None, limit: int = 2,
+                        fx_convert: bool = False) -> str:
+    """Шаблон системного промпта smolagents под конкретный вопрос.
+
+    Args:
+        question: Вопрос пользователя; по нему выбираются примеры.
+        schema: Компактная схема (compact_schema); без неё агенту предлагается вызвать list_tables.
+        limit: Максимум примеров.
+        fx_convert: В fx_rates есть курсы — правило и примеры с fx_convert.
+    """
+    names = select_examples(question, limit) if question else [DEFAULT_EXAMPLE]
+    examples = "\n\n".join(
+        PROMPT_EXAMPLES[name][1] if fx_convert else NO_FX_EXAMPLES.get(name, PROMPT_EXAMPLES[name][1])
+        for name in names
+    )
+    parts = [PROMPT_HEADER.replace("{fx_rule}", FX_CONVERT_RULE if fx_convert else NO_FX_CONVERT_RULE)]
+    if schema:
+        parts.append(SCHEMA_SECTION.replace("{schema}", schema.replace("{% endraw %}", "")))
+    else:
+        parts.append(NO_SCHEMA_SECTION)
+    parts.append("\n### Примеры:\n{% raw %}" + examples + "{% endraw %}\n")
+    return "".join(parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов: tiktoken, если установлен, иначе ~4 байта UTF-8 на токен"""
+    try:
+        import tiktoken
+    except ImportError:
+        return math.ceil(len(text.encode("utf-8")) / 4)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
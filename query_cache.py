@@ -0,0 +1,113 @@
+"""LRU-кэш результатов SELECT-запросов ExecuteQueryTool.
+
+Ключ — нормализованный текст запроса, поэтому запросы, отличающиеся только
+пробелами и регистром ключевых слов, попадают в одну запись. Все записи
+действительны для одной версии базы данных (PRAGMA data_version и mtime
+файлов БД/WAL); при изменении базы кэш очищается целиком.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from schema_catalog import DataVersionProbe
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class DatabaseVersion:
+    """Версия файла SQLite: PRAGMA data_version и время изменения файлов БД и WAL.
+
+    Значение меняется при любой зафиксированной записи в базу, в том числе из
+    других процессов.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        self._probe = DataVersionProbe(self.db_path)
+
+    def __call__(self) -> Tuple:
+        mtimes = []
+        for suffix in ("", "-wal"):
+            try:
+                mtimes.append(os.stat(self.db_path + suffix).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return (self._probe.data_version(), *mtimes)
+
+
+class QueryResultCache:
+    """Кэш результатов с вытеснением по суммарному размеру.
+
+    Args:
+        db_path: Путь к файлу SQLite, изменения которого сбрасывают кэш.
+        max_bytes: Предельный суммарный размер результатов (по длине текстового представления).
+        max_entries: Предельное число записей.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = 1024):
+        self.db_path = os.path.abspath(db_path)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.database_version = DatabaseVersion(self.db_path)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[Tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        version = self.database_version()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = len(repr(value))
+        if size > self.max_bytes:
+            return
+        version = self.database_version()
+        with self._lock:
+            self._check_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _check_version(self, version: Tuple):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
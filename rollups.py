@@ -0,0 +1,149 @@
+"""Предагрегированные итоги по транзакциям.
+
+Таблицы-свёртки хранят суммы и количество операций по дням и месяцам
+в разрезе типа операции и валюты (месячная — ещё и по месту операции).
+Они заполняются один раз при установке, а дальше поддерживаются триггерами
+на INSERT/UPDATE/DELETE в ``transactions``, поэтому итог за месяц читается
+из нескольких строк независимо от длины истории.
+
+    python rollups.py install --db user_transactions.db
+"""
+import argparse
+import sqlite3
+from typing import Dict, List, Tuple
+
+# Таблица: (столбец периода, выражение периода от строки, столбцы-измерения)
+ROLLUPS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "transactions_daily": ("day", "substr({row}operation_date, 1, 10)", ("operation_type", "currency")),
+    "transactions_monthly": ("month", "substr({row}operation_date, 1, 7)", ("operation_type", "currency")),
+    "transactions_monthly_location": (
+        "month", "substr({row}operation_date, 1, 7)", ("operation_type", "currency", "location")
+    ),
+}
+
+ROLLUP_DESCRIPTIONS = {
+    "transactions_daily": "Готовые итоги по дням: total_amount и tx_count по operation_type и currency. "
+                          "Используй вместо SUM по transactions для дневных итогов.",
+    "transactions_monthly": "Готовые итоги по месяцам (month = 'YYYY-MM'): total_amount и tx_count "
+                            "по operation_type и currency. Используй для месячных доходов и расходов.",
+    "transactions_monthly_location": "Готовые итоги по месяцам и местам операций (location).",
+}
+
+
+def _ddl(table: str) -> str:
+    period, _, dimensions = ROLLUPS[table]
+    key = ", ".join((period,) + dimensions)
+    columns = ",\n    ".join(f"{col} TEXT NOT NULL" for col in (period,) + dimensions)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} (\n    {columns},\n"
+        f"    total_amount REAL NOT NULL DEFAULT 0,\n"
+        f"    tx_count INTEGER NOT NULL DEFAULT 0,\n"
+        f"    PRIMARY KEY ({key})\n) WITHOUT ROWID"
+    )
+
+
+def _key_values(table: str, row: str) -> List[str]:
+    """Выражения ключа свёртки для строки NEW/OLD (NULL заменяется пустой строкой)"""
+    period, period_expr, dimensions = ROLLUPS[table]
+    prefix = f"{row}." if row else ""
+    values = [f"coalesce({period_expr.format(row=prefix)}, '')"]
+    values += [f"coalesce({prefix}{col}, '')" for col in dimensions]
+    return values
+
+
+def _add_statement(table: str) -> str:
+    period, _, dimensions = ROLLUPS[table]
+    columns = ", ".join((period,) + dimensions)
+    key = ", ".join((period,) + dimensions)
+    values = ", ".join(_key_values(table, "NEW"))
+    return (
+        f"INSERT INTO {table} ({columns}, total_amount, tx_count) "
+        f"VALUES ({values}, coalesce(NEW.amount, 0), 1) "
+        f"ON CONFLICT ({key}) DO UPDATE SET "
+        f"total_amount = total_amount + excluded.total_amount, tx_count = tx_count + 1;"
+    )
+
+
+def _subtract_statements(table: str) -> str:
+    period, _, dimensions = ROLLUPS[table]
+    condition = " AND ".join(
+        f"{col} = {value}" for col, value in zip((period,) + dimensions, _key_values(table, "OLD"))
+    )
+    return (
+        f"UPDATE {table} SET total_amount = total_amount - coalesce(OLD.amount, 0), "
+        f"tx_count = tx_count - 1 WHERE {condition};\n"
+        f"    DELETE FROM {table} WHERE {condition} AND tx_count <= 0;"
+    )
+
+
+def _triggers() -> List[str]:
+    adds = "\n    ".join(_add_statement(table) for table in ROLLUPS)
+    subtracts = "\n    ".join(_subtract_statements(table) for table in ROLLUPS)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS transactions_rollup_insert AFTER INSERT ON transactions\n"
+        f"BEGIN\n    {adds}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS transactions_rollup_delete AFTER DELETE ON transactions\n"
+        f"BEGIN\n    {subtracts}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS transactions_rollup_update AFTER UPDATE ON transactions\n"
+        f"BEGIN\n    {subtracts}\n    {adds}\nEND",
+    ]
+
+
+def _backfill(conn: sqlite3.Connection):
+    for table, (period, _, dimensions) in ROLLUPS.items():
+        columns = ", ".join((period,) + dimensions)
+        values = ", ".join(_key_values(table, ""))
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(
+            f"INSERT INTO {table} ({columns}, total_amount, tx_count) "
+            f"SELECT {values}, SUM(coalesce(amount, 0)), COUNT(*) FROM transactions "
+            f"GROUP BY {', '.join(str(i) for i in range(1, len(dimensions) + 2))}"
+        )
+
+
+def install(db_path: str):
+    """Создаёт свёртки, заполняет их текущими данными и ставит триггеры"""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for table in ROLLUPS:
+                conn.execute(_ddl(table))
+            _backfill(conn)
+            for trigger in _triggers():
+                conn.execute(trigger)
+    finally:
+        conn.close()
+
+
+def rebuild(db_path: str):
+    """Пересчитывает свёртки с нуля (например, после массовой загрузки без триггеров)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            _backfill(conn)
+    finally:
+        conn.close()
+
+
+def uninstall(db_path: str):
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for name in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER IF EXISTS transactions_rollup_{name}")
+            for table in ROLLUPS:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление таблицами-свёртками транзакций")
+    parser.add_argument("command", choices=["install", "rebuild", "uninstall"])
+    parser.add_argument("--db", default="user_transactions.db", help="Путь к базе данных")
+    args = parser.parse_args()
+    {"install": install, "rebuild": rebuild, "uninstall": uninstall}[args.command](args.db)
+
+
+if __name__ == "__main__":
+    main()
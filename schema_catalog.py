@@ -0,0 +1,176 @@
+"""Кэшируемый каталог схемы базы данных для ListTablesTool.
+
+Каталог строится один раз, хранится в памяти и рядом с файлом БД
+(``<db>.catalog.json``) и перестраивается только при изменении схемы
+или ``sqlite_sequence``. Проверка актуальности выполняется через
+``PRAGMA data_version`` на отдельном соединении и стоит микросекунды.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Engine, inspect, text
+
+# Версия формата метаданных таблиц: при её смене сохранённые каталоги перестраиваются
+CATALOG_FORMAT = 2
+
+
+def sqlite_path(engine: Engine) -> Optional[str]:
+    """Возвращает путь к файлу SQLite или None для in-memory БД"""
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    if database.startswith("file:"):
+        database = database[len("file:"):].split("?", 1)[0]
+    return os.path.abspath(database)
+
+
+class DataVersionProbe:
+    """Дешёвая проверка изменений файла SQLite через PRAGMA data_version.
+
+    Значение меняется, когда любое *другое* соединение фиксирует транзакцию,
+    поэтому проба держит собственное соединение только для чтения.
+    """
+
+    def __init__(self, db_path: Optional[str]):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def data_version(self) -> Optional[int]:
+        """Возвращает текущий data_version или None, если проверка недоступна"""
+        if self.db_path is None:
+            return None
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(
+                        f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+                    )
+                return self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                self._conn = None
+                return None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SchemaCatalog:
+    """Каталог таблиц с профилем столбцов и DDL с комментариями.
+
+    Args:
+        engine: Движок SQLAlchemy с базой данных.
+        describe_table: Функция, строящая метаданные одной таблицы.
+        cache_path: Путь к файлу кэша. По умолчанию ``<db>.catalog.json``;
+            ``False`` отключает сохранение на диск.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        describe_table: Callable[[str], Dict],
+        cache_path: Optional[str] = None,
+    ):
+        self.engine = engine
+        self.describe_table = describe_table
+        db_path = sqlite_path(engine)
+        if cache_path is None and db_path is not None:
+            cache_path = f"{db_path}.catalog.json"
+        self.cache_path = cache_path or None
+        self._probe = DataVersionProbe(db_path)
+        self._lock = threading.Lock()
+        self._tables: Optional[List[Dict]] = None
+        self._fingerprint: Optional[str] = None
+        self._checked_version: Optional[int] = None
+
+    def get(self) -> List[Dict]:
+        """Возвращает метаданные всех таблиц, перестраивая их только при изменениях.
+
+        Результат общий для всех вызовов и не должен изменяться вызывающим кодом.
+        """
+        with self._lock:
+            version = self._probe.data_version()
+            if (
+                self._tables is not None
+                and version is not None
+                and version == self._checked_version
+            ):
+                return self._tables
+
+            fingerprint = self._compute_fingerprint()
+            if self._tables is None:
+                self._load_persisted(fingerprint)
+            if self._tables is None or fingerprint != self._fingerprint:
+                self._tables = self._build()
+                self._fingerprint = fingerprint
+                self._persist()
+            self._checked_version = version
+            return self._tables
+
+    def invalidate(self):
+        """Сбрасывает каталог в памяти и на диске"""
+        with self._lock:
+            self._tables = None
+            self._fingerprint = None
+            self._checked_version = None
+            if self.cache_path and os.path.exists(self.cache_path):
+                try:
+                    os.remove(self.cache_path)
+                except OSError:
+                    pass
+
+    def _compute_fingerprint(self) -> str:
+        """Хэш схемы, счётчиков AUTOINCREMENT и версии формата каталога"""
+        digest = hashlib.sha1(f"format {CATALOG_FORMAT}".encode())
+        with self.engine.connect() as conn:
+            schema_rows = conn.execute(
+                text("SELECT type, name, sql FROM sqlite_schema ORDER BY type, name")
+            ).fetchall()
+            for row in schema_rows:
+                digest.update(repr(tuple(row)).encode())
+            if any(row[1] == "sqlite_sequence" for row in schema_rows):
+                for row in conn.execute(
+                    text("SELECT name, seq FROM sqlite_sequence ORDER BY name")
+                ):
+                    digest.update(repr(tuple(row)).encode())
+        return digest.hexdigest()
+
+    def _build(self) -> List[Dict]:
+        # Новый инспектор: закэшированный мог устареть после изменения схемы
+        table_names = inspect(self.engine).get_table_names()
+        return [self.describe_table(table) for table in table_names]
+
+    def _load_persisted(self, fingerprint: str):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return
+        if payload.get("fingerprint") == fingerprint:
+            self._tables = payload["tables"]
+            self._fingerprint = fingerprint
+
+    def _persist(self):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"fingerprint": self._fingerprint, "tables": self._tables},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Каталог продолжает работать из памяти, если директория недоступна для записи
+            pass
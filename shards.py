@@ -0,0 +1,395 @@
+"""Раздельное хранение транзакций: своя база SQLite у каждого пользователя.
+
+Файл пользователя лежит в ``<root>/<корзина>/<user_id>.db``; корзина —
+стабильный хэш идентификатора, поэтому в одном каталоге не оказывается
+сотен тысяч файлов, а корзины можно разнести по дискам. Запросы
+пользователя читают только его маленький файл, и задержка не зависит от
+числа пользователей.
+
+``ShardRouter.tenant(user_id)`` отдаёт сессии набор инструментов, кэш
+ответов и быстрый путь для базы пользователя. Открытые базы (движок с
+пулом соединений, каталог схемы, кадр analytics) держатся в LRU: самые
+давно не использовавшиеся закрываются, когда их больше ``max_open``.
+
+Для сводок администратора ``ShardRouter.fan_out`` выполняет один SELECT
+во всех базах в пуле процессов и объединяет строки (с частичными
+агрегатами — через ``merge``)::
+
+    python shards.py --root shards import alice statement.csv
+    python shards.py --root shards fan-out \\
+        "SELECT currency, SUM(amount) AS total FROM transactions GROUP BY currency" --merge total=sum
+"""
+import argparse
+import glob
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rollups import ROLLUP_DESCRIPTIONS
+from sql_validator import read_only_authorizer, validate_query
+
+DEFAULT_BUCKETS = 256
+DEFAULT_MAX_OPEN = 64
+# Файлы пользователей маленькие: пул и кэш страниц меньше, чем у общей базы (db.py)
+TENANT_POOL_SIZE = 2
+TENANT_CACHE_SIZE = -8_000
+# Общая база курсов для fx_convert во всех базах пользователей
+FX_DB_NAME = "_fx_rates.db"
+FAN_OUT_TABLES = frozenset({"transactions", "currencies"} | set(ROLLUP_DESCRIPTIONS))
+MERGE_FUNCTIONS: Dict[str, Callable[[Any, Any], Any]] = {"sum": lambda a, b: a + b, "min": min, "max": max}
+
+_USER_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.@-]{0,127}$")
+
+
+def bucket_of(user_id: str, buckets: int = DEFAULT_BUCKETS) -> int:
+    """Номер корзины пользователя: стабилен между процессами (в отличие от hash())"""
+    digest = hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % buckets
+
+
+def provision(db_path: str):
+    """Создаёт пустую базу пользователя с таблицей transactions"""
+    from data_loader import TRANSACTIONS_DDL
+
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(TRANSACTIONS_DDL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class Tenant:
+    """Всё, что привязано к базе одного пользователя: инструменты, кэш ответов и быстрый путь.
+
+    Attributes:
+        user_id: Идентификатор пользователя.
+        db_path: Путь к его базе.
+        tools: Инструменты (Financial_Agent.create_tools) поверх этой базы.
+    """
+
+    def __init__(self, user_id: str, db_path: str, tools: Dict[str, object], fast_path_stats=None):
+        from answer_cache import AnswerCache
+        from fast_path import FastPathRouter
+
+        self.user_id = user_id
+        self.db_path = db_path
+        self.tools = tools
+        self.answer_cache = AnswerCache(db_path)
+        self.fast_path_router = FastPathRouter(
+            tools["engine"], tools["calculator"], tools["currency_converter"], tools["batch_currency_converter"],
+            fx_store=tools.get("fx_store"), stats=fast_path_stats,
+        )
+
+    def close(self):
+        """Закрывает соединения пула; инструменты остаются рабочими и переоткроют их при обращении"""
+        from db import dispose_engines
+
+        dispose_engines(self.db_path)
+
+
+class ShardRouter:
+    """Маршрутизатор пользователей по их базам с LRU открытых баз.
+
+    Args:
+        root: Каталог с базами пользователей.
+        tool_factory: Функция ``(db_path, fx_store=...) -> инструменты``
+            (Financial_Agent.create_tools с общим конвертером валют).
+        buckets: Число корзин-подкаталогов; 1 — все базы прямо в root.
+        max_open: Сколько баз держать открытыми одновременно.
+        fx_db_path: База с общей таблицей fx_rates. По умолчанию ``<root>/_fx_rates.db``,
+            если файл есть; без неё fx_convert каждой базы читает её собственную fx_rates.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        tool_factory: Optional[Callable[..., Dict[str, object]]] = None,
+        buckets: int = DEFAULT_BUCKETS,
+        max_open: int = DEFAULT_MAX_OPEN,
+        fx_db_path: Optional[str] = None,
+    ):
+        from fast_path import RouterStats
+
+        self.root = os.path.abspath(root)
+        self.tool_factory = tool_factory
+        self.buckets = max(1, buckets)
+        self.max_open = max_open
+        if fx_db_path is None and os.path.exists(os.path.join(self.root, FX_DB_NAME)):
+            fx_db_path = os.path.join(self.root, FX_DB_NAME)
+        self.fx_db_path = fx_db_path
+        self._fx_store = None
+        # Статистика быстрого пути по всем базам: переживает закрытие баз по LRU
+        self.fast_path_stats = RouterStats()
+        self._lock = threading.Lock()
+        # Блокировки открытия базы по пользователю: одну базу открывает один поток,
+        # а обращения к уже открытым базам не ждут
+        self._opening: Dict[str, threading.Lock] = {}
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self.opened = 0
+        self.evicted = 0
+
+    def path_for(self, user_id: str) -> str:
+        """Путь к базе пользователя (файла может ещё не быть)"""
+        if not isinstance(user_id, str) or not _USER_ID_RE.match(user_id):
+            raise ValueError(f"Недопустимый идентификатор пользователя: {user_id!r}")
+        if self.buckets == 1:
+            return os.path.join(self.root, f"{user_id}.db")
+        width = len(f"{self.buckets - 1:x}")
+        return os.path.join(self.root, f"{bucket_of(user_id, self.buckets):0{width}x}", f"{user_id}.db")
+
+    def user_ids(self) -> List[str]:
+        """Пользователи, у которых есть база"""
+        pattern = "*.db" if self.buckets == 1 else os.path.join("*", "*.db")
+        names = (os.path.basename(path)[:-len(".db")] for path in glob.glob(os.path.join(self.root, pattern)))
+        return sorted(name for name in names if _USER_ID_RE.match(name))
+
+    def tenant(self, user_id: str, create: bool = False) -> Tenant:
+        """Открытая база пользователя; при необходимости закрывает давно не использовавшиеся.
+
+        Args:
+            user_id: Идентификатор пользователя.
+            create: Создать пустую базу, если её ещё нет.
+        """
+        tenant = self._lookup(user_id)
+        if tenant is not None:
+            return tenant
+        db_path = self.path_for(user_id)
+        with self._lock:
+            opening = self._opening.setdefault(user_id, threading.Lock())
+        try:
+            with opening:
+                # Пока ждали, базу мог открыть другой поток
+                tenant = self._lookup(user_id)
+                if tenant is not None:
+                    return tenant
+                if not os.path.exists(db_path):
+                    if not create:
+                        raise LookupError(f"Нет базы транзакций пользователя {user_id!r}")
+                    provision(db_path)
+                tenant = Tenant(user_id, db_path, self._open_tools(db_path), self.fast_path_stats)
+                evicted = []
+                with self._lock:
+                    self._tenants[user_id] = tenant
+                    self.opened += 1
+                    while len(self._tenants) > self.max_open:
+                        evicted.append(self._tenants.popitem(last=False)[1])
+                    self.evicted += len(evicted)
+        finally:
+            with self._lock:
+                self._opening.pop(user_id, None)
+        for item in evicted:
+            item.close()
+        return tenant
+
+    def _lookup(self, user_id: str) -> Optional[Tenant]:
+        with self._lock:
+            tenant = self._tenants.get(user_id)
+            if tenant is not None:
+                self._tenants.move_to_end(user_id)
+            return tenant
+
+    def close(self):
+        """Закрывает все открытые базы"""
+        with self._lock:
+            for tenant in self._tenants.values():
+                tenant.close()
+            self._tenants.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": len(self._tenants), "opened": self.opened, "evicted": self.evicted}
+
+    def fan_out(
+        self,
+        query: str,
+        merge: Optional[Dict[str, str]] = None,
+        processes: Optional[int] = None,
+        user_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Выполняет SELECT во всех базах пользователей и объединяет результат.
+
+        Базы читаются в пуле процессов пачками (SQLite и разбор строк не
+        упираются в GIL). Без merge к строкам добавляется столбец user_id;
+        с merge строки сворачиваются по остальным столбцам, а указанные
+        столбцы объединяются функцией sum, min или max — так частичные
+        SUM/COUNT/MIN/MAX из каждой базы дают общий итог (AVG так не
+        объединяется: считайте SUM и COUNT).
+
+        Args:
+            query: SELECT к таблицам transactions, currencies и свёрткам.
+            merge: Столбец → функция объединения.
+            processes: Число процессов; 0 — в текущем процессе. По умолчанию os.cpu_count().
+            user_ids: Ограничить набор пользователей.
+
+        Returns:
+            dict: columns, rows, shards, errors (user_id → ошибка) и seconds.
+        """
+        validate_query(query, FAN_OUT_TABLES)
+        merge = merge or {}
+        unknown = {how for how in merge.values() if how not in MERGE_FUNCTIONS}
+        if unknown:
+            raise ValueError(f"Неизвестные функции объединения: {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        shards = [(user_id, self.path_for(user_id)) for user_id in (user_ids or self.user_ids())]
+        processes = (os.cpu_count() or 1) if processes is None else processes
+        if processes <= 1 or len(shards) <= 1:
+            results = _query_shards(shards, query, self.fx_db_path)
+        else:
+            # Несколько пачек на процесс выравнивают нагрузку при разном размере баз
+            size = max(1, math.ceil(len(shards) / (processes * 4)))
+            batches = [shards[i:i + size] for i in range(0, len(shards), size)]
+            results = []
+            with ProcessPoolExecutor(min(processes, len(batches))) as executor:
+                for batch in executor.map(_query_shards, batches, [query] * len(batches),
+                                          [self.fx_db_path] * len(batches)):
+                    results.extend(batch)
+
+        columns: Optional[List[str]] = None
+        rows: List[tuple] = []
+        errors: Dict[str, str] = {}
+        for user_id, shard_columns, shard_rows, error in results:
+            if error is not None:
+                errors[user_id] = error
+                continue
+            columns = columns or shard_columns
+            rows.extend((user_id, *row) for row in shard_rows)
+        columns = columns or []
+        if merge:
+            missing = [column for column in merge if column not in columns]
+            if columns and missing:
+                raise ValueError(f"Нет столбцов для объединения: {', '.join(missing)}")
+            columns, rows = _merge_rows(columns, [row[1:] for row in rows], merge)
+        else:
+            columns = ["user_id"] + columns
+        return {
+            "columns": columns,
+            "rows": [list(row) for row in rows],
+            "shards": len(shards),
+            "errors": errors,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def _open_tools(self, db_path: str) -> Dict[str, object]:
+        from db import get_engine
+        from fx_history import FxRateStore
+
+        if self.tool_factory is None:
+            raise RuntimeError("ShardRouter без tool_factory умеет только fan_out")
+        # Движок создаётся заранее с параметрами для маленькой базы; create_tools получит его же
+        get_engine(db_path, pool_size=TENANT_POOL_SIZE, max_overflow=TENANT_POOL_SIZE, cache_size=TENANT_CACHE_SIZE)
+        with self._lock:
+            if self.fx_db_path is not None and self._fx_store is None:
+                self._fx_store = FxRateStore(self.fx_db_path)
+        return self.tool_factory(db_path, fx_store=self._fx_store)
+
+
+# Хранилища курсов процессов пула: читаются один раз на процесс
+_worker_fx_stores: Dict[str, Any] = {}
+
+
+def _query_shards(shards: List[Tuple[str, str]], query: str, fx_db_path: Optional[str]) -> List[Tuple]:
+    """Выполняет запрос в пачке баз: [(user_id, столбцы, строки, ошибка)]"""
+    store = None
+    if fx_db_path is not None:
+        from fx_history import FxRateStore
+
+        store = _worker_fx_stores.get(fx_db_path)
+        if store is None:
+            store = _worker_fx_stores[fx_db_path] = FxRateStore(fx_db_path)
+    authorizer = read_only_authorizer(FAN_OUT_TABLES)
+    results = []
+    for user_id, db_path in shards:
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            results.append((user_id, None, [], str(e)))
+            continue
+        try:
+            if store is not None:
+                conn.create_function("fx_rate", 3, store.rate)
+                conn.create_function("fx_convert", 4, store.convert)
+            conn.set_authorizer(authorizer)
+            cursor = conn.execute(query)
+            columns = [description[0] for description in cursor.description or ()]
+            results.append((user_id, columns, cursor.fetchall(), None))
+        except sqlite3.Error as e:
+            results.append((user_id, None, [], str(e)))
+        finally:
+            conn.close()
+    return results
+
+
+def _merge_rows(columns: List[str], rows: List[tuple], merge: Dict[str, str]) -> Tuple[List[str], List[tuple]]:
+    """Сворачивает строки по столбцам вне merge, объединяя столбцы merge"""
+    keys = [i for i, column in enumerate(columns) if column not in merge]
+    values = [(i, MERGE_FUNCTIONS[merge[column]]) for i, column in enumerate(columns) if column in merge]
+    groups: Dict[tuple, List[Any]] = {}
+    for row in rows:
+        key = tuple(row[i] for i in keys)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [row[i] for i, _ in values]
+            continue
+        for position, (i, combine) in enumerate(values):
+            if row[i] is not None:
+                group[position] = row[i] if group[position] is None else combine(group[position], row[i])
+    merged_columns = [columns[i] for i in keys] + [columns[i] for i, _ in values]
+    return merged_columns, [key + tuple(group) for key, group in groups.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Базы транзакций пользователей")
+    parser.add_argument("--root", default=os.environ.get("SHARD_ROOT", "shards"), help="Каталог баз пользователей")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Пользователи и размеры их баз")
+    path = commands.add_parser("path", help="Путь к базе пользователя")
+    path.add_argument("user_id")
+    imports = commands.add_parser("import", help="Загрузить выписки в базу пользователя (см. data_loader)")
+    imports.add_argument("user_id")
+    imports.add_argument("paths", nargs="+")
+    fan_out = commands.add_parser("fan-out", help="SELECT по всем базам")
+    fan_out.add_argument("query")
+    fan_out.add_argument("--merge", nargs="*", default=[], help="Объединение столбцов: total=sum n=sum top=max")
+    fan_out.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    router = ShardRouter(args.root, buckets=args.buckets)
+    if args.command == "list":
+        for user_id in router.user_ids():
+            print(f"{user_id:<40}{os.path.getsize(router.path_for(user_id)) / 1e6:>10.1f} МБ")
+    elif args.command == "path":
+        print(router.path_for(args.user_id))
+    elif args.command == "import":
+        from data_loader import import_exports, print_rejected
+
+        db_path = router.path_for(args.user_id)
+        if not os.path.exists(db_path):
+            provision(db_path)
+        loaded, rejected = import_exports(db_path, args.paths)
+        print_rejected(rejected)
+        print(f"Загружено {loaded} строк в {db_path}")
+    else:
+        merge = dict(item.split("=", 1) for item in args.merge)
+        result = router.fan_out(args.query, merge, args.processes)
+        print("\t".join(result["columns"]))
+        for row in result["rows"]:
+            print("\t".join(str(value) for value in row))
+        print(f"-- баз: {result['shards']}, ошибок: {len(result['errors'])}, {result['seconds']:.2f} с")
+        for user_id, error in result["errors"].items():
+            print(f"-- {user_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Проверка SQL-запросов агента на основе токенизатора.
+
+Запрос разбирается на токены (строки, идентификаторы, ключевые слова,
+комментарии), поэтому слово ``UPDATE`` внутри строки или столбец
+``created_at`` больше не считаются запрещёнными операциями. Проверяются все
+таблицы из FROM/JOIN, включая подзапросы, а имена CTE разрешены.
+
+Токенизатор — первая линия защиты и даёт агенту понятные ошибки; вторая —
+authorizer-колбэк SQLite, который на уровне движка запрещает всё, кроме
+чтения разрешённых таблиц.
+"""
+import re
+import sqlite3
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple
+
+FORBIDDEN_KEYWORDS = frozenset({
+    "INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "TRUNCATE", "GRANT",
+    "ATTACH", "DETACH", "PRAGMA", "VACUUM", "REINDEX", "ANALYZE",
+})
+
+# После этих слов начинается следующая секция запроса, а не ссылка на таблицу
+_CLAUSE_KEYWORDS = frozenset({
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION", "EXCEPT", "INTERSECT",
+    "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "OUTER",
+    "OFFSET", "RETURNING",
+})
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    |(?P<word>[^\W\d][\w$]*)
+    |(?P<param>[?:@$][A-Za-z0-9_]*)
+    |(?P<op>\|\||<=|>=|<>|!=|==|<<|>>|[-+*/%<>=~&|(),;.])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+Token = Tuple[str, str]
+
+
+def tokenize(query: str) -> List[Token]:
+    """Разбивает запрос на токены (тип, значение), пропуская пробелы и комментарии"""
+    tokens: List[Token] = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN_RE.match(query, position)
+        if match is None:
+            raise ValueError(f"Недопустимый символ в запросе: {query[position]!r}")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        if kind in ("space", "comment"):
+            continue
+        if kind == "word":
+            value = value.upper()
+        elif kind == "quoted":
+            kind, value = "identifier", value[1:-1]
+        tokens.append((kind, value))
+    return tokens
+
+
+def normalize_sql(query: str) -> str:
+    """Каноническая форма запроса: ключевые слова в верхнем регистре, без лишних пробелов и комментариев.
+
+    Регистр строковых литералов сохраняется.
+    """
+    parts = []
+    for kind, value in tokenize(query):
+        if kind == "identifier":
+            value = f'"{value}"'
+        parts.append(value)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def _name(token: Token) -> Optional[str]:
+    kind, value = token
+    if kind in ("word", "identifier"):
+        return value.lower()
+    return None
+
+
+def _cte_names(tokens: List[Token]) -> Set[str]:
+    """Имена CTE: ``name [(столбцы)] AS [NOT] [MATERIALIZED] (``"""
+    names = set()
+    for i, (kind, value) in enumerate(tokens):
+        if kind != "word" or value != "AS":
+            continue
+        j = i + 1
+        while j < len(tokens) and tokens[j] in (("word", "NOT"), ("word", "MATERIALIZED")):
+            j += 1
+        if j >= len(tokens) or tokens[j] != ("op", "("):
+            continue
+        k = i - 1
+        if k >= 0 and tokens[k] == ("op", ")"):
+            depth = 0
+            while k >= 0:
+                if tokens[k] == ("op", ")"):
+                    depth += 1
+                elif tokens[k] == ("op", "("):
+                    depth -= 1
+                    if depth == 0:
+                        break
+                k -= 1
+            k -= 1
+        if k >= 0 and _name(tokens[k]):
+            names.add(_name(tokens[k]))
+    return names
+
+
+def referenced_tables(tokens: List[Token]) -> Set[str]:
+    """Все таблицы из FROM и JOIN, включая подзапросы и списки через запятую"""
+    tables = set()
+    i = 0
+    while i < len(tokens):
+        if tokens[i] in (("word", "FROM"), ("word", "JOIN")):
+            i += 1
+            while i < len(tokens):
+                if tokens[i] == ("op", "("):
+                    # Подзапрос: его таблицы найдёт внешний цикл
+                    break
+                name = _name(tokens[i])
+                if name is None:
+                    break
+                # schema.table
+                if i + 2 < len(tokens) and tokens[i + 1] == ("op", "."):
+                    schema, name = name, _name(tokens[i + 2])
+                    i += 2
+                    if name is None:
+                        break
+                    if schema not in ("main", "temp"):
+                        tables.add(f"{schema}.{name}")
+                        name = None
+                if name is not None:
+                    tables.add(name)
+                i += 1
+                # Табличная функция: json_each(...)
+                if i < len(tokens) and tokens[i] == ("op", "("):
+                    break
+                # Необязательный псевдоним
+                if i < len(tokens) and tokens[i] == ("word", "AS"):
+                    i += 1
+                if i < len(tokens) and _name(tokens[i]) and tokens[i][1] not in _CLAUSE_KEYWORDS:
+                    i += 1
+                if i < len(tokens) and tokens[i] == ("op", ","):
+                    i += 1
+                    continue
+                break
+        else:
+            i += 1
+    return tables
+
+
+@lru_cache(maxsize=2048)
+def _check(normalized: str, allowed_tables: FrozenSet[str]) -> Optional[str]:
+    """Возвращает текст ошибки или None; результат кэшируется по нормализованному запросу"""
+    tokens = tokenize(normalized)
+    statements = [[]]
+    for token in tokens:
+        if token == ("op", ";"):
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    statements = [statement for statement in statements if statement]
+    if len(statements) != 1:
+        return "Разрешён только один запрос"
+    tokens = statements[0]
+
+    if tokens[0] not in (("word", "SELECT"), ("word", "WITH")):
+        return "Разрешены только SELECT-запросы"
+
+    for kind, value in tokens:
+        if kind == "word" and value in FORBIDDEN_KEYWORDS:
+            return f"Запрещенная операция: {value}"
+
+    allowed = set(allowed_tables) | _cte_names(tokens)
+    for table in sorted(referenced_tables(tokens)):
+        if table not in allowed:
+            return f"Доступ к таблице {table} запрещен"
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _check_raw(query: str, allowed_tables: FrozenSet[str]) -> Optional[str]:
+    """Кэш по исходному тексту: точный повтор запроса не требует даже токенизации"""
+    return _check(normalize_sql(query), allowed_tables)
+
+
+def validate_query(query: str, allowed_tables: Iterable[str]):
+    """Проверяет запрос; выбрасывает ValueError с понятным агенту сообщением"""
+    if not isinstance(allowed_tables, frozenset):
+        allowed_tables = frozenset(t.lower() for t in allowed_tables)
+    error = _check_raw(query, allowed_tables)
+    if error:
+        raise ValueError(error)
+
+
+def cache_clear():
+    _check_raw.cache_clear()
+    _check.cache_clear()
+
+
+def read_only_authorizer(allowed_tables: Iterable[str]):
+    """Authorizer SQLite: разрешает только SELECT, чтение разрешённых таблиц и функции"""
+    allowed = frozenset(t.lower() for t in allowed_tables)
+
+    def authorizer(action, arg1, arg2, db_name, trigger_name):
+        if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_READ:
+            if arg1 and arg1.lower() in allowed:
+                return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    return authorizer
@@ -0,0 +1,554 @@
+"""Трассировка запросов к агенту: задержки LLM, токены и время инструментов.
+
+Для каждого запроса записывается:
+
+* маршрут (кэш, быстрый путь, агент) и общее время;
+* по шагам агента — время вызова LLM (и время до первого токена при
+  потоковой выдаче), токены запроса и ответа;
+* по вызовам инструментов — время выполнения и подробности, которые
+  инструменты сообщают через ``annotate``/``increment``: время SQL, число
+  строк, попадания в кэш, время и число HTTP-запросов.
+
+Трассы пишутся в SQLite или JSONL, а агрегаты отдаются в текстовом
+формате Prometheus (``Tracer.metrics_text`` и ``serve_metrics``).
+
+    python tracing.py report --sink traces.db
+"""
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_current_run: ContextVar[Optional["RunTrace"]] = ContextVar("trace_run", default=None)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("trace_span", default=None)
+
+RUN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOOL_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    "agent_runs_total": ("counter", "Запросы по маршруту и результату"),
+    "agent_run_seconds": ("histogram", "Время ответа на запрос"),
+    "agent_llm_seconds": ("histogram", "Время одного вызова LLM"),
+    "agent_llm_first_token_seconds": ("histogram", "Время до первого токена при потоковой выдаче"),
+    "agent_llm_tokens_total": ("counter", "Токены LLM (kind=prompt|completion)"),
+    "agent_system_prompt_tokens_total": ("counter", "Оценка токенов системного промпта по запросам к агенту"),
+    "agent_tool_seconds": ("histogram", "Время вызова инструмента"),
+    "agent_tool_errors_total": ("counter", "Вызовы инструментов, завершившиеся ошибкой"),
+    "agent_tool_cache_hits_total": ("counter", "Вызовы инструментов, обслуженные из кэша"),
+    "agent_observation_tokens_total": ("counter", "Токены наблюдений, переданных модели (kind=sent|raw)"),
+    "agent_observation_summaries_total": ("counter", "Наблюдения, сокращённые до превью из-за размера"),
+    "agent_sql_seconds_total": ("counter", "Суммарное время выполнения SQL"),
+    "agent_sql_rows_total": ("counter", "Строки, прочитанные SQL-запросами"),
+    "agent_http_requests_total": ("counter", "HTTP-запросы к внешним API"),
+    "agent_http_seconds_total": ("counter", "Суммарное время HTTP-запросов"),
+}
+
+
+def annotate(**fields):
+    """Добавляет поля к текущему вызову инструмента (вне трассы ничего не делает)"""
+    span = _current_span.get()
+    if span is not None:
+        span.update(fields)
+
+
+def increment(**fields):
+    """Прибавляет числовые поля к текущему вызову инструмента"""
+    span = _current_span.get()
+    if span is not None:
+        for key, value in fields.items():
+            span[key] = span.get(key, 0) + value
+
+
+def current_run() -> Optional["RunTrace"]:
+    return _current_run.get()
+
+
+class RunTrace:
+    """Трасса одного запроса"""
+
+    def __init__(self, query: str):
+        self.run_id = uuid.uuid4().hex
+        self.query = query
+        self.started = time.time()
+        self.route: Optional[str] = None
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.steps: List[Dict[str, Any]] = []
+        self.spans: List[Dict[str, Any]] = []
+        # Размеры наблюдений, переданных модели (observations.ObservationFormatter)
+        self.observations: List[Dict[str, Any]] = []
+        # Произвольные сведения о запросе (например, размер системного промпта)
+        self.attributes: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # Вызовы LLM текущего шага: шаг завершается после них и после инструментов
+        self._llm_calls: List[Tuple[float, Optional[float]]] = []
+
+    @property
+    def step_number(self) -> int:
+        return len(self.steps) + 1
+
+    def add_llm_call(self, seconds: float, first_token: Optional[float] = None):
+        with self._lock:
+            self._llm_calls.append((seconds, first_token))
+
+    def add_step(self, step: int, seconds: Optional[float], input_tokens: int, output_tokens: int,
+                 error: Optional[str] = None):
+        with self._lock:
+            calls, self._llm_calls = self._llm_calls, []
+            first_tokens = [first for _, first in calls if first is not None]
+            self.steps.append({
+                "step": step,
+                "seconds": seconds,
+                "llm_seconds": sum(seconds for seconds, _ in calls) if calls else None,
+                "llm_first_token_seconds": first_tokens[0] if first_tokens else None,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "error": error,
+            })
+
+    def add_span(self, span: Dict[str, Any]):
+        with self._lock:
+            self.spans.append(span)
+
+    def add_observation(self, tool: str, tokens: int, raw_tokens: int, summarized: bool = False):
+        """Наблюдение инструмента: токены в контексте модели и сколько занял бы str() результата"""
+        with self._lock:
+            self.observations.append({
+                "tool": tool,
+                "step": self.step_number,
+                "tokens": tokens,
+                "raw_tokens": raw_tokens,
+                "summarized": summarized,
+            })
+
+    def summary(self) -> Dict[str, Any]:
+        """Итоги запроса: где ушло время и сколько токенов потрачено"""
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "route": self.route,
+                "seconds": self.seconds,
+                "steps": len(self.steps),
+                "llm_seconds": sum(step["llm_seconds"] or 0.0 for step in self.steps),
+                "input_tokens": sum(step["input_tokens"] for step in self.steps),
+                "output_tokens": sum(step["output_tokens"] for step in self.steps),
+                "tool_calls": len(self.spans),
+                "tool_seconds": sum(span["seconds"] for span in self.spans),
+                "observation_tokens": sum(item["tokens"] for item in self.observations),
+                **self.attributes,
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started": self.started,
+                "query": self.query,
+                "route": self.route,
+                "seconds": self.seconds,
+                "error": self.error,
+                "attributes": dict(self.attributes),
+                "steps": list(self.steps),
+                "spans": list(self.spans),
+                "observations": list(self.observations),
+            }
+
+
+class TracedModel:
+    """Обёртка модели smolagents, записывающая время каждого вызова в текущую трассу"""
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._model, name)
+        if name == "generate_stream":
+            return self._wrap_stream(attribute)
+        return attribute
+
+    def __call__(self, *args, **kwargs):
+        return self.generate(*args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._model.generate(*args, **kwargs)
+        finally:
+            run = _current_run.get()
+            if run is not None:
+                run.add_llm_call(time.perf_counter() - start)
+
+    @staticmethod
+    def _wrap_stream(generate_stream):
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            first_token = None
+            try:
+                for delta in generate_stream(*args, **kwargs):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    yield delta
+            finally:
+                run = _current_run.get()
+                if run is not None:
+                    run.add_llm_call(time.perf_counter() - start, first_token)
+        return traced
+
+
+def _is_error(result: Any) -> Optional[str]:
+    """Текст ошибки из результата инструмента ({"error": ...} или [{"error": ...}])"""
+    if isinstance(result, list) and len(result) == 1:
+        result = result[0]
+    if isinstance(result, dict) and "error" in result:
+        details = result.get("details")
+        return f"{result['error']}: {details}" if details else str(result["error"])
+    return None
+
+
+class Metrics:
+    """Счётчики и гистограммы в памяти процесса с выдачей в формате Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        # (имя, метки) → [счётчики по корзинам, сумма, количество]
+        self._histograms: Dict[Tuple[str, Tuple], list] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...], **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._buckets[name] = buckets
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            by_name: Dict[str, List[str]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), (counts, total, count) in sorted(self._histograms.items()):
+                lines = by_name.setdefault(name, [])
+                for bound, bucket_count in zip(self._buckets[name], counts):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        output = []
+        for name, lines in by_name.items():
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+def _labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class JsonlTraceSink:
+    """Трассы построчно в JSONL"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, trace: Dict[str, Any]):
+        line = json.dumps(trace, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class SQLiteTraceSink:
+    """Трассы в SQLite: таблицы runs, steps и spans"""
+
+    DDL = (
+        "CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, started REAL, query TEXT, route TEXT, "
+        "seconds REAL, error TEXT, attributes TEXT)",
+        "CREATE TABLE IF NOT EXISTS steps (run_id TEXT, step INTEGER, seconds REAL, llm_seconds REAL, "
+        "llm_first_token_seconds REAL, input_tokens INTEGER, output_tokens INTEGER, error TEXT, "
+        "PRIMARY KEY (run_id, step))",
+        "CREATE TABLE IF NOT EXISTS spans (run_id TEXT, step INTEGER, tool TEXT, seconds REAL, error TEXT, "
+        "details TEXT)",
+        "CREATE INDEX IF NOT EXISTS spans_tool ON spans (tool)",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                for statement in self.DDL:
+                    conn.execute(statement)
+        finally:
+            conn.close()
+
+    def write(self, trace: Dict[str, Any]):
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=10)
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (trace["run_id"], trace["started"], trace["query"], trace["route"],
+                         trace["seconds"], trace["error"],
+                         json.dumps(trace["attributes"], ensure_ascii=False, default=str)),
+                    )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(trace["run_id"], step["step"], step["seconds"], step["llm_seconds"],
+                          step["llm_first_token_seconds"], step["input_tokens"], step["output_tokens"],
+                          step["error"]) for step in trace["steps"]],
+                    )
+                    conn.executemany(
+                        "INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?)",
+                        [(trace["run_id"], span.get("step"), span["tool"], span["seconds"], span.get("error"),
+                          json.dumps(_span_details(span), ensure_ascii=False, default=str))
+                         for span in trace["spans"]],
+                    )
+            finally:
+                conn.close()
+
+
+def _span_details(span: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in span.items() if key not in ("tool", "step", "seconds", "error")}
+
+
+def open_sink(path: str):
+    """Приёмник трасс по расширению файла: .jsonl — JSONL, иначе SQLite"""
+    return JsonlTraceSink(path) if path.endswith(".jsonl") else SQLiteTraceSink(path)
+
+
+class Tracer:
+    """Трассировщик запросов.
+
+    Args:
+        sink: Приёмник трасс с методом write(dict) (см. open_sink); None — только метрики.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.metrics = Metrics()
+
+    @contextmanager
+    def run(self, query: str) -> Iterator[RunTrace]:
+        """Трасса запроса; всё, что выполняется внутри (в том числе в потоках агента), попадает в неё"""
+        trace = RunTrace(query)
+        token = _current_run.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            trace.seconds = time.perf_counter() - start
+            _current_run.reset(token)
+            self._record(trace)
+
+    def instrument_agent(self, agent):
+        """Записывает время LLM и токены каждого шага агента"""
+        from smolagents.memory import ActionStep
+
+        if not isinstance(agent.model, TracedModel):
+            agent.model = TracedModel(agent.model)
+        agent.step_callbacks.register(ActionStep, self._on_step)
+        return agent
+
+    def instrument_tools(self, tools: Iterable):
+        """Оборачивает forward инструментов замером времени (повторный вызов безопасен)"""
+        for tool in tools:
+            if getattr(tool, "_traced", False):
+                continue
+            tool.forward = self._wrap_tool(tool.name, tool.forward)
+            tool._traced = True
+
+    def metrics_text(self) -> str:
+        return self.metrics.render()
+
+    @staticmethod
+    def _on_step(step):
+        run = _current_run.get()
+        if run is None:
+            return
+        usage = step.token_usage
+        run.add_step(
+            step.step_number,
+            step.timing.duration,
+            usage.input_tokens if usage else 0,
+            usage.output_tokens if usage else 0,
+            str(step.error) if step.error else None,
+        )
+
+    @staticmethod
+    def _wrap_tool(name: str, forward):
+        def traced(*args, **kwargs):
+            run = _current_run.get()
+            span: Dict[str, Any] = {"tool": name, "step": run.step_number if run else None}
+            token = _current_span.set(span)
+            start = time.perf_counter()
+            try:
+                result = forward(*args, **kwargs)
+                error = _is_error(result)
+                if error:
+                    span["error"] = error
+                return result
+            except Exception as e:
+                span["error"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                span["seconds"] = time.perf_counter() - start
+                _current_span.reset(token)
+                if run is not None:
+                    run.add_span(span)
+        return traced
+
+    def _record(self, trace: RunTrace):
+        metrics = self.metrics
+        route = trace.route or "unknown"
+        metrics.inc("agent_runs_total", route=route, status="error" if trace.error else "ok")
+        metrics.observe("agent_run_seconds", trace.seconds, RUN_BUCKETS, route=route)
+        if "system_prompt_tokens" in trace.attributes:
+            metrics.inc("agent_system_prompt_tokens_total", trace.attributes["system_prompt_tokens"])
+        for step in trace.steps:
+            if step["llm_seconds"] is not None:
+                metrics.observe("agent_llm_seconds", step["llm_seconds"], RUN_BUCKETS)
+            if step["llm_first_token_seconds"] is not None:
+                metrics.observe("agent_llm_first_token_seconds", step["llm_first_token_seconds"], RUN_BUCKETS)
+            metrics.inc("agent_llm_tokens_total", step["input_tokens"], kind="prompt")
+            metrics.inc("agent_llm_tokens_total", step["output_tokens"], kind="completion")
+        for span in trace.spans:
+            tool = span["tool"]
+            metrics.observe("agent_tool_seconds", span["seconds"], TOOL_BUCKETS, tool=tool)
+            if span.get("error"):
+                metrics.inc("agent_tool_errors_total", tool=tool)
+            if span.get("cache_hit"):
+                metrics.inc("agent_tool_cache_hits_total", tool=tool)
+            if "sql_seconds" in span:
+                metrics.inc("agent_sql_seconds_total", span["sql_seconds"], tool=tool)
+            if "rows" in span:
+                metrics.inc("agent_sql_rows_total", span["rows"], tool=tool)
+            if "http_requests" in span:
+                metrics.inc("agent_http_requests_total", span["http_requests"], tool=tool)
+                metrics.inc("agent_http_seconds_total", span.get("http_seconds", 0.0), tool=tool)
+        for observation in trace.observations:
+            tool = observation["tool"]
+            metrics.inc("agent_observation_tokens_total", observation["tokens"], tool=tool, kind="sent")
+            metrics.inc("agent_observation_tokens_total", observation["raw_tokens"], tool=tool, kind="raw")
+            if observation["summarized"]:
+                metrics.inc("agent_observation_summaries_total", tool=tool)
+        if self.sink is not None:
+            try:
+                self.sink.write(trace.to_dict())
+            except Exception:
+                # Трассировка не должна ломать ответ пользователю
+                pass
+
+
+def serve_metrics(tracer: Tracer, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Отдаёт метрики трассировщика по HTTP (GET /metrics) в фоновом потоке"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = tracer.metrics_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+
+
+def report(sink_path: str) -> str:
+    """Сводка по SQLite-трассам: доля времени LLM и каждого инструмента.
+
+    Доля считается от суммарного времени запросов; параллельные вызовы
+    инструментов одного шага могут давать в сумме больше 100%.
+    """
+    conn = sqlite3.connect(sink_path)
+    try:
+        runs = conn.execute("SELECT route, seconds FROM runs WHERE seconds IS NOT NULL").fetchall()
+        llm = [row[0] for row in conn.execute("SELECT llm_seconds FROM steps WHERE llm_seconds IS NOT NULL")]
+        tokens = conn.execute("SELECT SUM(input_tokens), SUM(output_tokens) FROM steps").fetchone()
+        tools: Dict[str, List[float]] = {}
+        for tool, seconds in conn.execute("SELECT tool, seconds FROM spans"):
+            tools.setdefault(tool, []).append(seconds)
+    finally:
+        conn.close()
+
+    total = sum(seconds for _, seconds in runs)
+    lines = [f"Запросов: {len(runs)}, общее время {total:.1f} с"]
+    routes: Dict[str, int] = {}
+    for route, _ in runs:
+        routes[route] = routes.get(route, 0) + 1
+    lines.append("Маршруты: " + ", ".join(f"{route}={count}" for route, count in sorted(routes.items())))
+    rows = [("LLM", llm)] + sorted(tools.items(), key=lambda item: -sum(item[1]))
+    lines.append(f"{'':<26}{'вызовов':>8}{'всего, с':>10}{'доля':>7}{'p50, мс':>10}{'p95, мс':>10}")
+    for name, values in rows:
+        if not values:
+            continue
+        spent = sum(values)
+        lines.append(
+            f"{name:<26}{len(values):>8}{spent:>10.2f}{spent / total if total else 0:>7.0%}"
+            f"{_percentile(values, 0.5) * 1000:>10.1f}{_percentile(values, 0.95) * 1000:>10.1f}"
+        )
+    lines.append(f"Токены: запрос {tokens[0] or 0}, ответ {tokens[1] or 0}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка по трассам запросов агента")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--sink", default="traces.db", help="SQLite-файл с трассами")
+    args = parser.parse_args()
+    print(report(args.sink))
+
+
+if __name__ == "__main__":
+    main()